@@ -15,8 +15,8 @@ CORS(
     app,
     resources={r"/*": {"origins": ["http://localhost:5173"]}},  # allow your React frontend
     supports_credentials=True,
-    expose_headers=["Content-Type", "Authorization"],
-    allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["Content-Type", "Authorization", "ETag"],
+    allow_headers=["Content-Type", "Authorization", "If-None-Match"],
     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 )
 
@@ -55,6 +55,40 @@ app.register_blueprint(face_bp, url_prefix="/api/face")
 app.register_blueprint(blink_bp, url_prefix="/api/blink")
 app.register_blueprint(admin_bp)  # ✅ no extra prefix to avoid '/api/api/admin'
 
+# --- Indexes (idempotent; disable with ENSURE_INDEXES_ON_STARTUP=0) ---
+if os.getenv("ENSURE_INDEXES_ON_STARTUP", "1") != "0":
+    try:
+        from models.index_manager import ensure_all_indexes
+        ensure_all_indexes()
+    except Exception as e:
+        print("⚠️ Index creation skipped:", e)
+
+# --- Background job workers (COR processing; disable with JOB_WORKERS_ENABLED=0) ---
+if os.getenv("JOB_WORKERS_ENABLED", "1") != "0":
+    try:
+        from utils.job_worker import start_job_workers
+        start_job_workers()
+    except Exception as e:
+        print("⚠️ Job workers not started:", e)
+
+# --- Face model server (inference out of process; FACE_INFERENCE_MODE=inline keeps it in-process) ---
+# Launched in the background if nothing answers on MODEL_SERVER_SOCKET; disable with MODEL_SERVER_AUTOSTART=0.
+# Inline mode warms the models here in the background instead; /readyz reports when either is done.
+try:
+    from utils.model_server import ensure_model_server
+    ensure_model_server()
+except Exception as e:
+    print("⚠️ Model server not started:", e)
+
+# --- Timetable scheduler (auto start/stop sessions from schedule_blocks; opt in with TIMETABLE_SCHEDULER_ENABLED=1) ---
+# Every worker joins the leader election; only the lease holder runs the timetable
+if os.getenv("TIMETABLE_SCHEDULER_ENABLED", "0") == "1":
+    try:
+        from utils.scheduler import start_scheduler
+        start_scheduler()
+    except Exception as e:
+        print("⚠️ Timetable scheduler not started:", e)
+
 # --- Health & Root ---
 @app.route("/")
 def home():
@@ -64,6 +98,23 @@ def home():
 def healthz():
     return jsonify(status="ok"), 200
 
+@app.route("/readyz")
+def readyz():
+    # Not ready until every face model is loaded and warmed (in this process or the model server)
+    from utils.model_server import readiness
+    ready, detail = readiness()
+    return jsonify(status="ready" if ready else "warming", **detail), 200 if ready else 503
+
+@app.route("/scheduler/status")
+def scheduler_status_route():
+    from utils.scheduler import scheduler_status
+    return jsonify(scheduler_status()), 200
+
+@app.route("/metrics/cache")
+def cache_metrics():
+    from utils.response_cache import cache_stats
+    return jsonify(cache_stats()), 200
+
 # --- Friendly error handlers (optional) ---
 @app.errorhandler(404)
 def not_found(_):
@@ -1,17 +1,18 @@
 # file: attendance_multiface_tracking.py
+import os
 import cv2
 import time
 import requests
 import numpy as np
 import threading
-import torch
-from scipy.spatial.distance import cosine
-from insightface.app import FaceAnalysis
 from datetime import datetime, timedelta, timezone
 from dateutil import parser
-from typing import Dict, Tuple, Optional, List
+from typing import Dict, Tuple, Optional
 
 from utils.anti_spoofing import check_real_or_spoof
+from utils.onnx_sessions import get_face_analysis
+from utils.gallery_shard import GalleryShard, unpack_changes
+from utils.model_packs import get_pack
 from models.face_db_model import load_registered_faces, get_student_by_id
 
 # -----------------------------
@@ -21,6 +22,20 @@ API_BASE      = "http://localhost:5000/api/attendance"
 ACTIVE_URL    = f"{API_BASE}/active-session"
 STOP_URL      = f"{API_BASE}/stop-session"
 LOG_URL       = f"{API_BASE}/log"
+UPCOMING_URL  = f"{API_BASE}/upcoming"
+GALLERY_URL   = API_BASE + "/classes/{class_id}/gallery"
+CHANGES_URL   = f"{API_BASE}/gallery/changes"
+
+# Each kiosk follows its own room's session; unset = legacy single-session mode
+ROOM_ID       = os.getenv("KIOSK_ROOM_ID") or None
+# Gallery endpoints serve face templates and require the shared kiosk token (KIOSK_API_TOKEN on the API)
+KIOSK_HEADERS = {"X-Kiosk-Token": os.getenv("KIOSK_API_TOKEN", "")}
+
+# Gallery shards of this room's next classes are fetched ahead of time and kept on disk
+GALLERY_DIR       = os.getenv("KIOSK_GALLERY_DIR", os.path.expanduser("~/.cache/attendance_gallery"))
+PREFETCH_MINUTES  = int(os.getenv("KIOSK_PREFETCH_MINUTES", "10"))
+PREFETCH_INTERVAL = 60
+GALLERY_SYNC_INTERVAL = int(os.getenv("KIOSK_GALLERY_SYNC_SECONDS", "10"))   # delta pulls during a session
 
 POLL_INTERVAL = 5
 MATCH_THRESH  = 0.55
@@ -51,75 +66,158 @@ session_skipped = False
 # -----------------------------
 # Init InsightFace
 # -----------------------------
-cuda_ok = torch.cuda.is_available()
-providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if cuda_ok else ["CPUExecutionProvider"]
-ctx_id = 0 if cuda_ok else -1
-
-face_app = FaceAnalysis(name="buffalo_l", providers=providers)
-face_app.prepare(ctx_id=ctx_id, det_size=(640, 640))
+# Model pack from FACE_MODEL_PACK; galleries are requested in the same pack namespace
+PACK = get_pack()
+# Shared, tuned ONNX sessions (threads from the CPU quota, cached optimized graphs)
+face_app = get_face_analysis(PACK["name"], det_size=(640, 640))
+cuda_ok = "CUDAExecutionProvider" in face_app.det_model.session.get_providers()
 
 # -----------------------------
-# Load embeddings for CLASS only
+# Class gallery (prefetched shard, Mongo fallback)
 # -----------------------------
-def load_embeddings_for_class(class_meta: dict) -> Dict[str, List[np.ndarray]]:
-    registered_faces = load_registered_faces()
-    allowed_ids = {s["student_id"] for s in class_meta.get("students", [])}
-    print("🎯 Allowed IDs from class:", allowed_ids)
-
-    db: Dict[str, List[np.ndarray]] = {}
-    for student in registered_faces:
-        sid = student.get("student_id")
-        if not sid or sid not in allowed_ids:
-            continue
+_gallery_cache: Dict[str, Tuple[Optional[str], GalleryShard]] = {}   # class_id -> (etag, shard)
+_gallery_lock = threading.Lock()
 
-        embeddings = student.get("embeddings", {})
-        if not embeddings:
-            continue
 
-        bank: List[np.ndarray] = []
-        for _, vector in embeddings.items():
-            vec = np.asarray(vector, dtype=np.float32)
-            n = np.linalg.norm(vec)
-            if n > 0:
-                vec = vec / n
-            bank.append(vec)
-        if bank:
-            db[sid] = bank
-            print(f"✅ Loaded {len(bank)} embeddings for {sid}")
+def _gallery_path(class_id: str) -> str:
+    return os.path.join(GALLERY_DIR, PACK["namespace"], f"{class_id}.npz")
 
-    print(f"📥 Final DB size: {len(db)} students")
-    return db
 
-# -----------------------------
-# Matching (cosine distance)
-# -----------------------------
-def find_matching_user(live_embedding: np.ndarray, db: Dict[str, List[np.ndarray]], threshold: float = MATCH_THRESH) -> Tuple[Optional[str], Optional[float]]:
-    if live_embedding is None or not db:
+def _read_cached_gallery(class_id: str) -> Tuple[Optional[str], Optional[GalleryShard]]:
+    with _gallery_lock:
+        if class_id in _gallery_cache:
+            return _gallery_cache[class_id]
+    path = _gallery_path(class_id)
+    try:
+        with open(path, "rb") as f:
+            shard = GalleryShard.from_bytes(f.read())
+        etag = open(path + ".etag").read().strip() if os.path.exists(path + ".etag") else None
+    except (OSError, ValueError):
         return None, None
+    with _gallery_lock:
+        _gallery_cache[class_id] = (etag, shard)
+    return etag, shard
+
+
+def fetch_class_gallery(class_id: str, timeout: float = 10) -> Optional[GalleryShard]:
+    """Conditional GET of the class shard; a 304 (or an unreachable backend) reuses the cached copy."""
+    etag, cached = _read_cached_gallery(class_id)
+    headers = dict(KIOSK_HEADERS, **({"If-None-Match": etag} if etag and cached is not None else {}))
+    try:
+        r = requests.get(GALLERY_URL.format(class_id=class_id), params={"pack": PACK["namespace"]},
+                         headers=headers, timeout=timeout)
+        if r.status_code == 304:
+            return cached
+        r.raise_for_status()
+        shard = GalleryShard.from_bytes(r.content)
+        if shard.pack != PACK["namespace"]:
+            raise ValueError(f"gallery is in pack '{shard.pack}', this kiosk runs {PACK['namespace']}")
+    except Exception as e:
+        print(f"⚠️ Gallery fetch failed for {class_id}:", e)
+        return cached
+
+    _store_gallery(class_id, shard, r.headers.get("ETag"))
+    print(f"📦 Gallery for {class_id}: {len(shard)} students, {len(shard.labels)} templates")
+    return shard
+
+
+def _store_gallery(class_id: str, shard: GalleryShard, etag: Optional[str]):
+    try:
+        os.makedirs(os.path.dirname(_gallery_path(class_id)), exist_ok=True)
+        tmp = _gallery_path(class_id) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(shard.to_bytes())
+        os.replace(tmp, _gallery_path(class_id))
+        with open(_gallery_path(class_id) + ".etag", "w") as f:
+            f.write(etag or "")
+    except OSError as e:
+        print("⚠️ Could not write gallery cache:", e)
+    with _gallery_lock:
+        _gallery_cache[class_id] = (etag, shard)
+
+
+def sync_class_gallery(class_id: str, shard: GalleryShard) -> int:
+    """Pull changelog entries after the shard's cursor and apply them in place. Returns entries applied."""
+    applied = 0
+    while True:
+        r = requests.get(CHANGES_URL, params={"since": shard.seq, "class_id": class_id, "pack": PACK["namespace"]},
+                         headers=KIOSK_HEADERS, timeout=5)
+        r.raise_for_status()
+        changes = unpack_changes(r.content)
+        before = shard.seq
+        shard.apply_changes(changes)
+        applied += len(changes["seq"])
+        if not bool(changes["has_more"]) or shard.seq == before:
+            break
+    if applied:
+        etag, _ = _read_cached_gallery(class_id)
+        _store_gallery(class_id, shard, etag)
+        print(f"🔄 Gallery for {class_id}: applied {applied} change(s), now {len(shard)} students")
+    return applied
 
-    live = live_embedding.astype(np.float32)
-    n = np.linalg.norm(live)
-    if n == 0:
-        return None, None
-    live /= n
 
-    best_sid, best_dist = None, 9e9
-    for sid, emb_list in db.items():
-        for emb in emb_list:
-            d = cosine(live, emb)
-            if d < best_dist:
-                best_sid, best_dist = sid, d
+def gallery_sync_loop(class_id: str, shard: GalleryShard):
+    """Keeps the live session's gallery current so students registered mid-class are recognized."""
+    while session_active and not user_quit_app:
+        time.sleep(GALLERY_SYNC_INTERVAL)
+        try:
+            sync_class_gallery(class_id, shard)
+        except Exception as e:
+            print("⚠️ Gallery delta sync failed:", e)
+
+
+def prefetch_upcoming_galleries():
+    """Fetch shards for every class starting in this room within PREFETCH_MINUTES."""
+    try:
+        r = requests.get(UPCOMING_URL, params={"room_id": ROOM_ID, "within_minutes": PREFETCH_MINUTES}, timeout=5)
+        r.raise_for_status()
+        upcoming = r.json().get("classes", [])
+    except Exception as e:
+        print("⚠️ Failed to read upcoming classes:", e)
+        return
+    for cls in upcoming:
+        shard = fetch_class_gallery(cls["class_id"])
+        if shard is not None:
+            try:
+                sync_class_gallery(cls["class_id"], shard)
+            except Exception as e:
+                print("⚠️ Gallery delta sync failed:", e)
+
 
-    if best_sid is not None and best_dist < threshold:
-        return best_sid, best_dist
-    return None, None
+def prefetch_loop():
+    while not user_quit_app:
+        prefetch_upcoming_galleries()
+        time.sleep(PREFETCH_INTERVAL)
+
+
+def load_embeddings_for_class(class_meta: dict) -> GalleryShard:
+    class_id = class_meta.get("class_id")
+    shard = fetch_class_gallery(class_id) if class_id else None
+    if shard is not None:
+        try:
+            sync_class_gallery(class_id, shard)
+        except Exception as e:
+            print("⚠️ Gallery delta sync failed:", e)
+    else:
+        # Backend unreachable and nothing cached: read this class's roster straight from Mongo
+        allowed_ids = {s["student_id"] for s in class_meta.get("students", [])}
+        shard = GalleryShard.from_students(load_registered_faces(allowed_ids, PACK["namespace"]), pack=PACK["namespace"])
+
+    print(f"📥 Final DB size: {len(shard)} students ({len(shard.labels)} templates)")
+    return shard
+
+# -----------------------------
+# Matching (cosine distance)
+# -----------------------------
+def find_matching_user(live_embedding: np.ndarray, db: GalleryShard, threshold: float = MATCH_THRESH) -> Tuple[Optional[str], Optional[float]]:
+    return db.match(live_embedding, threshold)
 
 # -----------------------------
 # Backend helpers
 # -----------------------------
 def set_backend_inactive(class_id: str) -> bool:
     try:
-        resp = requests.post(STOP_URL, json={"class_id": class_id}, timeout=5)
+        resp = requests.post(STOP_URL, json={"class_id": class_id, "room_id": ROOM_ID}, timeout=5)
         if resp.ok:
             print("🛑 Backend stop successful")
             return True
@@ -149,7 +247,8 @@ def post_attendance_log(class_meta: dict, student: dict, status: str = "Present"
 
 def read_active_class():
     try:
-        r = requests.get(ACTIVE_URL, timeout=5).json()
+        params = {"room_id": ROOM_ID} if ROOM_ID else None
+        r = requests.get(ACTIVE_URL, params=params, timeout=5).json()
         if not r.get("active"):
             return False, None
         cls = r.get("class")
@@ -258,6 +357,7 @@ def run_attendance_session(class_meta) -> bool:
     fps = 0.0
 
     threading.Thread(target=poll_backend, args=(class_id,), daemon=True).start()
+    threading.Thread(target=gallery_sync_loop, args=(class_id, db), daemon=True, name="gallery-sync").start()
 
     print(f"📸 Attendance started for class {class_id}")
     cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
@@ -372,8 +472,8 @@ def run_attendance_session(class_meta) -> bool:
 
                 if sid:
                     student = get_student_by_id(sid) or {}
-                    first = student.get("first_name") or student.get("First_Name", "")
-                    last  = student.get("last_name")  or student.get("Last_Name", "")
+                    first = student.get("first_name", "")
+                    last  = student.get("last_name", "")
                     full_name = f"{first} {last}".strip() or sid
 
                     status, color = "Present", (40, 200, 60)
@@ -428,7 +528,9 @@ def run_attendance_session(class_meta) -> bool:
 # Main
 # -----------------------------
 if __name__ == "__main__":
-    print("🚀 Attendance App is running... (CUDA:", cuda_ok, ")")
+    print("🚀 Attendance App is running... (CUDA:", cuda_ok, ", room:", ROOM_ID or "any", ")")
+    if ROOM_ID:
+        threading.Thread(target=prefetch_loop, daemon=True, name="gallery-prefetch").start()
 
     while True:
         active, cls = read_active_class()
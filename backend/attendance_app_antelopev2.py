@@ -3,12 +3,12 @@ import time
 import requests
 import numpy as np
 import threading
-import torch
 from scipy.spatial.distance import cosine
 from collections import defaultdict
-from insightface.app import FaceAnalysis
 
 from utils.anti_spoofing import check_real_or_spoof
+from utils.onnx_sessions import get_face_analysis
+from utils.model_packs import get_pack
 from models.face_db_model import (
     load_registered_faces,
     get_student_by_id
@@ -42,21 +42,19 @@ session_skipped = False
 # -----------------------------
 # Init InsightFace (antelopev2)
 # -----------------------------
-cuda_ok = torch.cuda.is_available()
-providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if cuda_ok else ["CPUExecutionProvider"]
-ctx_id = 0 if cuda_ok else -1
-
-face_app = FaceAnalysis(name="antelopev2", providers=providers)
-face_app.prepare(ctx_id=ctx_id, det_size=(640, 640))
+# Shared, tuned ONNX sessions (threads from the CPU quota, cached optimized graphs)
+face_app = get_face_analysis("antelopev2", det_size=(640, 640))
+cuda_ok = "CUDAExecutionProvider" in face_app.det_model.session.get_providers()
 
 # -----------------------------
 # Load registered embeddings
 # -----------------------------
 def load_embeddings():
-    registered_faces = load_registered_faces()
+    # antelopev2 templates only: buffalo_l embeddings live in a different space
+    registered_faces = load_registered_faces(namespace=get_pack("antelopev2")["namespace"])
     db = {}
     for student in registered_faces:
-        sid = student.get("student_id") or student.get("Student_ID")
+        sid = student.get("student_id")
         embeddings = student.get("embeddings", {})
         if not sid:
             continue
@@ -263,8 +261,8 @@ def run_attendance_session(subject_meta) -> bool:
 
                     if sid:
                         student_data = get_student_by_id(sid) or {}
-                        first = student_data.get("first_name") or student_data.get("First_Name", "")
-                        last  = student_data.get("last_name")  or student_data.get("Last_Name",  "")
+                        first = student_data.get("first_name", "")
+                        last  = student_data.get("last_name", "")
                         full_name = f"{first} {last}".strip() or sid
 
                         label = f"{full_name} ({conf:.2f})"
@@ -2,7 +2,14 @@ from .admin_model import *
 from .instructor_model import *
 from .student_model import *
 from .class_model import *
+from .enrollment_model import *
+from .enrollment_service import *
+from .session_model import *
 from .attendance_model import *
+from .gallery_changelog_model import *
 from .face_db_model import *
 from .attendance_logs_model import *
-from .subject_model import *
\ No newline at end of file
+from .subject_model import *
+from .index_manager import *
+from .student_schema import *
+from .job_model import *
@@ -1,5 +1,7 @@
 from config.db_config import db
 from datetime import datetime, timedelta, timezone
+from utils.response_cache import bump_versions, ATTENDANCE
+from models.session_model import close_session
 
 attendance_logs_collection = db["attendance_logs"]
 classes_collection = db["classes"]
@@ -74,11 +76,8 @@ def _parse_class_start_time(class_start_time):
 # Session Control
 # -----------------------------
 def close_attendance_session(class_id: str):
-    """Mark attendance session as closed for a class."""
-    classes_collection.update_one(
-        {"class_id": class_id},
-        {"$set": {"is_attendance_active": False, "active_session_id": None}}
-    )
+    """Mark attendance session as closed for a class (other rooms keep running)."""
+    close_session(class_id=class_id, reason="late_cutoff")
     print(f"⛔ Attendance session auto-closed for class {class_id}")
 
 
@@ -145,6 +144,7 @@ def log_attendance(class_data, student_data, status="Present", class_start_time=
             }}}
         )
 
+    bump_versions(ATTENDANCE)
     print(f"✅ {status} logged for {student_data['first_name']} {student_data['last_name']}")
     return {
         "class_id": class_data["class_id"],
@@ -262,6 +262,7 @@ def mark_absent_bulk(class_data, date_val, student_list):
                 "time_logged": now
             }}}
         )
+    bump_versions(ATTENDANCE)
 
 
 def ensure_indexes():
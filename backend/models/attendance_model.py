@@ -1,5 +1,6 @@
 from config.db_config import db
 from datetime import datetime, timedelta, timezone
+from utils.response_cache import bump_versions, ATTENDANCE
 
 attendance_logs_collection = db["attendance_logs"]
 
@@ -111,6 +112,7 @@ def log_attendance(class_data, student_data, status="Present", date_val=None, cl
                 "time_logged": now   # ✅ real datetime
             }}}
         )
+    bump_versions(ATTENDANCE)
 
 # -----------------------------
 # Queries
@@ -221,6 +223,7 @@ def mark_absent_bulk(class_data, date_val, student_list):
                 "time_logged": now  # ✅ datetime
             }}}
         )
+    bump_versions(ATTENDANCE)
 
 # -----------------------------
 # Maintenance
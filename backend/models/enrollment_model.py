@@ -0,0 +1,210 @@
+# models/enrollment_model.py
+"""
+One document per (student, class): the roster lives here instead of in classes.students.
+
+    python -m models.enrollment_model --dry-run         # count embedded roster entries to migrate
+    python -m models.enrollment_model                   # copy embedded rosters into enrollments
+    python -m models.enrollment_model --drop-embedded   # ...then $unset classes.students
+    python -m models.enrollment_model --merge-duplicate-classes   # before the unique natural-key index
+"""
+import sys
+import argparse
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from config.db_config import db
+from utils.response_cache import bump_versions, ENROLLMENT, CLASSES
+
+enrollments_collection = db["enrollments"]
+classes_collection = db["classes"]
+sessions_collection = db["sessions"]
+attendance_logs_collection = db["attendance_logs"]
+
+# Natural key of a class (see enrollment_service.class_key); unique once duplicates are merged
+CLASS_KEY_FIELDS = ["subject_id", "course", "year_level", "semester", "section"]
+
+# Roster fields copied onto each enrollment so roster reads never touch students/classes
+ROSTER_FIELDS = ["student_id", "first_name", "last_name", "course", "section", "year_level", "semester"]
+ROSTER_PROJECTION = {"_id": 0, **{f: 1 for f in ROSTER_FIELDS}}
+
+
+def term_of(year_level, semester):
+    """Academic term key, e.g. "4th Year|1st Sem"."""
+    return f"{year_level or ''}|{semester or ''}"
+
+
+def enrollment_upsert_op(class_id, entry):
+    """Idempotent upsert on (class_id, student_id); roster fields are refreshed, enrolled_at is kept."""
+    class_id = str(class_id)
+    fields = {f: entry.get(f) for f in ROSTER_FIELDS}
+    return UpdateOne(
+        {"class_id": class_id, "student_id": fields.pop("student_id")},
+        {
+            "$set": {**fields, "term": term_of(entry.get("year_level"), entry.get("semester"))},
+            "$setOnInsert": {"enrolled_at": datetime.utcnow()},
+        },
+        upsert=True,
+    )
+
+
+# ✅ Write many roster entries in one round trip; returns the number of new enrollments
+def upsert_enrollments(pairs):
+    """pairs: iterable of (class_id, roster_entry)."""
+    ops = [enrollment_upsert_op(cid, entry) for cid, entry in pairs if entry.get("student_id")]
+    if not ops:
+        return 0
+    return enrollments_collection.bulk_write(ops, ordered=False).upserted_count
+
+
+# ✅ Roster of one class (single indexed query on class_id)
+def get_class_roster(class_id):
+    return list(enrollments_collection.find({"class_id": str(class_id)}, ROSTER_PROJECTION))
+
+
+# ✅ Rosters for several classes in one query: {class_id: [entries]}
+def get_class_rosters(class_ids):
+    class_ids = [str(c) for c in class_ids]
+    rosters = {cid: [] for cid in class_ids}
+    if not class_ids:
+        return rosters
+    for e in enrollments_collection.find({"class_id": {"$in": class_ids}}, {**ROSTER_PROJECTION, "class_id": 1}):
+        rosters[e.pop("class_id")].append(e)
+    return rosters
+
+
+# ✅ Roster sizes for several classes: {class_id: n}
+def count_class_rosters(class_ids):
+    class_ids = [str(c) for c in class_ids]
+    counts = {cid: 0 for cid in class_ids}
+    if not class_ids:
+        return counts
+    for row in enrollments_collection.aggregate([
+        {"$match": {"class_id": {"$in": class_ids}}},
+        {"$group": {"_id": "$class_id", "n": {"$sum": 1}}},
+    ]):
+        counts[row["_id"]] = row["n"]
+    return counts
+
+
+# ✅ Class ids a student is enrolled in (single indexed query on student_id)
+def get_class_ids_for_student(student_id, term=None):
+    query = {"student_id": str(student_id).strip()}
+    if term:
+        query["term"] = term
+    return [e["class_id"] for e in enrollments_collection.find(query, {"_id": 0, "class_id": 1})]
+
+
+def delete_class_enrollments(class_id):
+    return enrollments_collection.delete_many({"class_id": str(class_id)}).deleted_count
+
+
+def delete_student_enrollments(student_id):
+    return enrollments_collection.delete_many({"student_id": student_id}).deleted_count
+
+
+# -----------------------------
+# Migration from classes.students
+# -----------------------------
+def migrate_embedded_rosters(dry_run=False, drop_embedded=False, batch_size=1000):
+    """Copy every embedded roster entry into enrollments (idempotent), optionally dropping the arrays."""
+    pending = next(classes_collection.aggregate([
+        {"$match": {"students.0": {"$exists": True}}},
+        {"$group": {"_id": None, "classes": {"$sum": 1}, "entries": {"$sum": {"$size": "$students"}}}},
+    ]), {"classes": 0, "entries": 0})
+    print(f"📋 Embedded rosters: {pending['classes']} classes, {pending['entries']} entries")
+    if dry_run:
+        return {"classes": pending["classes"], "entries": pending["entries"], "created": 0}
+
+    created, batch = 0, []
+    block_fields = ["course", "section", "year_level", "semester"]
+    cursor = classes_collection.find({"students.0": {"$exists": True}}, {"students": 1, **{f: 1 for f in block_fields}})
+    for cls in cursor:
+        for s in cls.get("students", []):
+            entry = {**s, **{f: s.get(f) or cls.get(f) for f in block_fields}}
+            batch.append((cls["_id"], entry))
+            if len(batch) >= batch_size:
+                created += upsert_enrollments(batch)
+                batch = []
+    created += upsert_enrollments(batch)
+    print(f"✅ Created {created} enrollments")
+
+    if drop_embedded:
+        result = classes_collection.update_many({"students": {"$exists": True}}, {"$unset": {"students": ""}})
+        print(f"🧹 Dropped embedded rosters from {result.modified_count} classes")
+    return {"classes": pending["classes"], "entries": pending["entries"], "created": created}
+
+
+# -----------------------------
+# Duplicate classes (must be merged before the unique natural-key index can build)
+# -----------------------------
+def find_duplicate_classes():
+    """Natural keys held by more than one class document, oldest _id first."""
+    return list(classes_collection.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": {f: f"${f}" for f in CLASS_KEY_FIELDS}, "count": {"$sum": 1}, "ids": {"$push": "$_id"}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]))
+
+
+def _merge_class_into(keeper, duplicate):
+    """Move one duplicate class's enrollments, sessions and logs onto the keeper, then delete it."""
+    ops = [
+        UpdateOne(
+            {"class_id": keeper, "student_id": e["student_id"]},
+            {"$setOnInsert": {k: v for k, v in e.items() if k not in ("_id", "class_id", "student_id")}},
+            upsert=True,
+        )
+        for e in enrollments_collection.find({"class_id": duplicate})
+    ]
+    if ops:
+        enrollments_collection.bulk_write(ops, ordered=False)
+    enrollments_collection.delete_many({"class_id": duplicate})
+    attendance_logs_collection.update_many({"class_id": duplicate}, {"$set": {"class_id": keeper}})
+    sessions_collection.update_many({"class_id": duplicate, "status": {"$ne": "active"}}, {"$set": {"class_id": keeper}})
+    for session in sessions_collection.find({"class_id": duplicate, "status": "active"}, {"_id": 1}):
+        try:
+            sessions_collection.update_one({"_id": session["_id"]}, {"$set": {"class_id": keeper}})
+        except DuplicateKeyError:
+            print(f"⚠️ Class {duplicate} and {keeper} both have an active session; {session['_id']} left as is")
+    classes_collection.delete_one({"_id": ObjectId(duplicate)})
+
+
+def merge_duplicate_classes(dry_run=False):
+    """Keep the oldest class of every duplicated natural key and fold the others into it."""
+    duplicates = find_duplicate_classes()
+    for dup in duplicates:
+        print(f"⚠️ Duplicate class {dup['_id']} in {dup['count']} documents: {dup['ids']}")
+    if dry_run or not duplicates:
+        return {"keys": len(duplicates), "merged": 0}
+
+    merged = 0
+    for dup in duplicates:
+        keeper = str(dup["ids"][0])
+        for duplicate in dup["ids"][1:]:
+            _merge_class_into(keeper, str(duplicate))
+            merged += 1
+    bump_versions(ENROLLMENT, CLASSES)
+    print(f"✅ Merged {merged} duplicate classes")
+    return {"keys": len(duplicates), "merged": merged}
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move embedded class rosters into the enrollments collection.")
+    parser.add_argument("--dry-run", action="store_true", help="only count embedded roster entries")
+    parser.add_argument("--drop-embedded", action="store_true", help="$unset classes.students after copying")
+    parser.add_argument("--merge-duplicate-classes", action="store_true",
+                        help="fold classes sharing a natural key into the oldest one (with --dry-run: only report)")
+    args = parser.parse_args(argv)
+    if args.merge_duplicate_classes:
+        merge_duplicate_classes(dry_run=args.dry_run)
+        return 0
+    migrate_embedded_rosters(dry_run=args.dry_run, drop_embedded=args.drop_embedded)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+from config.db_config import db
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models.enrollment_model import upsert_enrollments
+from utils.response_cache import bump_versions, ENROLLMENT, CLASSES
+
+classes_collection = db["classes"]
+students_collection = db["students"]
+instructors_collection = db["instructors"]
+
+
+# ✅ Normalize schedule blocks consistently
+def normalize_schedule_blocks(blocks):
+    normalized = []
+    for block in blocks or []:
+        normalized.append({
+            "days": block.get("days", []),
+            "start": block.get("start", ""),
+            "end": block.get("end", "")
+        })
+    return normalized
+
+
+# ✅ Natural key of a class/section document
+def class_key(subject_id, course, year_level, semester, section):
+    return {
+        "subject_id": str(subject_id),
+        "course": course,
+        "year_level": str(year_level),
+        "semester": semester,
+        "section": section
+    }
+
+
+# ✅ All instructors for a set of subjects in one $in query
+def prefetch_instructors(subjects):
+    ids = list({s.get("instructor_id") for s in subjects if s.get("instructor_id")})
+    if not ids:
+        return {}
+    cursor = instructors_collection.find(
+        {"instructor_id": {"$in": ids}},
+        {"_id": 0, "instructor_id": 1, "first_name": 1, "last_name": 1}
+    )
+    return {i["instructor_id"]: i for i in cursor}
+
+
+def roster_entry(student, course, year_level, section, semester):
+    return {
+        "student_id": student.get("student_id"),
+        "first_name": student.get("first_name", ""),
+        "last_name": student.get("last_name", ""),
+        "course": course,
+        "year_level": year_level,
+        "semester": semester,
+        "section": section
+    }
+
+
+def _class_upsert_op(subject, instructor, key):
+    """Create the class on its natural key if missing; existing classes are left untouched."""
+    return UpdateOne(key, {"$setOnInsert": {
+        "subject_code": subject.get("subject_code"),
+        "subject_title": subject.get("subject_title", ""),
+        "instructor_id": subject.get("instructor_id"),
+        "instructor_first_name": instructor.get("first_name", "N/A") if instructor else "N/A",
+        "instructor_last_name": instructor.get("last_name", "N/A") if instructor else "N/A",
+        "schedule_blocks": normalize_schedule_blocks(subject.get("schedule_blocks", [])),
+        "schedule_updated_at": datetime.utcnow(),
+        "created_at": datetime.utcnow()
+    }}, upsert=True)
+
+
+def _bulk_upsert_classes(ops, retries=2):
+    """
+    bulk_write the class upserts; returns the upserted _ids. An upsert that loses the insert
+    race to a parallel worker fails on the unique natural key and is retried, matching the
+    winner's document instead.
+    """
+    upserted = []
+    for attempt in range(retries + 1):
+        try:
+            result = classes_collection.bulk_write(ops, ordered=False)
+            return upserted + list((result.upserted_ids or {}).values())
+        except BulkWriteError as e:
+            upserted += [u["_id"] for u in e.details.get("upserted", [])]
+            errors = e.details.get("writeErrors", [])
+            if attempt == retries or any(err.get("code") != 11000 for err in errors):
+                raise
+            ops = [ops[err["index"]] for err in errors]
+    return upserted
+
+
+def _upsert_classes(keyed_ops):
+    """
+    keyed_ops: [(natural key, UpdateOne)]. One bulk_write for the upserts, one $or read
+    for the resulting _ids. Returns {tuple(key.values()): class_id}.
+    """
+    # Imported here: utils.scheduler -> utils.attendance_session -> models would be circular
+    from utils.scheduler import notify_schedule_changed
+    for class_id in _bulk_upsert_classes([op for _, op in keyed_ops]):
+        notify_schedule_changed(class_id)
+    ids = {}
+    for cls in classes_collection.find({"$or": [k for k, _ in keyed_ops]}, {k: 1 for k in keyed_ops[0][0]}):
+        ids[tuple(cls.get(f) for f in keyed_ops[0][0])] = str(cls["_id"])
+    return ids
+
+
+def _assigned_subject(subj, instructor, course, year_level, section, semester):
+    return {
+        "subject_code": subj["subject_code"],
+        "subject_title": subj.get("subject_title", ""),
+        "course": course,
+        "year_level": year_level,
+        "semester": semester,
+        "section": section,
+        "instructor_id": subj.get("instructor_id"),
+        "instructor_first_name": instructor.get("first_name") if instructor else None,
+        "instructor_last_name": instructor.get("last_name") if instructor else None,
+        "schedule_blocks": subj.get("schedule_blocks", [])
+    }
+
+
+# ✅ Enroll groups of students in every subject of their block (COR upload / bulk import)
+def enroll_blocks(groups):
+    """
+    groups: [{"students": [...], "subjects": [...], "course", "year_level", "section", "semester"}]
+    Round trips: one instructor $in, one classes bulk_write + one _id read, one enrollments
+    bulk_write, one students bulk_write ($addToSet/$each per student) — regardless of
+    how many groups, subjects or students.
+    Returns {student_id: [assigned subjects in the upload-cor response shape]}.
+    """
+    groups = [g for g in groups if g["students"] and g["subjects"]]
+    if not groups:
+        return {}
+
+    instructors = prefetch_instructors([subj for g in groups for subj in g["subjects"]])
+
+    class_ops, pending, assigned, codes = {}, [], {}, {}
+    for g in groups:
+        block = (g["course"], g["year_level"], g["section"], g["semester"])
+        roster = [roster_entry(st, *block) for st in g["students"]]
+        for subj in g["subjects"]:
+            instructor = instructors.get(subj.get("instructor_id"))
+            key = class_key(subj["_id"], g["course"], g["year_level"], g["semester"], g["section"])
+            class_ops.setdefault(tuple(key.values()), (key, _class_upsert_op(subj, instructor, key)))
+            for entry in roster:
+                pending.append((tuple(key.values()), entry))
+                assigned.setdefault(entry["student_id"], []).append(
+                    _assigned_subject(subj, instructor, *block)
+                )
+                codes.setdefault(entry["student_id"], []).append(subj["subject_code"])
+
+    class_ids = _upsert_classes(list(class_ops.values()))
+    upsert_enrollments((class_ids[k], entry) for k, entry in pending if k in class_ids)
+    students_collection.bulk_write([
+        UpdateOne({"student_id": sid}, {"$addToSet": {"subjects": {"$each": subject_codes}}})
+        for sid, subject_codes in codes.items()
+    ], ordered=False)
+    bump_versions(ENROLLMENT, CLASSES)
+    return assigned
+
+
+# ✅ Enroll one student in every subject of a block (COR upload)
+def enroll_student_in_subjects(student, subjects, course, year_level, section, semester):
+    """Returns the assigned subjects in the upload-cor response shape."""
+    assigned = enroll_blocks([{
+        "students": [student], "subjects": subjects,
+        "course": course, "year_level": year_level, "section": section, "semester": semester,
+    }])
+    return assigned.get(student.get("student_id"), [])
+
+
+# ✅ Enroll many students in one subject/block (admin bulk assign)
+def enroll_students_in_subject(subject, students, course, year_level, section, semester):
+    """Constant round trips for any number of students. Returns the number of new enrollments."""
+    if not students:
+        return 0
+
+    instructor = prefetch_instructors([subject]).get(subject.get("instructor_id"))
+    key = class_key(subject["_id"], course, year_level, semester, section)
+    class_id = _upsert_classes([(key, _class_upsert_op(subject, instructor, key))]).get(tuple(key.values()))
+    if class_id is None:
+        return 0
+
+    added = upsert_enrollments(
+        (class_id, roster_entry(s, course, year_level, section, semester)) for s in students
+    )
+    bump_versions(ENROLLMENT, CLASSES)
+    return added
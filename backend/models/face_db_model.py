@@ -1,9 +1,12 @@
 from config.db_config import db
-import datetime
+from utils.response_cache import bump_versions, STUDENTS
+from models.student_schema import canonical_student_fields, STUDENT_PROJECTION
+from models.gallery_changelog_model import record_template_upserts, record_template_deletes
+from utils.model_packs import namespaces, embedding_field, embedding_fields, resolve_namespace
+from utils.template_sets import consolidate, TEMPLATE_CAP
 
 # Collections
 students_collection = db["students"]
-attendance_collection = db["attendance_logs"]
 
 # -----------------------------
 # Save / Update student face data
@@ -14,14 +17,25 @@ def save_face_data(student_id, update_fields):
             print("❌ Missing student_id or update_fields.")
             return False
 
-        # Always normalize to lowercase field name
+        # Always write canonical (lowercase) field names; empty placeholders never overwrite
+        update_fields = canonical_student_fields(update_fields, drop_empty=True)
         result = students_collection.update_one(
             {"student_id": student_id},
             {"$set": update_fields},
             upsert=True
         )
-
-        updated_fields = [k for k in update_fields.keys() if k.startswith("embeddings.")]
+        bump_versions(STUDENTS)
+
+        # Kiosks pick new templates up from the gallery changelog (one stream per model pack)
+        updated_fields = []
+        for namespace in namespaces():
+            field = embedding_field(namespace)
+            templates = dict(update_fields.get(field) or {})
+            templates.update({k.split(".", 1)[1]: v for k, v in update_fields.items() if k.startswith(field + ".")})
+            record_template_upserts(student_id, templates, namespace)
+            updated_fields += [k for k in update_fields.keys() if k.startswith(field + ".")]
+            if templates:
+                enforce_template_cap(student_id, namespace)
         print(f"✅ Face data updated for {student_id}. Fields updated: {updated_fields}")
         return True
     except Exception as e:
@@ -30,40 +44,72 @@ def save_face_data(student_id, update_fields):
 
 
 # -----------------------------
-# Normalize student document
+# Bounded template sets (see utils/template_sets.py)
 # -----------------------------
-def normalize_student(doc):
-    if not doc:
-        return None
-    return {
-        "student_id": doc.get("student_id") or doc.get("Student_ID", ""),
-        "first_name": doc.get("first_name") or doc.get("First_Name", ""),
-        "last_name": doc.get("last_name") or doc.get("Last_Name", ""),
-        "middle_name": doc.get("middle_name") or doc.get("Middle_Name", ""),
-        "course": doc.get("course") or doc.get("Course", ""),
-        "section": doc.get("section") or doc.get("Section", ""),
-        "email": doc.get("email") or doc.get("Email", ""),
-        "contact_number": doc.get("contact_number") or doc.get("Contact_Number", ""),
-        "subjects": doc.get("subjects") or doc.get("Subjects", []),
-        "created_at": doc.get("created_at"),
-        "embeddings": doc.get("embeddings", {})
-    }
+def enforce_template_cap(student_id, namespace=None, cap=TEMPLATE_CAP, dry_run=False):
+    """Consolidate one student's templates in a namespace down to `cap`; returns the dropped keys."""
+    namespace = resolve_namespace(namespace)
+    field = embedding_field(namespace)
+    doc = students_collection.find_one({"student_id": student_id}, {"_id": 0, field: 1})
+    templates = (doc or {}).get(field) or {}
+    if len(templates) <= cap:
+        return []
+    _, dropped = consolidate(templates, cap)
+    if not dropped or dry_run:
+        return dropped
+
+    students_collection.update_one({"student_id": student_id}, {"$unset": {f"{field}.{key}": "" for key in dropped}})
+    record_template_deletes(student_id, dropped, namespace)
+    bump_versions(STUDENTS)
+    print(f"🗜️ {student_id} ({namespace}): kept {len(templates) - len(dropped)} of {len(templates)} templates.")
+    return dropped
+
+
+def compact_oversized_students(cap=TEMPLATE_CAP, namespace=None, dry_run=False, progress=None):
+    """
+    Consolidate every student holding more than `cap` templates, in one namespace or in all of
+    them. progress(done, total) is called after each student.
+    """
+    targets = [resolve_namespace(namespace)] if namespace else namespaces()
+    oversized = []
+    for ns in targets:
+        field = embedding_field(ns)
+        query = {"$expr": {"$gt": [{"$size": {"$objectToArray": {"$ifNull": [f"${field}", {}]}}}, cap]}}
+        oversized += [(ns, doc["student_id"]) for doc in students_collection.find(query, {"_id": 0, "student_id": 1})
+                      if doc.get("student_id")]
+
+    result = {"cap": cap, "dry_run": dry_run,
+              "namespaces": {ns: {"students": 0, "templates_removed": 0} for ns in targets}}
+    for done, (ns, student_id) in enumerate(oversized, start=1):
+        dropped = enforce_template_cap(student_id, ns, cap, dry_run)
+        result["namespaces"][ns]["students"] += 1
+        result["namespaces"][ns]["templates_removed"] += len(dropped)
+        if progress:
+            progress(done, len(oversized))
+    return result
 
 
 # -----------------------------
 # Load all students with embeddings
 # -----------------------------
-def load_registered_faces():
+def load_registered_faces(student_ids=None, namespace=None):
+    """
+    All students with templates in one model-pack namespace (default: the active pack), or only
+    those in student_ids (e.g. one class's roster). Each document's `embeddings` holds that
+    namespace's templates, whatever field they are stored in.
+    """
     try:
-        registered_faces = []
-        cursor = students_collection.find({"embeddings": {"$exists": True, "$ne": {}}})
-
-        for doc in cursor:
-            student = normalize_student(doc)
-            if student and student["student_id"]:
-                registered_faces.append(student)
-
-        print(f"📥 Loaded {len(registered_faces)} registered students with embeddings.")
+        field = embedding_field(namespace)
+        query = {field: {"$exists": True, "$ne": {}}, "student_id": {"$nin": [None, ""]}}
+        if student_ids is not None:
+            query["student_id"] = {"$in": [sid for sid in student_ids if sid]}
+        projection = {k: v for k, v in STUDENT_PROJECTION.items() if k != "embeddings"}
+        projection[field] = 1
+        registered_faces = list(students_collection.find(query, projection))
+        for doc in registered_faces:
+            doc["embeddings"] = doc.pop(field, {})
+
+        print(f"📥 Loaded {len(registered_faces)} registered students with {field}.")
         return registered_faces
     except Exception as e:
         print("❌ MongoDB load error:", str(e))
@@ -75,58 +121,9 @@ def load_registered_faces():
 # -----------------------------
 def get_student_by_id(student_id):
     try:
-        student = students_collection.find_one({
-            "$or": [
-                {"student_id": student_id},
-                {"Student_ID": student_id}
-            ]
-        })
-        return normalize_student(student)
+        projection = {"_id": 0, "password": 0}
+        projection.update({field: 0 for field in embedding_fields()})
+        return students_collection.find_one({"student_id": student_id}, projection)
     except Exception as e:
         print("❌ MongoDB lookup error:", str(e))
         return None
-
-
-# -----------------------------
-# Save attendance log
-# -----------------------------
-def save_attendance_log(student_id, subject_id, timestamp=None, confidence=None):
-    try:
-        student = get_student_by_id(student_id)
-        if not student:
-            print(f"⚠️ Student {student_id} not found in DB.")
-            return False
-
-        log = {
-            "student_id": student["student_id"],
-            "first_name": student["first_name"],
-            "last_name": student["last_name"],
-            "course": student["course"],
-            "section": student["section"],
-            "subject_id": subject_id,
-            "timestamp": timestamp or datetime.datetime.utcnow(),
-            "confidence": confidence,
-            "status": "Present"
-        }
-
-        attendance_collection.insert_one(log)
-        print(f"📝 Attendance logged: {student['first_name']} {student['last_name']} | {subject_id} | {log['timestamp']}")
-        return True
-    except Exception as e:
-        print("❌ MongoDB attendance log error:", str(e))
-        return False
-
-
-# -----------------------------
-# Load attendance logs
-# -----------------------------
-def load_attendance_logs(subject_id):
-    try:
-        logs = list(attendance_collection.find({"subject_id": subject_id}))
-        for l in logs:
-            l["_id"] = str(l["_id"])
-        print(f"📊 Loaded {len(logs)} attendance logs for subject {subject_id}")
-        return logs
-    except Exception as e:
-        print("❌ MongoDB load attendance logs error:", str(e))
-        return []
@@ -0,0 +1,185 @@
+# models/gallery_changelog_model.py
+"""
+Append-only log of face-template changes, one entry per (student, template) upsert or delete,
+numbered by a monotonic sequence. Upserts carry their model-pack namespace ("pack"); deletes
+without one apply to every pack. Kiosks holding a gallery snapshot replay entries after their
+cursor instead of reloading every registered face.
+
+    python -m models.gallery_changelog_model --compact   # drop entries superseded by later ones
+"""
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, DeleteOne
+from config.db_config import db
+from utils.model_packs import active_namespace, LEGACY_NAMESPACE
+
+gallery_changes_collection = db["gallery_changes"]
+counters_collection = db["counters"]
+
+UPSERT, DELETE = "upsert", "delete"
+SEQ_COUNTER = "gallery_seq"
+
+# A sequence number is allocated before its entry is inserted; gaps younger than this may still fill in
+SETTLE_SECONDS = int(os.getenv("GALLERY_CHANGES_SETTLE_SECONDS", "5"))
+MAX_CHANGES = 5000
+
+
+def _allocate_seqs(n):
+    """Reserve n consecutive sequence numbers; returns the first."""
+    doc = counters_collection.find_one_and_update(
+        {"_id": SEQ_COUNTER},
+        {"$inc": {"seq": n}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["seq"] - n + 1
+
+
+# ✅ Record template upserts for one student: {template_key: vector} in one pack namespace
+def record_template_upserts(student_id, templates, namespace=None):
+    namespace = namespace or active_namespace()
+    templates = {k: v for k, v in (templates or {}).items() if v is not None}
+    if not student_id or not templates:
+        return []
+    first = _allocate_seqs(len(templates))
+    now = datetime.utcnow()
+    entries = [
+        {"seq": first + i, "op": UPSERT, "student_id": student_id, "template": key, "pack": namespace,
+         "vector": [float(x) for x in vector], "at": now}
+        for i, (key, vector) in enumerate(templates.items())
+    ]
+    gallery_changes_collection.insert_many(entries, ordered=True)
+    return [e["seq"] for e in entries]
+
+
+# ✅ Record removal of one template, or of every template of a student (template=None),
+# in one pack namespace or in all of them (namespace=None)
+def record_template_delete(student_id, template=None, namespace=None):
+    if not student_id:
+        return None
+    seq = _allocate_seqs(1)
+    gallery_changes_collection.insert_one(
+        {"seq": seq, "op": DELETE, "student_id": student_id, "template": template, "pack": namespace,
+         "at": datetime.utcnow()}
+    )
+    return seq
+
+
+# ✅ Record removal of several templates of one student in one pack namespace
+def record_template_deletes(student_id, templates, namespace=None):
+    namespace = namespace or active_namespace()
+    templates = [key for key in (templates or []) if key]
+    if not student_id or not templates:
+        return []
+    first = _allocate_seqs(len(templates))
+    now = datetime.utcnow()
+    entries = [
+        {"seq": first + i, "op": DELETE, "student_id": student_id, "template": key, "pack": namespace, "at": now}
+        for i, key in enumerate(templates)
+    ]
+    gallery_changes_collection.insert_many(entries, ordered=True)
+    return [e["seq"] for e in entries]
+
+
+def settled_gallery_seq(now=None):
+    """Highest seq every consumer can safely treat as complete (used as a snapshot's cursor)."""
+    settle = (now or datetime.utcnow()) - timedelta(seconds=SETTLE_SECONDS)
+    doc = gallery_changes_collection.find_one({"at": {"$lte": settle}}, {"seq": 1}, sort=[("seq", -1)])
+    return doc["seq"] if doc else 0
+
+
+def _entry_namespace(entry):
+    """Entries written before model packs carry no "pack": upserts were buffalo_l, deletes were global."""
+    if "pack" in entry:
+        return entry["pack"]
+    return LEGACY_NAMESPACE if entry.get("op") == UPSERT else None
+
+
+def get_gallery_changes(since, student_ids=None, namespace=None, limit=MAX_CHANGES, now=None):
+    """
+    Entries after `since`, in order, for one pack namespace (default: the active pack),
+    optionally only for student_ids.
+    Returns (entries, next_since, has_more). The cursor stops before any unsettled gap, so an
+    entry whose seq was allocated but not yet written is never skipped.
+    """
+    settle = (now or datetime.utcnow()) - timedelta(seconds=SETTLE_SECONDS)
+    heads = list(gallery_changes_collection.find(
+        {"seq": {"$gt": since}}, {"_id": 0, "seq": 1, "at": 1, "student_id": 1, "op": 1, "pack": 1}
+    ).sort("seq", 1).limit(limit + 1))
+    has_more = len(heads) > limit
+    heads = heads[:limit]
+
+    namespace = namespace or active_namespace()
+    cursor, wanted = since, []
+    allowed = set(student_ids) if student_ids is not None else None
+    for h in heads:
+        if h["seq"] != cursor + 1 and h["at"] > settle:
+            has_more = True
+            break
+        cursor = h["seq"]
+        if _entry_namespace(h) not in (None, namespace):
+            continue
+        if allowed is None or h["student_id"] in allowed:
+            wanted.append(h["seq"])
+
+    entries = list(gallery_changes_collection.find(
+        {"seq": {"$in": wanted}}, {"_id": 0}
+    ).sort("seq", 1)) if wanted else []
+    return entries, cursor, has_more
+
+
+# -----------------------------
+# Compaction
+# -----------------------------
+def compact_gallery_changelog(min_age_seconds=3600):
+    """
+    Drop entries superseded by a later entry for the same template in the same pack (or by a
+    later delete covering it: student-wide and/or every pack). Replaying the remainder from any cursor yields the same gallery. Recent entries are
+    left alone so the settle window above never sees compaction gaps.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=min_age_seconds)
+    # Newest first; each set holds what a later entry already covers
+    latest, pack_deleted, key_deleted, student_deleted, ops = set(), set(), set(), set(), []
+    cursor = gallery_changes_collection.find(
+        {"at": {"$lte": cutoff}}, {"_id": 1, "seq": 1, "op": 1, "student_id": 1, "template": 1, "pack": 1}
+    ).sort("seq", -1)
+    for e in cursor:
+        sid, key, ns = e["student_id"], e.get("template"), _entry_namespace(e)
+        superseded = sid in student_deleted or (key is not None and (sid, key) in key_deleted)
+        if ns is not None:
+            superseded = superseded or (sid, ns) in pack_deleted or (key is not None and (sid, ns, key) in latest)
+        if superseded:
+            ops.append(DeleteOne({"_id": e["_id"]}))
+            continue
+        if ns is None and key is None:
+            student_deleted.add(sid)
+        elif ns is None:
+            key_deleted.add((sid, key))
+        elif key is None:
+            pack_deleted.add((sid, ns))
+        else:
+            latest.add((sid, ns, key))
+    if ops:
+        gallery_changes_collection.bulk_write(ops, ordered=False)
+    print(f"🧹 Compacted gallery changelog: removed {len(ops)} superseded entries")
+    return len(ops)
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gallery changelog maintenance.")
+    parser.add_argument("--compact", action="store_true", help="drop superseded entries")
+    parser.add_argument("--min-age", type=int, default=3600, help="only compact entries older than this (seconds)")
+    args = parser.parse_args(argv)
+    if args.compact:
+        compact_gallery_changelog(args.min_age)
+    print(f"📋 Settled gallery seq: {settled_gallery_seq()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
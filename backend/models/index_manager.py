@@ -0,0 +1,276 @@
+# models/index_manager.py
+"""
+Declares every index the backend's hot queries rely on and creates them idempotently.
+
+    python -m models.index_manager            # create/verify indexes on the app database
+    python -m models.index_manager --verify   # seed a scratch DB, explain() every query shape, fail on COLLSCAN
+"""
+import sys
+import argparse
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from config.db_config import client, db
+
+# -----------------------------
+# Index declarations
+# -----------------------------
+# collection -> [(keys, options)]
+INDEX_SPECS = {
+    "students": [
+        ([("student_id", ASCENDING)], {"name": "uniq_student_id", "unique": True,
+                                          "partialFilterExpression": {"student_id": {"$type": "string"}}}),
+        ([("course", ASCENDING), ("year_level", ASCENDING), ("section", ASCENDING), ("semester", ASCENDING)],
+         {"name": "block"}),
+        ([("created_at", DESCENDING)], {"name": "created_at_desc"}),
+    ],
+    "instructors": [
+        ([("instructor_id", ASCENDING)], {"name": "uniq_instructor_id", "unique": True}),
+        ([("email", ASCENDING)], {"name": "email"}),
+        ([("first_name", ASCENDING)], {"name": "first_name"}),
+    ],
+    "subjects": [
+        ([("course", ASCENDING), ("year_level", ASCENDING), ("semester", ASCENDING)],
+         {"name": "course_year_semester"}),
+        ([("instructor_id", ASCENDING)], {"name": "instructor_id"}),
+        ([("subject_code", ASCENDING)], {"name": "subject_code"}),
+        ([("created_at", DESCENDING)], {"name": "created_at_desc"}),
+    ],
+    "classes": [
+        ([("subject_id", ASCENDING), ("course", ASCENDING), ("year_level", ASCENDING),
+          ("semester", ASCENDING), ("section", ASCENDING)], {"name": "uniq_natural_key", "unique": True}),
+        ([("instructor_id", ASCENDING)], {"name": "instructor_id"}),
+        ([("is_attendance_active", ASCENDING)],
+         {"name": "active_sessions", "partialFilterExpression": {"is_attendance_active": True}}),
+        ([("created_at", DESCENDING)], {"name": "created_at_desc"}),
+        ([("schedule_updated_at", ASCENDING)], {"name": "schedule_updated_at", "sparse": True}),
+        ([("room", ASCENDING)], {"name": "room", "sparse": True}),
+    ],
+    "sessions": [
+        ([("class_id", ASCENDING)],
+         {"name": "uniq_active_class", "unique": True, "partialFilterExpression": {"status": "active"}}),
+        ([("room_id", ASCENDING)],
+         {"name": "uniq_active_room", "unique": True, "partialFilterExpression": {"status": "active"}}),
+        ([("status", ASCENDING), ("ends_at", ASCENDING)], {"name": "status_ends_at"}),
+        ([("class_id", ASCENDING), ("started_at", DESCENDING)], {"name": "class_started_at"}),
+    ],
+    "gallery_changes": [
+        ([("seq", ASCENDING)], {"name": "uniq_seq", "unique": True}),
+        ([("at", ASCENDING)], {"name": "at"}),
+    ],
+    "locks": [
+        ([("expires_at", ASCENDING)], {"name": "expired_lease_ttl", "expireAfterSeconds": 3600}),
+    ],
+    "enrollments": [
+        ([("class_id", ASCENDING), ("student_id", ASCENDING)], {"name": "uniq_class_student", "unique": True}),
+        ([("student_id", ASCENDING), ("term", ASCENDING)], {"name": "student_term"}),
+    ],
+    "attendance_logs": [
+        ([("class_id", ASCENDING), ("date", ASCENDING)], {"name": "class_id_1_date_1"}),
+        ([("students.student_id", ASCENDING), ("date", ASCENDING)], {"name": "students.student_id_1_date_1"}),
+        ([("instructor_id", ASCENDING), ("date", ASCENDING)], {"name": "instructor_id_date"}),
+        ([("date", DESCENDING)], {"name": "date_desc"}),
+    ],
+    "jobs": [
+        ([("status", ASCENDING), ("kind", ASCENDING), ("created_at", ASCENDING)], {"name": "queue_order"}),
+        ([("owner", ASCENDING), ("created_at", DESCENDING)], {"name": "owner_created_at"}),
+    ],
+}
+
+# Indexes superseded by a declaration on the same keys: (collection, old name, new name). The old
+# one is dropped so the new one can build, and restored if that fails (e.g. duplicates remain).
+REPLACED_INDEXES = [
+    ("classes", "natural_key", "uniq_natural_key"),   # python -m models.enrollment_model --merge-duplicate-classes
+]
+
+# -----------------------------
+# Known query shapes (collection, filter, sort)
+# -----------------------------
+SAMPLE_STUDENT = "22-1-1-0001"
+SAMPLE_INSTRUCTOR = "INST-001"
+SAMPLE_CLASS = "000000000000000000000001"
+SAMPLE_DATE = "2025-09-01"
+
+QUERY_SHAPES = [
+    ("students", {"student_id": SAMPLE_STUDENT}, None),
+    ("students", {"course": "BSINFOTECH", "year_level": "4th Year", "section": "4C", "semester": "1st Sem"}, None),
+    ("students", {}, [("created_at", DESCENDING)]),
+    ("instructors", {"instructor_id": SAMPLE_INSTRUCTOR}, None),
+    ("instructors", {"email": "a@b.c"}, None),
+    ("subjects", {"course": "BSINFOTECH", "year_level": "4th Year", "semester": "1st Sem"}, None),
+    ("subjects", {"instructor_id": SAMPLE_INSTRUCTOR}, None),
+    ("subjects", {"subject_code": "IT101"}, None),
+    ("classes", {"is_attendance_active": True}, None),
+    ("classes", {"instructor_id": SAMPLE_INSTRUCTOR}, None),
+    ("classes", {"schedule_updated_at": {"$gte": datetime(2025, 1, 1)}}, None),
+    ("classes", {"room": "RM-101", "schedule_blocks.0": {"$exists": True}}, None),
+    ("sessions", {"status": "active", "room_id": "RM-101"}, None),
+    ("sessions", {"status": "active", "class_id": SAMPLE_CLASS}, None),
+    ("sessions", {"status": "active", "ends_at": {"$lte": datetime(2025, 1, 1)}}, None),
+    ("enrollments", {"class_id": SAMPLE_CLASS}, None),
+    ("enrollments", {"class_id": {"$in": [SAMPLE_CLASS]}}, None),
+    ("enrollments", {"student_id": SAMPLE_STUDENT}, None),
+    ("enrollments", {"student_id": SAMPLE_STUDENT, "term": "4th Year|1st Sem"}, None),
+    ("classes", {"subject_id": SAMPLE_CLASS, "course": "BSINFOTECH", "year_level": "4th Year",
+                 "semester": "1st Sem", "section": "4C"}, None),
+    ("attendance_logs", {"class_id": SAMPLE_CLASS, "date": SAMPLE_DATE}, None),
+    ("attendance_logs", {"class_id": SAMPLE_CLASS, "date": {"$gte": SAMPLE_DATE, "$lte": SAMPLE_DATE}},
+     [("date", ASCENDING)]),
+    ("attendance_logs", {"students.student_id": SAMPLE_STUDENT}, [("date", DESCENDING)]),
+    ("attendance_logs", {"instructor_id": SAMPLE_INSTRUCTOR}, [("date", ASCENDING)]),
+    ("attendance_logs", {"date": SAMPLE_DATE}, None),
+    ("attendance_logs", {"date": {"$gte": SAMPLE_DATE, "$lte": SAMPLE_DATE}}, None),
+    ("gallery_changes", {"seq": {"$gt": 0}}, [("seq", ASCENDING)]),
+    ("gallery_changes", {"at": {"$lte": datetime(2025, 1, 1)}}, [("seq", DESCENDING)]),
+    ("jobs", {"status": "queued", "kind": {"$in": ["cor_upload"]}}, [("created_at", ASCENDING)]),
+]
+
+
+# -----------------------------
+# Creation
+# -----------------------------
+def ensure_all_indexes(database=None, verbose=True):
+    """Create every declared index. Safe to call repeatedly; conflicts are reported, not raised."""
+    database = database if database is not None else db
+    created, failed = [], []
+    skip = _replace_indexes(database, created, failed)
+    for coll_name, specs in INDEX_SPECS.items():
+        coll = database[coll_name]
+        for keys, options in specs:
+            if (coll_name, options["name"]) in skip:
+                continue
+            try:
+                coll.create_index(keys, **options)
+                created.append(f"{coll_name}.{options['name']}")
+            except OperationFailure as e:
+                failed.append((f"{coll_name}.{options['name']}", str(e)))
+    if verbose:
+        print(f"🗂️ Indexes ensured: {len(created)} ok, {len(failed)} failed")
+        for name, err in failed:
+            print(f"⚠️ Index {name} not created: {err}")
+    return created, failed
+
+
+def _replace_indexes(database, created, failed):
+    """Swap superseded indexes for their replacements; returns the (collection, name) pairs handled."""
+    handled = set()
+    for coll_name, old, new in REPLACED_INDEXES:
+        coll = database[coll_name]
+        if old not in coll.index_information():
+            continue
+        keys, options = next((k, o) for k, o in INDEX_SPECS[coll_name] if o["name"] == new)
+        handled.add((coll_name, new))
+        coll.drop_index(old)
+        try:
+            coll.create_index(keys, **options)
+            created.append(f"{coll_name}.{new}")
+        except OperationFailure as e:
+            coll.create_index(keys, name=old)
+            failed.append((f"{coll_name}.{new}", f"{e} (kept {old})"))
+    return handled
+
+
+# -----------------------------
+# Query-plan verification
+# -----------------------------
+def _plan_stages(plan):
+    """Yield every stage name in a (possibly nested) explain plan."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for key in ("inputStage", "queryPlan"):
+            if key in plan:
+                yield from _plan_stages(plan[key])
+        for child in plan.get("inputStages", []):
+            yield from _plan_stages(child)
+    elif isinstance(plan, list):
+        for child in plan:
+            yield from _plan_stages(child)
+
+
+def explain_query_shapes(database=None):
+    """Return [(collection, filter, stages)] for every known query shape."""
+    database = database if database is not None else db
+    results = []
+    for coll_name, query, sort in QUERY_SHAPES:
+        cmd = {"find": coll_name, "filter": query}
+        if sort:
+            cmd["sort"] = dict(sort)
+        explained = database.command("explain", cmd, verbosity="queryPlanner")
+        winning = explained.get("queryPlanner", {}).get("winningPlan", {})
+        results.append((coll_name, query, list(_plan_stages(winning))))
+    return results
+
+
+def _seed(database):
+    """Insert a few representative documents so the planner sees real collections."""
+    now = datetime.utcnow()
+    database["students"].insert_many([
+        {"student_id": SAMPLE_STUDENT, "first_name": "A", "last_name": "B", "course": "BSINFOTECH",
+         "year_level": "4th Year", "section": "4C", "semester": "1st Sem", "created_at": now},
+        {"student_id": "22-1-1-0002", "first_name": "C", "last_name": "D", "course": "BSINFOTECH"},
+    ])
+    database["instructors"].insert_one({"instructor_id": SAMPLE_INSTRUCTOR, "email": "a@b.c", "first_name": "I"})
+    database["subjects"].insert_one({"subject_code": "IT101", "course": "BSINFOTECH", "year_level": "4th Year",
+                                     "semester": "1st Sem", "instructor_id": SAMPLE_INSTRUCTOR, "created_at": now})
+    database["classes"].insert_one({"subject_id": SAMPLE_CLASS, "course": "BSINFOTECH", "year_level": "4th Year",
+                                    "semester": "1st Sem", "section": "4C", "instructor_id": SAMPLE_INSTRUCTOR,
+                                    "room": "RM-101", "is_attendance_active": True, "created_at": now})
+    database["sessions"].insert_one({"class_id": SAMPLE_CLASS, "room_id": "RM-101", "status": "active",
+                                     "started_at": now, "ends_at": now})
+    database["enrollments"].insert_one({"class_id": SAMPLE_CLASS, "student_id": SAMPLE_STUDENT,
+                                        "term": "4th Year|1st Sem", "enrolled_at": now})
+    database["attendance_logs"].insert_one({"class_id": SAMPLE_CLASS, "date": SAMPLE_DATE,
+                                            "instructor_id": SAMPLE_INSTRUCTOR,
+                                            "students": [{"student_id": SAMPLE_STUDENT, "status": "Present"}]})
+    database["gallery_changes"].insert_one({"seq": 1, "op": "upsert", "student_id": SAMPLE_STUDENT,
+                                            "template": "front", "vector": [0.0], "at": now})
+    database["jobs"].insert_one({"kind": "cor_upload", "status": "queued", "owner": SAMPLE_STUDENT,
+                                 "created_at": now})
+
+
+def verify_query_plans(db_name="face_attendance_index_check", keep=False):
+    """Seed a scratch database, ensure indexes, and return the query shapes that fall back to COLLSCAN."""
+    scratch = client[db_name]
+    client.drop_database(db_name)
+    try:
+        _seed(scratch)
+        ensure_all_indexes(scratch, verbose=False)
+        offenders = []
+        for coll_name, query, stages in explain_query_shapes(scratch):
+            ok = "COLLSCAN" not in stages
+            print(f"{'✅' if ok else '❌'} {coll_name} {query} → {' > '.join(stages)}")
+            if not ok:
+                offenders.append((coll_name, query))
+        return offenders
+    finally:
+        if not keep:
+            client.drop_database(db_name)
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create and verify MongoDB indexes.")
+    parser.add_argument("--verify", action="store_true",
+                        help="explain() every known query shape on a seeded scratch DB; exit 1 on COLLSCAN")
+    parser.add_argument("--db-name", default="face_attendance_index_check",
+                        help="scratch database used by --verify")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database after --verify")
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        offenders = verify_query_plans(args.db_name, keep=args.keep)
+        if offenders:
+            print(f"❌ {len(offenders)} query shape(s) use COLLSCAN")
+            return 1
+        print("✅ All query shapes are index-backed")
+        return 0
+
+    _, failed = ensure_all_indexes()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
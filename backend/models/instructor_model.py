@@ -1,6 +1,7 @@
 # models/instructor_model.py
 
 from config.db_config import db
+from utils.response_cache import bump_versions, INSTRUCTORS
 
 instructors_collection = db["instructors"]
 
@@ -12,3 +13,4 @@ def find_instructor_by_email(email):
 
 def create_instructor(instructor_data):
     instructors_collection.insert_one(instructor_data)
+    bump_versions(INSTRUCTORS)
@@ -0,0 +1,176 @@
+from config.db_config import db
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+
+jobs_collection = db["jobs"]
+
+# Job lifecycle: queued -> running -> done | failed
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+LEASE_SECONDS = 300      # a running job whose worker stops heartbeating is re-queued after this
+MAX_ATTEMPTS = 3
+
+
+def _oid(job_id):
+    try:
+        return ObjectId(job_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+# ✅ Put a job on the queue; returns its id as a string
+def enqueue_job(kind, payload, owner=None):
+    now = datetime.utcnow()
+    result = jobs_collection.insert_one({
+        "kind": kind,
+        "payload": payload,
+        "owner": owner,
+        "status": QUEUED,
+        "progress": {"done": 0, "total": 0},
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "worker_id": None,
+        "lease_expires": None,
+        "created_at": now,
+        "updated_at": now,
+    })
+    return str(result.inserted_id)
+
+
+# ✅ Fail running jobs whose worker died on the last allowed attempt (nobody may claim them again)
+def fail_abandoned_jobs(now=None):
+    """Returns the jobs it failed (their owners' cleanup never ran)."""
+    now = now or datetime.utcnow()
+    query = {"status": RUNNING, "lease_expires": {"$lt": now}, "attempts": {"$gte": MAX_ATTEMPTS}}
+    failed = []
+    for job in jobs_collection.find(query, {"kind": 1, "payload": 1}):
+        result = jobs_collection.update_one(
+            {**query, "_id": job["_id"]},
+            {"$set": {
+                "status": FAILED,
+                "error": f"Worker stopped responding ({MAX_ATTEMPTS} attempts)",
+                "lease_expires": None,
+                "finished_at": now,
+                "updated_at": now,
+            }}
+        )
+        if result.modified_count:
+            failed.append(job)
+    return failed
+
+
+# ✅ Atomically claim the oldest queued job (or one whose lease expired and has attempts left;
+# call fail_abandoned_jobs for the others)
+def claim_next_job(worker_id, kinds=None, lease_seconds=LEASE_SECONDS):
+    now = datetime.utcnow()
+    query = {
+        "$or": [
+            {"status": QUEUED},
+            {"status": RUNNING, "lease_expires": {"$lt": now}},
+        ],
+        "attempts": {"$lt": MAX_ATTEMPTS},
+    }
+    if kinds:
+        query["kind"] = {"$in": list(kinds)}
+    return jobs_collection.find_one_and_update(
+        query,
+        {
+            "$set": {
+                "status": RUNNING,
+                "worker_id": worker_id,
+                "lease_expires": now + timedelta(seconds=lease_seconds),
+                "started_at": now,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _owned(job_id, worker_id):
+    """Filter for a running job still leased to worker_id (any worker when None)."""
+    query = {"_id": _oid(job_id), "status": RUNNING}
+    if worker_id is not None:
+        query["worker_id"] = worker_id
+    return query
+
+
+# ✅ Report progress (also renews the lease). False once the lease was lost to another worker.
+def update_job_progress(job_id, done, total, worker_id=None, lease_seconds=LEASE_SECONDS):
+    now = datetime.utcnow()
+    result = jobs_collection.update_one(
+        _owned(job_id, worker_id),
+        {"$set": {
+            "progress": {"done": done, "total": total},
+            "lease_expires": now + timedelta(seconds=lease_seconds),
+            "updated_at": now,
+        }}
+    )
+    return result.matched_count == 1
+
+
+def complete_job(job_id, result, worker_id=None):
+    """False when the lease was lost (the new owner reports the outcome)."""
+    return jobs_collection.update_one(
+        _owned(job_id, worker_id),
+        {"$set": {
+            "status": DONE,
+            "result": result,
+            "error": None,
+            "lease_expires": None,
+            "finished_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }}
+    ).matched_count == 1
+
+
+def fail_job(job_id, error, retry=False, worker_id=None):
+    """
+    Mark a job failed, or put it back on the queue when retry=True and attempts remain.
+    Returns the new status, or None when the lease was lost (the new owner reports the outcome).
+    """
+    job = jobs_collection.find_one(_owned(job_id, worker_id), {"attempts": 1})
+    if job is None:
+        return None
+    requeue = retry and job.get("attempts", 0) < MAX_ATTEMPTS
+    result = jobs_collection.update_one(
+        _owned(job_id, worker_id),
+        {"$set": {
+            "status": QUEUED if requeue else FAILED,
+            "error": str(error),
+            "lease_expires": None,
+            "finished_at": None if requeue else datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }}
+    )
+    if not result.matched_count:
+        return None
+    return QUEUED if requeue else FAILED
+
+
+# ✅ Get one job by id (None for malformed ids)
+def get_job(job_id):
+    oid = _oid(job_id)
+    if oid is None:
+        return None
+    return jobs_collection.find_one({"_id": oid})
+
+
+def job_to_status(job):
+    """Public view of a job for status polling."""
+    return {
+        "job_id": str(job["_id"]),
+        "kind": job.get("kind"),
+        "status": job.get("status"),
+        "progress": job.get("progress", {}),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "attempts": job.get("attempts", 0),
+        "created_at": job["created_at"].isoformat() if job.get("created_at") else None,
+        "finished_at": job["finished_at"].isoformat() if job.get("finished_at") else None,
+    }
@@ -0,0 +1,147 @@
+# models/session_model.py
+"""
+One document per attendance session. At most one active session per class and per room,
+enforced by partial unique indexes, so starts and stops are single atomic writes and
+rooms never wait on each other.
+"""
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config.db_config import db
+from utils.response_cache import bump_versions, CLASSES
+
+sessions_collection = db["sessions"]
+classes_collection = db["classes"]
+
+ACTIVE, CLOSED = "active", "closed"
+DEFAULT_DURATION_MINUTES = 30
+
+PH_TZ = timezone(timedelta(hours=8))
+
+
+class SessionConflict(Exception):
+    """The class or the room already has an active session."""
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def room_for_class(cls, room_id=None):
+    """Explicit room wins, then the class's configured room, else a per-class pseudo room."""
+    return str(room_id or (cls or {}).get("room") or f"class-{(cls or {}).get('_id')}")
+
+
+def _ph_iso(utc_naive):
+    return utc_naive.replace(tzinfo=timezone.utc).astimezone(PH_TZ).isoformat()
+
+
+def session_to_payload(session):
+    if not session:
+        return None
+    return {
+        "session_id": str(session["_id"]),
+        "class_id": session["class_id"],
+        "room_id": session["room_id"],
+        "status": session["status"],
+        "started_by": session.get("started_by"),
+        "started_at": _ph_iso(session["started_at"]) if session.get("started_at") else None,
+        "ends_at": _ph_iso(session["ends_at"]) if session.get("ends_at") else None,
+        "stopped_at": _ph_iso(session["stopped_at"]) if session.get("stopped_at") else None,
+    }
+
+
+def _mirror_class_flag(class_id, active, start=None, end=None, started_by=None):
+    """Keep classes.is_attendance_active in step for dashboards that read it directly."""
+    update = {"is_attendance_active": active, "attendance_end_time": _ph_iso(end)}
+    if active:
+        update["attendance_start_time"] = _ph_iso(start)
+        update["activated_by"] = started_by
+    classes_collection.update_one({"_id": ObjectId(class_id)}, {"$set": update})
+    bump_versions(CLASSES)
+
+
+# ✅ Atomic start: the insert itself is the lock (unique active class_id / room_id)
+def open_session(class_id, room_id=None, started_by=None, duration_minutes=DEFAULT_DURATION_MINUTES):
+    """Returns the new session document; raises LookupError / SessionConflict."""
+    class_id = str(class_id)
+    cls = classes_collection.find_one({"_id": ObjectId(class_id)}, {"room": 1})
+    if not cls:
+        raise LookupError(f"Class {class_id} not found")
+
+    expire_sessions()
+    now = datetime.utcnow()
+    session = {
+        "class_id": class_id,
+        "room_id": room_for_class(cls, room_id),
+        "status": ACTIVE,
+        "started_by": started_by or "system",
+        "started_at": now,
+        "ends_at": now + timedelta(minutes=duration_minutes),
+    }
+    try:
+        session["_id"] = sessions_collection.insert_one(session).inserted_id
+    except DuplicateKeyError:
+        busy = sessions_collection.find_one(
+            {"status": ACTIVE, "$or": [{"class_id": class_id}, {"room_id": session["room_id"]}]}
+        )
+        raise SessionConflict(
+            f"Room {busy['room_id']} / class {busy['class_id']} already has an active session"
+            if busy else f"Class {class_id} already has an active session"
+        )
+
+    _mirror_class_flag(class_id, True, now, session["ends_at"], session["started_by"])
+    return session
+
+
+# ✅ Atomic stop of one class's (or one room's) active session; None if nothing was active
+def close_session(class_id=None, room_id=None, reason="manual"):
+    query = {"status": ACTIVE}
+    if class_id:
+        query["class_id"] = str(class_id)
+    if room_id:
+        query["room_id"] = str(room_id)
+    if len(query) == 1:
+        raise ValueError("class_id or room_id is required")
+
+    now = datetime.utcnow()
+    session = sessions_collection.find_one_and_update(
+        query,
+        {"$set": {"status": CLOSED, "stopped_at": now, "stop_reason": reason}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if session:
+        _mirror_class_flag(session["class_id"], False, end=now)
+    return session
+
+
+def expire_sessions(now=None):
+    """Close every session past ends_at (one indexed query); returns the closed sessions."""
+    now = now or datetime.utcnow()
+    expired = []
+    for s in sessions_collection.find({"status": ACTIVE, "ends_at": {"$lte": now}}, {"_id": 1}):
+        session = sessions_collection.find_one_and_update(
+            {"_id": s["_id"], "status": ACTIVE},
+            {"$set": {"status": CLOSED, "stopped_at": now, "stop_reason": "expired"}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if session:
+            _mirror_class_flag(session["class_id"], False, end=now)
+            expired.append(session)
+    return expired
+
+
+# ✅ Reads
+def get_active_session(class_id=None, room_id=None):
+    query = {"status": ACTIVE, "ends_at": {"$gt": datetime.utcnow()}}
+    if class_id:
+        query["class_id"] = str(class_id)
+    if room_id:
+        query["room_id"] = str(room_id)
+    return sessions_collection.find_one(query)
+
+
+def list_active_sessions():
+    return list(sessions_collection.find(
+        {"status": ACTIVE, "ends_at": {"$gt": datetime.utcnow()}}
+    ).sort("room_id", 1))
@@ -1,29 +1,23 @@
 from config.db_config import db
+from utils.response_cache import bump_versions, STUDENTS
+from models.student_schema import canonical_student_fields
 
 # Reference to the MongoDB 'students' collection
 students_collection = db["students"]
 
-# ✅ Create a new student (expects lowercase keys ideally)
+# ✅ Create a new student (legacy keys are renamed to the canonical schema)
 def create_student(student_data):
-    return students_collection.insert_one(student_data)
+    result = students_collection.insert_one(canonical_student_fields(student_data))
+    bump_versions(STUDENTS)
+    return result
 
-# ✅ Find one student by student_id (supports both student_id and legacy Student_ID)
+# ✅ Find one student by student_id (unique index)
 def find_student_by_student_id(student_id):
-    return students_collection.find_one({
-        "$or": [
-            {"student_id": student_id},
-            {"Student_ID": student_id}
-        ]
-    })
+    return students_collection.find_one({"student_id": student_id})
 
-# ✅ Get one student by ID (same as above, fallback support)
+# ✅ Get one student by ID (same as above)
 def get_student_by_id(student_id):
-    return students_collection.find_one({
-        "$or": [
-            {"student_id": student_id},
-            {"Student_ID": student_id}
-        ]
-    })
+    return students_collection.find_one({"student_id": student_id})
 
 # ✅ Get all students in the system
 def get_all_students():
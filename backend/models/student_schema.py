@@ -0,0 +1,132 @@
+# models/student_schema.py
+"""
+Canonical (lowercase) student schema, a write-side guard, and the one-shot migration.
+
+    python -m models.student_schema --dry-run   # count documents that still carry legacy keys
+    python -m models.student_schema             # migrate them in a single server-side update
+"""
+import sys
+import argparse
+from config.db_config import db
+
+students_collection = db["students"]
+
+# legacy key -> canonical key
+LEGACY_FIELDS = {
+    "Student_ID": "student_id",
+    "First_Name": "first_name",
+    "Last_Name": "last_name",
+    "Middle_Name": "middle_name",
+    "Course": "course",
+    "Section": "section",
+    "Year_Level": "year_level",
+    "Semester": "semester",
+    "Email": "email",
+    "Contact_Number": "contact_number",
+    "Subjects": "subjects",
+}
+
+# Projection used by readers that only need profile + templates
+STUDENT_PROJECTION = {
+    "_id": 0,
+    "student_id": 1,
+    "first_name": 1,
+    "last_name": 1,
+    "middle_name": 1,
+    "course": 1,
+    "section": 1,
+    "year_level": 1,
+    "semester": 1,
+    "email": 1,
+    "contact_number": 1,
+    "subjects": 1,
+    "created_at": 1,
+    "embeddings": 1,
+}
+
+
+# -----------------------------
+# Write-side guard
+# -----------------------------
+def canonical_student_fields(fields, drop_empty=False):
+    """
+    Rename legacy keys in a student insert/$set payload to their canonical form.
+    Dotted paths (e.g. "embeddings.front") pass through untouched.
+    drop_empty=True skips "" / [] / None placeholders so they never overwrite real values.
+    """
+    out = {}
+    for key, value in (fields or {}).items():
+        key = LEGACY_FIELDS.get(key, key)
+        if drop_empty and value in ("", None, []):
+            continue
+        out[key] = value
+    return out
+
+
+# -----------------------------
+# Migration
+# -----------------------------
+def _legacy_filter():
+    return {"$or": [{legacy: {"$exists": True}} for legacy in LEGACY_FIELDS]}
+
+
+def _pick(canonical, legacy):
+    """Keep the canonical value unless it is missing/empty, then fall back to the legacy one."""
+    current = {"$ifNull": [f"${canonical}", ""]}
+    return {"$cond": [{"$in": [current, ["", []]]}, f"${legacy}", f"${canonical}"]}
+
+
+def migrate_students(dry_run=False):
+    """
+    Move every legacy key onto its canonical field and drop the legacy key,
+    using one pipeline-style update_many (no per-document round trips).
+    """
+    pending = students_collection.count_documents(_legacy_filter())
+    print(f"📋 Students with legacy fields: {pending}")
+    if dry_run or not pending:
+        return {"pending": pending, "modified": 0}
+
+    set_stage = {}
+    for legacy, canonical in LEGACY_FIELDS.items():
+        if canonical == "subjects":
+            set_stage["subjects"] = {"$setUnion": [
+                {"$ifNull": ["$subjects", []]},
+                {"$ifNull": ["$Subjects", []]},
+            ]}
+        else:
+            set_stage[canonical] = _pick(canonical, legacy)
+
+    result = students_collection.update_many(
+        _legacy_filter(),
+        [{"$set": set_stage}, {"$unset": list(LEGACY_FIELDS)}]
+    )
+    print(f"✅ Migrated {result.modified_count} student documents")
+    return {"pending": pending, "modified": result.modified_count}
+
+
+def find_duplicate_student_ids():
+    """student_ids held by more than one document (must be merged before the unique index can build)."""
+    return list(students_collection.aggregate([
+        {"$group": {"_id": "$student_id", "count": {"$sum": 1}, "ids": {"$push": "$_id"}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]))
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalize student documents to the canonical schema.")
+    parser.add_argument("--dry-run", action="store_true", help="only count documents needing migration")
+    args = parser.parse_args(argv)
+
+    migrate_students(dry_run=args.dry_run)
+
+    duplicates = find_duplicate_student_ids()
+    for dup in duplicates:
+        print(f"⚠️ Duplicate student_id {dup['_id']!r} in {dup['count']} documents: {dup['ids']}")
+    return 1 if duplicates else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 from config.db_config import db
 from bson import ObjectId
 from datetime import datetime
+from utils.response_cache import bump_versions, SUBJECTS
 
 subjects_collection = db["subjects"]
 
@@ -9,7 +10,9 @@ def create_subject(subject_data):
     subject_data["created_at"] = datetime.utcnow()
     subject_data.setdefault("year_level", None)
     subject_data.setdefault("semester", None)
-    return subjects_collection.insert_one(subject_data)
+    result = subjects_collection.insert_one(subject_data)
+    bump_versions(SUBJECTS)
+    return result
 
 # ✅ Find a subject by subject_code (avoid duplicates / match COR)
 def get_subject_by_code(subject_code):
@@ -76,6 +79,7 @@ def update_subject_attendance_status(subject_id, is_active, activated_by=None):
         {"_id": ObjectId(subject_id)},
         {"$set": update_data}
     )
+    bump_versions(SUBJECTS)
 
     if result.modified_count == 0:
         print(f"⚠️ Subject {subject_id} not updated. Maybe wrong ObjectId?")
@@ -3,11 +3,12 @@ import json
 import numpy as np
 from datetime import datetime
 import mediapipe as mp
-from insightface.app import FaceAnalysis
+from utils.onnx_sessions import get_face_analysis
+from utils.model_packs import get_pack
 
 # === SETUP ===
-face_model = FaceAnalysis(name='buffalo_l')
-face_model.prepare(ctx_id=0)
+pack = get_pack()  # FACE_MODEL_PACK
+face_model = get_face_analysis(pack["name"])
 
 mp_face_mesh = mp.solutions.face_mesh
 face_mesh = mp_face_mesh.FaceMesh(refine_landmarks=True)
@@ -26,6 +27,7 @@ output_json = f"student_{student_id}_embeddings.json"
 embeddings = {
     "student_id": student_id,
     "created_at": datetime.utcnow().isoformat(),
+    "pack": pack["namespace"],
     "embeddings": {}
 }
 
@@ -3,9 +3,33 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 from datetime import datetime, timedelta, date
 import os
+import shutil
+import zipfile
 from bson import ObjectId
+from werkzeug.utils import secure_filename
 from config.db_config import db
 from models.admin_model import find_admin_by_user_id, find_admin_by_email, create_admin
+from models.job_model import enqueue_job, get_job, job_to_status
+from models.session_model import close_session
+from models.gallery_changelog_model import record_template_delete
+from models.enrollment_model import (
+    get_class_roster, get_class_rosters, delete_class_enrollments, delete_student_enrollments,
+)
+from utils.job_worker import COR_BULK_IMPORT, TEMPLATE_COMPACTION, notify_workers
+from utils.scheduler import notify_schedule_changed
+from utils.session_context import invalidate_session_context
+from utils.model_packs import resolve_namespace
+from utils.template_sets import TEMPLATE_CAP
+from utils.response_cache import (
+    cached_response,
+    bump_versions,
+    ATTENDANCE,
+    ENROLLMENT,
+    CLASSES,
+    SUBJECTS,
+    INSTRUCTORS,
+    STUDENTS,
+)
 
 admin_bp = Blueprint("admin_bp", __name__)
 secret_key = os.getenv("JWT_SECRET", os.getenv("JWT_SECRET_KEY", "yoursecretkey"))
@@ -46,7 +70,7 @@ def _serialize_subject(s):
         "created_at": s.get("created_at"),
     }
 
-def _serialize_class(cls):
+def _serialize_class(cls, roster=None):
     return {
         "_id": str(cls.get("_id")),
         "subject_id": str(cls.get("subject_id")) if cls.get("subject_id") else None,
@@ -60,7 +84,7 @@ def _serialize_class(cls):
         "instructor_first_name": cls.get("instructor_first_name") or "N/A",
         "instructor_last_name": cls.get("instructor_last_name") or "N/A",
         "schedule_blocks": cls.get("schedule_blocks", []),
-        "students": cls.get("students", []),
+        "students": roster or [],
         "created_at": cls.get("created_at").isoformat() if cls.get("created_at") else None,
     }
 
@@ -144,6 +168,7 @@ def login_admin():
 # ✅ Admin Overview Endpoints
 # ==============================
 @admin_bp.route("/api/admin/overview/stats", methods=["GET"])
+@cached_response(ATTENDANCE, STUDENTS, INSTRUCTORS, CLASSES)
 def get_stats():
     today = datetime.utcnow().strftime("%Y-%m-%d") 
     attendance_today = 0
@@ -160,6 +185,7 @@ def get_stats():
     )
 
 @admin_bp.route("/api/admin/overview/attendance-distribution", methods=["GET"])
+@cached_response(ATTENDANCE)
 def attendance_distribution():
     pipeline = [
         {"$unwind": "$students"},
@@ -187,6 +213,7 @@ def attendance_distribution():
     })
 
 @admin_bp.route("/api/admin/overview/attendance-trend", methods=["GET"])
+@cached_response(ATTENDANCE)
 def attendance_trend():
     days = int(request.args.get("days", 7))
     end_date = datetime.utcnow().date()  
@@ -201,6 +228,7 @@ def attendance_trend():
     return jsonify(trend)
 
 @admin_bp.route("/api/admin/overview/recent-logs", methods=["GET"])
+@cached_response(ATTENDANCE)
 def recent_logs():
     limit = int(request.args.get("limit", 5))
     docs = list(attendance_logs_col.find().sort("date", -1).limit(20))
@@ -232,6 +260,7 @@ def recent_logs():
     return jsonify(flattened[:limit])
 
 @admin_bp.route("/api/admin/overview/last-student", methods=["GET"])
+@cached_response(STUDENTS)
 def last_student():
     student = students_col.find_one(sort=[("created_at", -1)])
     if not student:
@@ -239,14 +268,100 @@ def last_student():
     return jsonify(
         {
             "student_id": student.get("student_id"),
-            "first_name": student.get("First_Name")
-            or student.get("first_name"),
-            "last_name": student.get("Last_Name")
-            or student.get("last_name"),
+            "first_name": student.get("first_name"),
+            "last_name": student.get("last_name"),
             "created_at": student.get("created_at"),
         }
     )
 
+@admin_bp.route("/api/admin/overview/dashboard", methods=["GET"])
+@cached_response(ATTENDANCE, STUDENTS, INSTRUCTORS, CLASSES)
+def admin_dashboard():
+    """Stats, distribution, trend and recent logs; the distribution covers the trend window."""
+    days = max(1, int(request.args.get("days", 7)))
+    limit = int(request.args.get("limit", 5))
+    end_date = datetime.utcnow().date()
+    today = end_date.strftime("%Y-%m-%d")
+    trend_dates = [
+        (end_date - timedelta(days=(days - 1 - i))).strftime("%Y-%m-%d")
+        for i in range(days)
+    ]
+
+    roster_size = {"$size": {"$ifNull": ["$students", []]}}
+
+    # Only logs inside the window reach the facet (date_desc index)
+    pipeline = [
+        {"$match": {"date": {"$gte": trend_dates[0], "$lte": today}}},
+        {"$project": {"date": 1, "students.status": 1}},
+        {"$facet": {
+            "today": [
+                {"$match": {"date": today}},
+                {"$group": {"_id": None, "n": {"$sum": roster_size}}}
+            ],
+            "distribution": [
+                {"$unwind": "$students"},
+                {"$group": {"_id": "$students.status", "count": {"$sum": 1}}}
+            ],
+            "trend": [
+                {"$group": {"_id": "$date", "count": {"$sum": roster_size}}}
+            ]
+        }}
+    ]
+    facets = next(attendance_logs_col.aggregate(pipeline), {})
+    today_rows = facets.get("today") or [{}]
+
+    recent = attendance_logs_col.find(
+        {}, {"date": 1, "subject_code": 1, "subject_title": 1, "students": 1}
+    ).sort("date", -1).limit(20)
+
+    distribution = {"present": 0, "late": 0, "absent": 0}
+    for r in facets.get("distribution", []):
+        status = (r["_id"] or "").strip().lower()
+        if status in distribution:
+            distribution[status] = r["count"]
+
+    per_day = {r["_id"]: r["count"] for r in facets.get("trend", [])}
+
+    flattened = []
+    for log in recent:
+        subject_title = log.get("subject_title")
+        subject_code = log.get("subject_code")
+        subject = (
+            f"{subject_code} - {subject_title}"
+            if subject_code and subject_title
+            else (subject_title or subject_code)
+        )
+        for stu in log.get("students", []):
+            flattened.append(
+                {
+                    "student": {
+                        "first_name": stu.get("first_name")
+                        or stu.get("First_Name"),
+                        "last_name": stu.get("last_name")
+                        or stu.get("Last_Name"),
+                        "student_id": stu.get("student_id"),
+                    },
+                    "subject": subject,
+                    "status": stu.get("status"),
+                    "timestamp": stu.get("time_logged") or log.get("date"),
+                }
+            )
+    flattened.sort(key=lambda x: str(x.get("timestamp") or ""), reverse=True)
+
+    return jsonify(
+        {
+            "stats": {
+                "total_students": students_col.estimated_document_count(),
+                "total_instructors": instructors_col.estimated_document_count(),
+                "total_classes": classes_col.estimated_document_count(),
+                "attendance_today": today_rows[0].get("n", 0),
+            },
+            "distribution": distribution,
+            "trend": [{"date": d, "count": per_day.get(d, 0)} for d in trend_dates],
+            "recent_logs": flattened[:limit],
+        }
+    )
+
 from flask import jsonify, request
 from datetime import datetime, timezone
 
@@ -256,6 +371,7 @@ from datetime import datetime, timezone
 
 # 📌 GET ALL STUDENTS
 @admin_bp.route("/api/admin/students", methods=["GET"])
+@cached_response(STUDENTS, ATTENDANCE)
 def get_all_students():
     students = list(
         students_col.find(
@@ -263,11 +379,11 @@ def get_all_students():
             {
                 "_id": 0,
                 "student_id": 1,
-                "First_Name": 1,
-                "Last_Name": 1,
-                "Middle_Name": 1,
-                "Course": 1,
-                "Section": 1,
+                "first_name": 1,
+                "last_name": 1,
+                "middle_name": 1,
+                "course": 1,
+                "section": 1,
                 "created_at": 1,
             },
         )
@@ -313,11 +429,11 @@ def get_all_students():
         normalized.append(
             {
                 "student_id": sid,
-                "first_name": s.get("First_Name"),
-                "last_name": s.get("Last_Name"),
-                "middle_name": s.get("Middle_Name"),
-                "course": s.get("Course"),
-                "section": s.get("Section"),
+                "first_name": s.get("first_name"),
+                "last_name": s.get("last_name"),
+                "middle_name": s.get("middle_name"),
+                "course": s.get("course"),
+                "section": s.get("section"),
                 "created_at": s.get("created_at"),
                 "attendance_rate": attendance_rate,
             }
@@ -367,11 +483,11 @@ def get_student(student_id):
     return jsonify(
         {
             "student_id": student.get("student_id"),
-            "first_name": student.get("First_Name"),
-            "last_name": student.get("Last_Name"),
-            "middle_name": student.get("Middle_Name"),
-            "course": student.get("Course"),
-            "section": student.get("Section"),
+            "first_name": student.get("first_name"),
+            "last_name": student.get("last_name"),
+            "middle_name": student.get("middle_name"),
+            "course": student.get("course"),
+            "section": student.get("section"),
             "created_at": student.get("created_at"),
             "attendance_rate": attendance_rate,
         }
@@ -382,17 +498,11 @@ def get_student(student_id):
 @admin_bp.route("/api/admin/students/<student_id>", methods=["PUT"])
 def update_student(student_id):
     data = request.get_json() or {}
-    update_data = {}
-    if "first_name" in data:
-        update_data["First_Name"] = data["first_name"]
-    if "last_name" in data:
-        update_data["Last_Name"] = data["last_name"]
-    if "middle_name" in data:
-        update_data["Middle_Name"] = data["middle_name"]
-    if "course" in data:
-        update_data["Course"] = data["course"]
-    if "section" in data:
-        update_data["Section"] = data["section"]
+    update_data = {
+        field: data[field]
+        for field in ["first_name", "last_name", "middle_name", "course", "section"]
+        if field in data
+    }
 
     if not update_data:
         return jsonify({"error": "No valid fields provided"}), 400
@@ -400,6 +510,7 @@ def update_student(student_id):
     result = students_col.update_one({"student_id": student_id}, {"$set": update_data})
     if result.matched_count == 0:
         return jsonify({"error": "Student not found"}), 404
+    bump_versions(STUDENTS)
     return jsonify({"message": "Student updated successfully"}), 200
 
 
@@ -409,12 +520,16 @@ def delete_student(student_id):
     result = students_col.delete_one({"student_id": student_id})
     if result.deleted_count == 0:
         return jsonify({"error": "Student not found"}), 404
+    delete_student_enrollments(student_id)
+    record_template_delete(student_id)
+    bump_versions(STUDENTS, ENROLLMENT)
     return jsonify({"message": "Student deleted successfully"}), 200
 
 # ==============================
 # ✅ Subject Management
 # ==============================
 @admin_bp.route("/api/admin/subjects", methods=["GET"])
+@cached_response(SUBJECTS)
 def get_subjects():
     subjects = list(subjects_col.find().sort("created_at", -1))
     return jsonify([_serialize_subject(s) for s in subjects])
@@ -442,6 +557,7 @@ def create_subject():
     }
 
     result = subjects_col.insert_one(subject_doc)
+    bump_versions(SUBJECTS)
     new_subject = subjects_col.find_one({"_id": result.inserted_id})
     if new_subject:
         new_subject["_id"] = str(new_subject["_id"])
@@ -458,6 +574,7 @@ def update_subject(id):
     result = subjects_col.update_one({"_id": ObjectId(id)}, {"$set": update_data})
     if result.matched_count == 0:
         return jsonify({"error": "Subject not found"}), 404
+    bump_versions(SUBJECTS)
     return jsonify({"message": "Subject updated successfully"}), 200
 
 @admin_bp.route("/api/admin/subjects/<id>", methods=["DELETE"])
@@ -465,6 +582,7 @@ def delete_subject(id):
     result = subjects_col.delete_one({"_id": ObjectId(id)})
     if result.deleted_count == 0:
         return jsonify({"error": "Subject not found"}), 404
+    bump_versions(SUBJECTS)
     return jsonify({"message": "Subject deleted successfully"}), 200
 
 
@@ -472,8 +590,10 @@ def delete_subject(id):
 # ✅ Class Management
 # ==============================
 @admin_bp.route("/api/classes", methods=["GET"])
+@cached_response(CLASSES, ENROLLMENT, ATTENDANCE)
 def get_all_classes():
     classes = list(classes_col.find().sort("created_at", -1))
+    rosters = get_class_rosters([cls["_id"] for cls in classes])
     output = []
 
     for cls in classes:
@@ -498,7 +618,7 @@ def get_all_classes():
 
         attendance_rate = round(((present_count + late_count) / total_logs) * 100, 2) if total_logs > 0 else 0
 
-        cls_data = _serialize_class(cls)
+        cls_data = _serialize_class(cls, rosters.get(class_id))
         cls_data["attendance_rate"] = attendance_rate
         cls_data["attendance_breakdown"] = {
             "present": present_count,
@@ -541,7 +661,7 @@ def get_class(id):
 
     attendance_rate = round(((present_count + late_count) / total_logs) * 100, 2) if total_logs > 0 else 0
 
-    cls_data = _serialize_class(cls)
+    cls_data = _serialize_class(cls, get_class_roster(class_id))
     cls_data["attendance_rate"] = attendance_rate
     cls_data["attendance_breakdown"] = {
         "present": present_count,
@@ -560,6 +680,7 @@ def update_class(id):
     for field in [
         "section",
         "semester",
+        "room",
         "schedule_blocks",
         "instructor_id",
         "instructor_first_name",
@@ -569,6 +690,8 @@ def update_class(id):
             update_data[field] = data[field]
     if not update_data:
         return jsonify({"error": "No valid fields provided"}), 400
+    if "schedule_blocks" in update_data:
+        update_data["schedule_updated_at"] = datetime.utcnow()
 
     try:
         result = classes_col.update_one({"_id": ObjectId(id)}, {"$set": update_data})
@@ -576,6 +699,10 @@ def update_class(id):
         return jsonify({"error": "Invalid class ID"}), 400
     if result.matched_count == 0:
         return jsonify({"error": "Class not found"}), 404
+    if "schedule_blocks" in update_data:
+        notify_schedule_changed(id, update_data["schedule_blocks"])
+    invalidate_session_context(id)
+    bump_versions(CLASSES)
     return jsonify({"message": "Class updated successfully"}), 200
 
 
@@ -587,6 +714,11 @@ def delete_class(id):
         return jsonify({"error": "Invalid class ID"}), 400
     if result.deleted_count == 0:
         return jsonify({"error": "Class not found"}), 404
+    delete_class_enrollments(id)
+    close_session(class_id=id, reason="class_deleted")
+    invalidate_session_context(id)
+    notify_schedule_changed(id, deleted=True)
+    bump_versions(CLASSES, ENROLLMENT)
     return jsonify({"message": "Class deleted successfully"}), 200
 
 
@@ -594,6 +726,7 @@ def delete_class(id):
 # ✅ Instructor Management
 # ==============================
 @admin_bp.route("/api/instructors", methods=["GET"])
+@cached_response(INSTRUCTORS)
 def get_all_instructors():
     instructors = list(instructors_col.find().sort("first_name", 1))
     formatted = []
@@ -635,6 +768,9 @@ def assign_instructor_to_class(class_id):
         return jsonify({"error": "Invalid class ID"}), 400
     if result.matched_count == 0:
         return jsonify({"error": "Class not found"}), 404
+    close_session(class_id=class_id, reason="instructor_changed")
+    invalidate_session_context(class_id)
+    bump_versions(CLASSES)
 
     return jsonify(
         {
@@ -690,3 +826,94 @@ def get_attendance_logs():
 
     return jsonify(logs), 200
 
+
+# ==============================
+# ✅ Bulk COR Import (Admin)
+# ==============================
+BULK_COR_FOLDER = os.path.join(os.getcwd(), "uploads", "cor", "bulk")
+
+@admin_bp.route("/api/admin/cor/bulk-import", methods=["POST"])
+def bulk_import_cor():
+    """Accepts a zip (cor_zip) or several PDFs (cor_files); parsing + enrollment run as a background job."""
+    archive = request.files.get("cor_zip")
+    pdfs = [f for f in request.files.getlist("cor_files") if f and f.filename]
+    if not archive and not pdfs:
+        return jsonify({"error": "Upload a zip (cor_zip) or PDF files (cor_files)"}), 400
+    processes = request.args.get("processes", type=int)
+    max_processes = os.cpu_count() or 1
+    if "processes" in request.args and (processes is None or not 1 <= processes <= max_processes):
+        return jsonify({"error": f"processes must be between 1 and {max_processes}"}), 400
+
+    batch_dir = os.path.join(BULK_COR_FOLDER, datetime.utcnow().strftime("%Y%m%d%H%M%S%f"))
+    os.makedirs(batch_dir, exist_ok=True)
+
+    if archive:
+        source = os.path.join(batch_dir, secure_filename(archive.filename) or "cor.zip")
+        archive.save(source)
+        if not zipfile.is_zipfile(source):
+            shutil.rmtree(batch_dir, ignore_errors=True)
+            return jsonify({"error": "cor_zip is not a valid zip archive"}), 400
+    else:
+        source = batch_dir
+    saved = set()
+    for f in pdfs:
+        name = secure_filename(f.filename)
+        if not name.lower().endswith(".pdf"):
+            continue
+        # Distinct uploads can share a secure_filename; suffix (not prefix) keeps the
+        # <student_id>_... filename fallback intact
+        stem, ext = os.path.splitext(name)
+        n = 1
+        while name.lower() in saved:
+            n += 1
+            name = f"{stem}_{n}{ext}"
+        saved.add(name.lower())
+        f.save(os.path.join(batch_dir, name))
+
+    job_id = enqueue_job(COR_BULK_IMPORT, {
+        "source": source,
+        "workdir": batch_dir,
+        "dry_run": request.args.get("dry_run") in ("1", "true"),
+        "processes": processes,
+    }, owner="admin")
+    notify_workers()
+
+    return jsonify({
+        "message": "COR import queued",
+        "job_id": job_id,
+        "status_url": f"/api/admin/jobs/{job_id}",
+    }), 202
+
+
+@admin_bp.route("/api/admin/templates/compact", methods=["POST"])
+def compact_templates():
+    """Consolidate students holding more than ?cap= templates (default FACE_TEMPLATE_CAP) as a background job."""
+    cap = request.args.get("cap", TEMPLATE_CAP, type=int)
+    if cap < 1:
+        return jsonify({"error": "cap must be at least 1"}), 400
+    pack = request.args.get("pack")
+    try:
+        pack = resolve_namespace(pack) if pack else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    job_id = enqueue_job(TEMPLATE_COMPACTION, {
+        "cap": cap,
+        "pack": pack,
+        "dry_run": request.args.get("dry_run") in ("1", "true"),
+    }, owner="admin")
+    notify_workers()
+
+    return jsonify({
+        "message": "Template compaction queued",
+        "job_id": job_id,
+        "status_url": f"/api/admin/jobs/{job_id}",
+    }), 202
+
+
+@admin_bp.route("/api/admin/jobs/<job_id>", methods=["GET"])
+def get_admin_job(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_to_status(job)), 200
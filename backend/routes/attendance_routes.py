@@ -1,11 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime, timedelta, timezone
 
-from utils.attendance_session import (
-    start_attendance_session,
-    stop_attendance_session,
-)
+from utils.session_context import get_session_context, invalidate_session_context
+from utils.gallery_shard import GalleryShard, GALLERY_MIMETYPE, pack_changes
+from utils.scheduler import parse_schedule_blocks, next_occurrence
 from config.db_config import db
 
 # 🔹 Work with classes instead of subjects
@@ -19,6 +19,19 @@ from models.attendance_model import (
     get_attendance_by_class,
     mark_absent_bulk,
 )
+from models.enrollment_model import get_class_roster
+from models.face_db_model import load_registered_faces
+from models.gallery_changelog_model import settled_gallery_seq, get_gallery_changes
+from utils.model_packs import resolve_namespace
+from utils.kiosk_auth import kiosk_required
+from models.session_model import (
+    SessionConflict,
+    open_session,
+    close_session,
+    get_active_session as get_active_session_doc,
+    list_active_sessions,
+    session_to_payload,
+)
 
 attendance_bp = Blueprint("attendance", __name__)
 
@@ -43,7 +56,7 @@ def _parse_date(date_str):
     except ValueError:
         return _today_date()
 
-def _class_to_payload(cls):
+def _class_to_payload(cls, roster=None):
     if not cls:
         return None
     return {
@@ -58,33 +71,54 @@ def _class_to_payload(cls):
         "is_attendance_active": cls.get("is_attendance_active", False),
         "attendance_start_time": cls.get("attendance_start_time"),
         "attendance_end_time": cls.get("attendance_end_time"),
-        "students": cls.get("students", []),
+        "students": roster if roster is not None else get_class_roster(cls["_id"]),
+    }
+
+def _context_to_payload(context):
+    """The _class_to_payload shape of an active class, built from its cached session context."""
+    if not context:
+        return None
+    return {
+        **context["class_data"],
+        "is_attendance_active": True,
+        "attendance_start_time": context["attendance_start_time"],
+        "attendance_end_time": context["attendance_end_time"],
+        "students": context["roster"],
     }
 
 # -----------------------------
 # API ROUTES
 # -----------------------------
 
-# ✅ Start attendance session
+# ✅ Start attendance session (one per class and per room; rooms run in parallel)
 @attendance_bp.route("/start-session", methods=["POST"])
 def start_session():
     try:
         data = request.get_json(silent=True) or {}
         class_id = data.get("class_id")
         instructor_id = data.get("instructor_id")
+        room_id = data.get("room_id")
 
         if not class_id:
             return jsonify({"error": "Missing class_id"}), 400
 
-        ok = start_attendance_session(class_id, instructor_id)
-        if not ok:
+        try:
+            session = open_session(class_id, room_id=room_id, started_by=instructor_id)
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        except SessionConflict as e:
+            return jsonify({"error": str(e)}), 409
+        except InvalidId:
             return jsonify({"error": f"Failed to start session for class {class_id}"}), 400
 
-        cls = classes_collection.find_one({"_id": ObjectId(class_id)})
+        # Prime the ingest cache: /log calls for this session are served from it
+        context = get_session_context(class_id, refresh=True)
+        cls = classes_collection.find_one({"_id": ObjectId(class_id)}, {"students": 0})
         return jsonify({
             "success": True,
-            "message": f"✅ Attendance session started for class {class_id}",
-            "class": _class_to_payload(cls),
+            "message": f"✅ Attendance session started for class {class_id} in room {session['room_id']}",
+            "session": session_to_payload(session),
+            "class": _class_to_payload(cls, context["roster"] if context else None),
         }), 200
 
     except Exception:
@@ -92,22 +126,25 @@ def start_session():
         print("❌ Error in /start-session:", traceback.format_exc())
         return jsonify({"error": "Internal server error"}), 500
 
-# ✅ Stop attendance session (auto-mark absentees)
+# ✅ Stop attendance session by class or room (auto-mark absentees)
 @attendance_bp.route("/stop-session", methods=["POST"])
 def stop_session():
     try:
         data = request.get_json(silent=True) or {}
         class_id = data.get("class_id")
+        room_id = data.get("room_id")
 
-        if not class_id:
-            return jsonify({"error": "Missing class_id"}), 400
+        if not class_id and not room_id:
+            return jsonify({"error": "Missing class_id or room_id"}), 400
 
-        ok = stop_attendance_session(class_id)
-        if not ok:
-            return jsonify({"error": f"No active session for class {class_id}"}), 400
+        session = close_session(class_id=class_id, room_id=room_id)
+        if not session:
+            return jsonify({"error": f"No active session for {'class ' + class_id if class_id else 'room ' + room_id}"}), 400
+        class_id = session["class_id"]
 
-        cls = classes_collection.find_one({"_id": ObjectId(class_id)})
-        if not cls:
+        context = get_session_context(class_id)
+        invalidate_session_context(class_id)
+        if not context:
             return jsonify({"error": "Class not found"}), 404
 
         # 🔹 Auto mark absentees
@@ -118,19 +155,27 @@ def stop_session():
         logged_ids = {
             s["student_id"] for log in today_logs for s in log.get("students", [])
         }
-        all_students = cls.get("students", [])
+        all_students = context["roster"]
         absent_students = [
             s for s in all_students if s.get("student_id") not in logged_ids
         ]
 
+        stopped = session_to_payload(session)
+        class_data = {
+            **context["class_data"],
+            "is_attendance_active": False,
+            "attendance_start_time": stopped["started_at"],
+            "attendance_end_time": stopped["stopped_at"],
+            "students": all_students,
+        }
         if absent_students:
-            class_data = _class_to_payload(cls)
             mark_absent_bulk(class_data, today, absent_students)
 
         return jsonify({
             "success": True,
             "message": f"🛑 Session stopped. Absent marked for {len(absent_students)} students.",
-            "class": _class_to_payload(cls),
+            "session": stopped,
+            "class": class_data,
         }), 200
 
     except Exception:
@@ -138,20 +183,148 @@ def stop_session():
         print("❌ Error in /stop-session:", traceback.format_exc())
         return jsonify({"error": "Internal server error"}), 500
 
-# ✅ Get currently active session
+# ✅ Active session of one room (?room_id=, used by kiosks), or every active session
 @attendance_bp.route("/active-session", methods=["GET"])
 def get_active_session():
     try:
-        cls = classes_collection.find_one({"is_attendance_active": True})
-        if cls:
-            return jsonify({"active": True, "class": _class_to_payload(cls)}), 200
-        return jsonify({"active": False}), 200
+        # Kiosks poll this every few seconds: one indexed sessions read, the class from the session
+        # cache. Expired sessions are excluded by the read and closed by the job worker's sweep.
+        room_id = request.args.get("room_id")
+        class_id = request.args.get("class_id")
+
+        if room_id or class_id:
+            session = get_active_session_doc(class_id=class_id, room_id=room_id)
+            context = session and get_session_context(session["class_id"])
+            if not context:
+                return jsonify({"active": False, "room_id": room_id}), 200
+            return jsonify({
+                "active": True,
+                "session": session_to_payload(session),
+                "class": _context_to_payload(context),
+            }), 200
+
+        sessions = list_active_sessions()
+        if not sessions:
+            return jsonify({"active": False, "sessions": []}), 200
+        # "class" keeps the single-session shape for older clients
+        return jsonify({
+            "active": True,
+            "sessions": [session_to_payload(s) for s in sessions],
+            "class": _context_to_payload(get_session_context(sessions[0]["class_id"])),
+        }), 200
 
     except Exception:
         import traceback
         print("❌ Error in /active-session:", traceback.format_exc())
         return jsonify({"error": "Internal server error"}), 500
 
+# ✅ Classes starting in a room within the next few minutes (kiosk gallery prefetch)
+@attendance_bp.route("/upcoming", methods=["GET"])
+def get_upcoming_classes():
+    try:
+        room_id = request.args.get("room_id")
+        if not room_id:
+            return jsonify({"error": "Missing room_id"}), 400
+        within = timedelta(minutes=request.args.get("within_minutes", 10, type=int))
+
+        now = datetime.now(PH_TZ)
+        upcoming = []
+        cursor = classes_collection.find(
+            {"room": room_id, "schedule_blocks.0": {"$exists": True}},
+            {"schedule_blocks": 1, "subject_code": 1, "section": 1},
+        )
+        for cls in cursor:
+            starts = []
+            for weekday, start, end in parse_schedule_blocks(cls.get("schedule_blocks")):
+                next_start, next_stop = next_occurrence(weekday, start, now), next_occurrence(weekday, end, now)
+                # Already in progress: the current slot started a week before its next occurrence
+                starts.append(next_start - timedelta(days=7) if next_stop < next_start else next_start)
+            starts = [t for t in starts if t <= now + within]
+            if starts:
+                upcoming.append({
+                    "class_id": str(cls["_id"]),
+                    "subject_code": cls.get("subject_code"),
+                    "section": cls.get("section"),
+                    "starts_at": min(starts).isoformat(),
+                    "in_progress": min(starts) <= now,
+                })
+
+        upcoming.sort(key=lambda c: c["starts_at"])
+        return jsonify({"room_id": room_id, "classes": upcoming}), 200
+
+    except Exception:
+        import traceback
+        print("❌ Error in /upcoming:", traceback.format_exc())
+        return jsonify({"error": "Internal server error"}), 500
+
+# ✅ Binary gallery shard of one class: only the roster's templates (see utils/gallery_shard.py)
+# in one model pack (?pack=, default: the server's active pack). Kiosk token only.
+@attendance_bp.route("/classes/<class_id>/gallery", methods=["GET"])
+@kiosk_required
+def get_class_gallery(class_id):
+    try:
+        try:
+            namespace = resolve_namespace(request.args.get("pack"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        context = get_session_context(class_id)
+        if not context:
+            return jsonify({"error": "Class not found"}), 404
+
+        # Cursor first: changes racing with the snapshot are replayed on top of it (latest wins)
+        seq = settled_gallery_seq()
+        shard = GalleryShard.from_students(
+            load_registered_faces(context["roster_ids"], namespace), seq=seq, pack=namespace
+        )
+        resp = make_response(shard.to_bytes())
+        resp.headers["Content-Type"] = GALLERY_MIMETYPE
+        resp.headers["X-Gallery-Seq"] = str(seq)
+        resp.headers["X-Gallery-Pack"] = namespace
+        resp.headers["X-Gallery-Students"] = str(len(shard))
+        resp.headers["X-Gallery-Templates"] = str(len(shard.labels))
+        resp.headers["Cache-Control"] = "private, no-cache"
+        resp.add_etag()
+        return resp.make_conditional(request)
+
+    except Exception:
+        import traceback
+        print("❌ Error in /classes/<id>/gallery:", traceback.format_exc())
+        return jsonify({"error": "Internal server error"}), 500
+
+# ✅ Gallery changelog after a cursor (?since=) for one class roster's students (?class_id=)
+# in one model pack (?pack=). Kiosk token only.
+@attendance_bp.route("/gallery/changes", methods=["GET"])
+@kiosk_required
+def get_gallery_changes_route():
+    try:
+        since = request.args.get("since", type=int)
+        if since is None or since < 0:
+            return jsonify({"error": "Missing or invalid since"}), 400
+        try:
+            namespace = resolve_namespace(request.args.get("pack"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        class_id = request.args.get("class_id")
+        if not class_id:
+            return jsonify({"error": "Missing class_id"}), 400
+        context = get_session_context(class_id)
+        if not context:
+            return jsonify({"error": "Class not found"}), 404
+
+        entries, next_since, has_more = get_gallery_changes(since, context["roster_ids"], namespace)
+        resp = make_response(pack_changes(entries, next_since, has_more))
+        resp.headers["Content-Type"] = GALLERY_MIMETYPE
+        resp.headers["X-Gallery-Next-Since"] = str(next_since)
+        resp.headers["X-Gallery-Has-More"] = "1" if has_more else "0"
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
+
+    except Exception:
+        import traceback
+        print("❌ Error in /gallery/changes:", traceback.format_exc())
+        return jsonify({"error": "Internal server error"}), 500
+
 # ✅ Log/Upsert a student's attendance
 @attendance_bp.route("/log", methods=["POST"])
 def log_attendance():
@@ -172,28 +345,18 @@ def log_attendance():
             if f not in student_data:
                 return jsonify({"error": f"Missing student.{f}"}), 400
 
-        # ✅ Fetch class info
-        cls = classes_collection.find_one({"_id": ObjectId(class_id)})
-        if not cls:
+        # ✅ Class info from the per-session cache (no class fetch per request)
+        context = get_session_context(class_id)
+        if not context:
             return jsonify({"error": "Class not found"}), 404
-
-        class_data = {
-            "class_id": str(cls["_id"]),
-            "subject_code": cls.get("subject_code"),
-            "subject_title": cls.get("subject_title"),
-            "instructor_id": cls.get("instructor_id"),
-            "instructor_first_name": cls.get("instructor_first_name"),
-            "instructor_last_name": cls.get("instructor_last_name"),
-            "course": cls.get("course"),
-            "section": cls.get("section"),
-        }
+        class_data = context["class_data"]
 
         if not status:
             result = log_attendance_model(
                 class_data=class_data,
                 student_data=student_data,
                 date_val=date_val,
-                class_start_time=cls.get("attendance_start_time")
+                class_start_time=context["attendance_start_time"]
             )
         else:
             result = log_attendance_model(
@@ -281,22 +444,11 @@ def mark_absent():
 
         date_val = _parse_date(data.get("date"))
 
-        cls = classes_collection.find_one({"_id": ObjectId(class_id)})
-        if not cls:
+        context = get_session_context(class_id)
+        if not context:
             return jsonify({"error": "Class not found"}), 404
 
-        class_data = {
-            "class_id": str(cls["_id"]),
-            "subject_code": cls.get("subject_code"),
-            "subject_title": cls.get("subject_title"),
-            "instructor_id": cls.get("instructor_id"),
-            "instructor_first_name": cls.get("instructor_first_name"),
-            "instructor_last_name": cls.get("instructor_last_name"),
-            "course": cls.get("course"),
-            "section": cls.get("section"),
-        }
-
-        mark_absent_bulk(class_data, date_val, students)
+        mark_absent_bulk(context["class_data"], date_val, students)
 
         return jsonify({
             "success": True,
@@ -1,33 +1,32 @@
 from flask import Blueprint, jsonify, request
 from datetime import datetime, timedelta
-import base64
-import cv2
-import numpy as np
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import os
+from concurrent.futures import TimeoutError
 from flask_jwt_extended import create_access_token
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import warnings
-
-# Silence noisy warnings
-warnings.filterwarnings(
-    "ignore",
-    message="`rcond` parameter will change",
-    category=FutureWarning,
-    module=r"insightface\.utils\.transform"
-)
 
-# ✅ Import DB + utils
+# ✅ Import DB + utils (no model imports: inference runs in the model server, see utils/model_server.py)
 from config.db_config import db
-from utils.face_register import register_face_auto
-from utils.face_login import recognize_face
-from utils.face_recognition import handle_attendance_session
-from models.face_db_model import save_face_data, get_student_by_id, normalize_student
-from utils.face_utils import get_face_embedding
+from utils.face_register import register_face_auto, register_face_batch
+from utils.face_login import recognize_analysis
+from utils.image_ingest import (
+    decode_data_url, is_binary_request, request_fields, request_image, request_images, request_clip,
+)
+from utils.model_server import (
+    analyze_face_batched, analyze_faces_batched, inference_stats as model_inference_stats,
+)
+from utils.inference_batcher import AdmissionError
+from models.face_db_model import save_face_data, get_student_by_id
+from utils.model_packs import embedding_field
 
 # Blueprint
 face_bp = Blueprint("face", __name__)
-executor = ThreadPoolExecutor(max_workers=4)
+
+# Admission control rejects up front; this only guards against a stuck batch
+RESULT_TIMEOUT = float(os.getenv("FACE_RESULT_TIMEOUT", "15"))
+# Frames per /register-batch call (a clip is sampled down to this many)
+MAX_REGISTER_FRAMES = int(os.getenv("FACE_REGISTER_MAX_FRAMES", "16"))
 
 # ✅ Rate Limiter (disabled on login route)
 limiter = Limiter(key_func=get_remote_address, default_limits=[])
@@ -36,19 +35,12 @@ limiter = Limiter(key_func=get_remote_address, default_limits=[])
 # ---------------------------
 # Helpers
 # ---------------------------
-def decode_base64_image(base64_str):
-    """Decode 'data:image/...;base64,...' into BGR image (OpenCV)."""
-    try:
-        if not base64_str:
-            return None
-        payload = base64_str.split(",", 1)[1] if "," in base64_str else base64_str
-        img_bytes = base64.b64decode(payload)
-        img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
-        if img is not None:
-            img = cv2.flip(img, 1)  # mirror correction
-        return img
-    except Exception:
-        return None
+def _rejected(e, **extra):
+    """Fast 429/503 with Retry-After when the inference queue cannot take the request."""
+    resp = jsonify({**extra, "error": str(e), "retry_after": e.retry_after})
+    resp.status_code = e.status
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
 
 
 # ---------------------------
@@ -57,17 +49,28 @@ def decode_base64_image(base64_str):
 @face_bp.route("/register-auto", methods=["POST"])
 def register_auto():
     try:
-        data = request.get_json(silent=True) or {}
+        data = request_fields(request)
         student_id = data.get("student_id")
 
-        if not data.get("image") or not student_id:
+        img = None
+        if is_binary_request(request):
+            img, error = request_image(request)
+            if img is None and error == "Missing image":
+                return jsonify({"success": False, "error": "Missing required fields"}), 400
+            if img is None:
+                return jsonify({"success": False, "error": error}), 400
+        if (img is None and not data.get("image")) or not student_id:
             return jsonify({"success": False, "error": "Missing required fields"}), 400
 
-        future = executor.submit(register_face_auto, data)
         try:
-            result = future.result(timeout=15)
+            result = register_face_auto(
+                data, analyze=lambda img: analyze_face_batched(img, anti_spoof=False, angle=True, timeout=RESULT_TIMEOUT),
+                img=img,
+            )
+        except AdmissionError as e:
+            return _rejected(e, success=False)
         except TimeoutError:
-            return jsonify({"success": False, "error": "Registration timed out"}), 408
+            return jsonify({"success": False, "error": "Registration timed out"}), 503
 
         # Always include success explicitly
         if result.get("success"):
@@ -85,23 +88,93 @@ def register_auto():
         return jsonify({"success": False, "error": "Internal server error"}), 500
 
 
+# ✅ Batch registration: several frames (or a short clip) of one student, one pipeline batch,
+# best frame per angle, one database write
+@face_bp.route("/register-batch", methods=["POST"])
+def register_batch():
+    try:
+        data = request_fields(request)
+        student_id = data.get("student_id")
+
+        # JSON: "frames" holds data URLs or {"image": data URL, "angle": optional frontend angle}.
+        # Multipart: "frames" files, optional "angles" fields in the same order.
+        if request.mimetype == "multipart/form-data":
+            angles = request.form.getlist("angles")
+            decoded = [(img, error, angles[i] if i < len(angles) and angles[i] else None)
+                       for i, (img, error) in enumerate(request_images(request, "frames"))]
+        else:
+            raw_frames = data.get("frames") or []
+            if not isinstance(raw_frames, list):
+                return jsonify({"success": False, "error": "frames must be a list"}), 400
+            decoded = []
+            for frame in raw_frames:
+                image, angle = (frame.get("image"), frame.get("angle")) if isinstance(frame, dict) else (frame, None)
+                img = decode_data_url(image)
+                decoded.append((img, None if img is not None else "Invalid image format", angle))
+        has_clip = "clip" in request.files or bool(data.get("clip"))
+        if not student_id or not (decoded or has_clip):
+            return jsonify({"success": False, "error": "Missing student_id and frames or clip"}), 400
+        if len(decoded) > MAX_REGISTER_FRAMES:
+            return jsonify({"success": False, "error": f"At most {MAX_REGISTER_FRAMES} frames per request"}), 413
+
+        # Clip frames are numbered after the single frames
+        frames, origin, undecodable = [], [], []
+        for i, (img, error, angle) in enumerate(decoded):
+            if img is None:
+                undecodable.append({"frame": i, "error": error})
+            else:
+                frames.append((img, angle))
+                origin.append(i)
+        if has_clip:
+            for k, img in enumerate(request_clip(request, MAX_REGISTER_FRAMES - len(frames))):
+                frames.append((img, None))
+                origin.append(len(decoded) + k)
+        if not frames:
+            return jsonify({"success": False, "error": "No decodable frames", "rejected": undecodable}), 400
+
+        try:
+            result = register_face_batch(
+                student_id, data, frames,
+                analyze_many=lambda imgs: analyze_faces_batched(imgs, anti_spoof=False, angle=True, timeout=RESULT_TIMEOUT),
+            )
+        except AdmissionError as e:
+            return _rejected(e, success=False)
+        except TimeoutError:
+            return jsonify({"success": False, "error": "Registration timed out"}), 503
+
+        for entry in list(result.get("angles", {}).values()) + result.get("rejected", []):
+            entry["frame"] = origin[entry["frame"]]
+        result["rejected"] = undecodable + result.get("rejected", [])
+        return jsonify(result), 200 if result.get("success") else 400
+
+    except Exception:
+        import traceback
+        print("❌ Error in /register-batch:", traceback.format_exc())
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
 # ✅ Face Login (ArcFace + Anti-spoof)
 @face_bp.route("/login", methods=["POST"])
 def face_login():
     try:
-        data = request.get_json(silent=True) or {}
-        base64_image = data.get("image")
-
-        if not base64_image:
-            return jsonify({"error": "Missing image"}), 400
-        if "," not in base64_image:
-            return jsonify({"error": "Invalid image format"}), 400
+        # JSON data URL (existing clients), multipart "image" or a raw image/* body
+        if not is_binary_request(request):
+            base64_image = (request.get_json(silent=True) or {}).get("image")
+            if not base64_image:
+                return jsonify({"error": "Missing image"}), 400
+            if not isinstance(base64_image, str) or "," not in base64_image:
+                return jsonify({"error": "Invalid image format"}), 400
+
+        img, error = request_image(request)
+        if img is None:
+            return jsonify({"error": error}), 400
 
-        future = executor.submit(recognize_face, base64_image)
         try:
-            result = future.result(timeout=15)
+            result = recognize_analysis(analyze_face_batched(img, anti_spoof=True, timeout=RESULT_TIMEOUT))
+        except AdmissionError as e:
+            return _rejected(e)
         except TimeoutError:
-            return jsonify({"error": "Face login timed out"}), 408
+            return jsonify({"error": "Face login timed out"}), 503
 
         if isinstance(result, dict) and result.get("error"):
             return jsonify(result), 400
@@ -109,13 +182,10 @@ def face_login():
         if isinstance(result, dict) and result.get("student_id"):
             student_id = result["student_id"]
 
-            raw_student = get_student_by_id(student_id)
-            if not raw_student:
+            student = get_student_by_id(student_id)
+            if not student:
                 return jsonify({"error": "Student not found"}), 404
 
-            # ✅ Always normalize
-            student = normalize_student(raw_student)
-
             token = create_access_token(
                 identity=student.get("student_id"),
                 expires_delta=timedelta(hours=12)
@@ -144,21 +214,28 @@ def face_login():
 @face_bp.route("/register-frame", methods=["POST"])
 def register_frame():
     try:
-        data = request.get_json(silent=True) or {}
-        base64_image = data.get("image")
+        data = request_fields(request)
         student_id = data.get("student_id")
 
-        if not base64_image or not student_id:
+        if not student_id:
+            return jsonify({"error": "Missing data"}), 400
+        img, error = request_image(request)
+        if error == "Missing image":
             return jsonify({"error": "Missing data"}), 400
 
         print(f"📥 Received manual frame for Student ID: {student_id}")
-        img = decode_base64_image(base64_image)
         if img is None:
             return jsonify({"error": "Invalid image format"}), 400
 
-        embedding = get_face_embedding(img)
-        if embedding is None:
+        try:
+            analysis = analyze_face_batched(img, anti_spoof=False, timeout=RESULT_TIMEOUT)
+        except AdmissionError as e:
+            return _rejected(e)
+        except TimeoutError:
+            return jsonify({"error": "Frame registration timed out"}), 503
+        if analysis.get("embedding") is None:
             return jsonify({"error": "No face detected in frame"}), 400
+        embedding = analysis["embedding"].tolist()
 
         filename = f"frame_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
 
@@ -169,7 +246,7 @@ def register_frame():
             "middle_name": data.get("middle_name", ""),
             "course": data.get("course", ""),
             "section": data.get("section", ""),
-            f"embeddings.{filename}": embedding,
+            f"{embedding_field(analysis.get('pack'))}.{filename}": embedding,
         }
 
         student = get_student_by_id(student_id)
@@ -186,6 +263,12 @@ def register_frame():
         return jsonify({"error": "Internal server error"}), 500
 
 
+# ✅ Inference queue depth / batch sizes
+@face_bp.route("/inference-stats", methods=["GET"])
+def inference_stats():
+    return jsonify(model_inference_stats()), 200
+
+
 # ✅ Attendance Session Handler
 @face_bp.route("/attendance-session", methods=["POST"])
 def attendance_session():
@@ -202,6 +285,7 @@ def attendance_session():
             except Exception:
                 return jsonify({"error": "Invalid start time format. Use ISO format."}), 400
 
+        from utils.face_recognition import handle_attendance_session  # webcam loop; loads MediaPipe here
         result = handle_attendance_session(
             subject=subject,
             subject_id=subject_id,
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 import bcrypt
 from bson import ObjectId
@@ -10,6 +10,15 @@ from models.instructor_model import (
     create_instructor
 )
 from models.class_model import get_all_classes_with_details
+from models.enrollment_model import get_class_roster, count_class_rosters
+from utils.attendance_report import (
+    build_attendance_matrix,
+    iter_matrix_csv,
+    matrix_to_json,
+    matrix_to_xlsx,
+)
+from utils.etag import etag_json_response
+from utils.response_cache import cached_response, ATTENDANCE, ENROLLMENT, CLASSES
 
 instructor_bp = Blueprint("instructor", __name__)
 
@@ -94,6 +103,7 @@ def login_instructor():
 # -------------------------------------------------
 @instructor_bp.route("/<string:instructor_id>/classes", methods=["GET"])
 @jwt_required()
+@cached_response(CLASSES)
 def get_classes_by_instructor(instructor_id):
     try:
         classes = list(classes_collection.find({"instructor_id": instructor_id}))
@@ -121,12 +131,10 @@ def get_classes_by_instructor(instructor_id):
 # -------------------------------------------------
 @instructor_bp.route("/class/<class_id>/assigned-students", methods=["GET"])
 @jwt_required()
+@cached_response(ENROLLMENT, CLASSES)
 def get_assigned_students(class_id):
     try:
-        class_doc = classes_collection.find_one({"_id": ObjectId(class_id)})
-        if not class_doc:
-            return jsonify([]), 200
-        return jsonify(class_doc.get("students", [])), 200
+        return jsonify(get_class_roster(class_id)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -176,6 +184,57 @@ def attendance_report(class_id):
     }), 200
 
 
+# -------------------------------------------------
+# 🔹 Attendance Matrix (student × date, per class)
+# -------------------------------------------------
+@instructor_bp.route("/class/<class_id>/attendance-matrix", methods=["GET"])
+@jwt_required()
+def attendance_matrix(class_id):
+    start_date = request.args.get("from")
+    end_date = request.args.get("to")
+    fmt = (request.args.get("format") or "json").lower()
+
+    if fmt not in ("json", "csv", "xlsx"):
+        return jsonify({"error": "Invalid format. Allowed: json, csv, xlsx"}), 400
+
+    start = end = None
+    if start_date and end_date:
+        try:
+            start = datetime.fromisoformat(start_date).strftime("%Y-%m-%d")
+            end = (datetime.fromisoformat(end_date) + timedelta(days=1)).strftime("%Y-%m-%d")
+        except Exception:
+            start, end = start_date, end_date
+
+    try:
+        report = build_attendance_matrix(class_id, start, end)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    if report is None:
+        return jsonify({"error": "Class not found"}), 404
+
+    filename = f"attendance_{report.get('subject_code') or class_id}_{report.get('section') or ''}".rstrip("_")
+
+    if fmt == "csv":
+        return Response(
+            stream_with_context(iter_matrix_csv(report)),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}.csv"}
+        )
+
+    if fmt == "xlsx":
+        try:
+            data = matrix_to_xlsx(report)
+        except ImportError:
+            return jsonify({"error": "XLSX export unavailable (openpyxl not installed)"}), 501
+        return Response(
+            data,
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": f"attachment; filename={filename}.xlsx"}
+        )
+
+    return jsonify(matrix_to_json(report)), 200
+
+
 # -------------------------------------------------
 # 🔹 Attendance Report (all classes)
 # -------------------------------------------------
@@ -236,12 +295,13 @@ def list_all_class_assignments():
 # ✅ Dashboard Stats (with Late + Absent counts)
 @instructor_bp.route("/<string:instructor_id>/overview", methods=["GET"])
 @jwt_required()
+@cached_response(ATTENDANCE, ENROLLMENT, CLASSES)
 def instructor_overview(instructor_id):
     try:
         classes = list(classes_collection.find({"instructor_id": instructor_id}))
 
         total_classes = len(classes)
-        total_students = sum(len(cls.get("students", [])) for cls in classes)
+        total_students = sum(count_class_rosters([cls["_id"] for cls in classes]).values())
         active_sessions = sum(1 for cls in classes if cls.get("is_attendance_active", False))
 
         # Attendance stats
@@ -290,6 +350,7 @@ def instructor_overview(instructor_id):
 # ✅ Attendance Trend (day-wise counts for Present, Late, Absent)
 @instructor_bp.route("/<string:instructor_id>/overview/attendance-trend", methods=["GET"])
 @jwt_required()
+@cached_response(ATTENDANCE)
 def instructor_attendance_trend(instructor_id):
     try:
         pipeline = [
@@ -330,9 +391,11 @@ def instructor_attendance_trend(instructor_id):
 # ✅ Class Summary for Overview
 @instructor_bp.route("/<string:instructor_id>/overview/classes", methods=["GET"])
 @jwt_required()
+@cached_response(ENROLLMENT, CLASSES)
 def instructor_class_summary(instructor_id):
     try:
         classes = list(classes_collection.find({"instructor_id": instructor_id}))
+        counts = count_class_rosters([cls["_id"] for cls in classes])
         results = []
         for cls in classes:
             results.append({
@@ -344,9 +407,116 @@ def instructor_class_summary(instructor_id):
                 "semester": cls.get("semester"),
                 "section": cls.get("section"),
                 "schedule_blocks": cls.get("schedule_blocks", []),
-                "students_count": len(cls.get("students", [])),
+                "students_count": counts.get(str(cls["_id"]), 0),
                 "is_attendance_active": cls.get("is_attendance_active", False),
             })
         return jsonify(results), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+# ✅ Consolidated Dashboard (stats + trend + class summary, one round trip)
+@instructor_bp.route("/<string:instructor_id>/overview/dashboard", methods=["GET"])
+@jwt_required()
+@cached_response(ATTENDANCE, ENROLLMENT, CLASSES)
+def instructor_dashboard_overview(instructor_id):
+    try:
+        pipeline = [
+            {"$match": {"instructor_id": instructor_id}},
+            {"$project": {
+                "subject_code": 1,
+                "subject_title": 1,
+                "course": 1,
+                "year_level": 1,
+                "semester": 1,
+                "section": 1,
+                "schedule_blocks": 1,
+                "is_attendance_active": {"$ifNull": ["$is_attendance_active", False]},
+                "_kind": "class"
+            }},
+            {"$lookup": {
+                "from": "enrollments",
+                "let": {"cid": {"$toString": "$_id"}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$class_id", "$$cid"]}}},
+                    {"$count": "n"}
+                ],
+                "as": "roster"
+            }},
+            {"$set": {"students_count": {"$ifNull": [{"$first": "$roster.n"}, 0]}}},
+            {"$unset": "roster"},
+            {"$unionWith": {
+                "coll": "attendance_logs",
+                "pipeline": [
+                    {"$match": {"instructor_id": instructor_id}},
+                    {"$unwind": "$students"},
+                    {"$group": {
+                        "_id": {"date": "$date", "status": "$students.status"},
+                        "count": {"$sum": 1}
+                    }},
+                    {"$project": {
+                        "_id": 0,
+                        "date": "$_id.date",
+                        "status": "$_id.status",
+                        "count": 1,
+                        "_kind": "log"
+                    }}
+                ]
+            }},
+            {"$facet": {
+                "classes": [{"$match": {"_kind": "class"}}],
+                "logs": [{"$match": {"_kind": "log"}}, {"$sort": {"date": 1}}]
+            }}
+        ]
+        facets = next(classes_collection.aggregate(pipeline), {})
+
+        class_rows = facets.get("classes", [])
+        total_students = sum(c.get("students_count", 0) for c in class_rows)
+        active_sessions = sum(1 for c in class_rows if c.get("is_attendance_active"))
+
+        totals = {"Present": 0, "Late": 0, "Absent": 0}
+        total_records = 0
+        trend = {}
+        for row in facets.get("logs", []):
+            status, count = row.get("status"), row.get("count", 0)
+            total_records += count
+            if status in totals:
+                totals[status] += count
+                day = trend.setdefault(row.get("date"), {"present": 0, "late": 0, "absent": 0})
+                day[status.lower()] += count
+
+        attendance_rate = (
+            round(((totals["Present"] + totals["Late"]) / total_records) * 100, 2)
+            if total_records else 0
+        )
+
+        return etag_json_response({
+            "overview": {
+                "totalClasses": len(class_rows),
+                "totalStudents": total_students,
+                "activeSessions": active_sessions,
+                "attendanceRate": attendance_rate,
+                "present": totals["Present"],
+                "late": totals["Late"],
+                "absent": totals["Absent"],
+                "totalRecords": total_records
+            },
+            "trend": [{"date": d, **counts} for d, counts in trend.items()],
+            "classes": [
+                {
+                    "_id": str(c["_id"]),
+                    "subject_code": c.get("subject_code"),
+                    "subject_title": c.get("subject_title"),
+                    "course": c.get("course"),
+                    "year_level": c.get("year_level"),
+                    "semester": c.get("semester"),
+                    "section": c.get("section"),
+                    "schedule_blocks": c.get("schedule_blocks", []),
+                    "students_count": c.get("students_count", 0),
+                    "is_attendance_active": c.get("is_attendance_active", False),
+                }
+                for c in class_rows
+            ]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -3,13 +3,15 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime
 import os
-import re
 from werkzeug.utils import secure_filename
-import pdfplumber  # ✅ for parsing COR PDFs
 
 from config.db_config import db
 from models.class_model import get_subjects_by_student
 from models.attendance_logs_model import get_attendance_logs_by_student
+from models.job_model import enqueue_job, get_job, job_to_status
+from utils.job_worker import COR_UPLOAD, notify_workers
+from utils.etag import etag_json_response
+from utils.response_cache import cached_response, ATTENDANCE, ENROLLMENT, CLASSES
 
 student_bp = Blueprint("student", __name__)
 
@@ -17,6 +19,7 @@ students_collection = db["students"]
 subjects_collection = db["subjects"]
 classes_collection = db["classes"]
 instructors_collection = db["instructors"]
+enrollments_collection = db["enrollments"]
 
 # -----------------------------
 # File Upload Config
@@ -108,138 +111,34 @@ def upload_cor():
     file.save(save_path)
     print(f"📂 Saved COR file: {save_path}")  # DEBUG
 
-    # -----------------------------
-    # Step 1: Parse course/year/section/semester from COR
-    # -----------------------------
-    course, year_level, section, semester = None, None, None, None
-    try:
-        if filename.lower().endswith(".pdf"):
-            with pdfplumber.open(save_path) as pdf:
-                text = "\n".join([p.extract_text() or "" for p in pdf.pages])
-            print("🔎 Extracted COR text:", text[:200], "...")  # DEBUG (first 200 chars)
-
-            # Extract Course and Year Digit
-            m = re.search(r"Course/?Yr:\s*([A-Z]+)\s*(\d)", text, re.IGNORECASE)
-            if m:
-                course = m.group(1).upper().strip()       # "BSINFOTECH"
-                year_digit = m.group(2)                   # "4"
-                year_level = f"{year_digit}th Year"       # "4th Year"
-
-            # Extract Section (e.g., 4C)
-            m2 = re.search(r"\b(\d[A-Z])\b", text)
-            if m2:
-                section = m2.group(1).upper()             # "4C"
-
-            # Extract Semester
-            m3 = re.search(r"(First|1st|Second|2nd)\s+Semester", text, re.IGNORECASE)
-            if m3:
-                sem_value = m3.group(1).lower()
-                if sem_value in ["first", "1st"]:
-                    semester = "1st Sem"
-                elif sem_value in ["second", "2nd"]:
-                    semester = "2nd Sem"
+    # Parsing and enrollment run on the job workers; poll /cor-jobs/<job_id> for the result
+    job_id = enqueue_job(COR_UPLOAD, {
+        "student_id": student_id,
+        "path": save_path,
+        "filename": filename,
+    }, owner=student_id)
+    notify_workers()
 
-    except Exception as e:
-        print("⚠️ PDF parsing error:", e)
-        return jsonify({"error": "Failed to parse COR"}), 422
+    return jsonify({
+        "message": "COR uploaded, processing",
+        "file": filename,
+        "job_id": job_id,
+        "status_url": f"/api/student/cor-jobs/{job_id}"
+    }), 202
 
-    if not all([course, year_level, section, semester]):
-        return jsonify({
-            "error": "Could not parse COR (missing course/year/section/semester)"
-        }), 422
-
-    print(f"✅ Parsed from COR: course={course}, year_level={year_level}, section={section}, semester={semester}")
-
-    # -----------------------------
-    # Step 2: Fetch subjects for block
-    # -----------------------------
-    subjects_cursor = subjects_collection.find({
-        "course": course,
-        "year_level": year_level,
-        "semester": semester
-    })
-
-    assigned_subjects = []
-    for subj in subjects_cursor:
-        subject_id = str(subj["_id"])
-
-        # Fetch instructor details if available
-        instructor = None
-        if subj.get("instructor_id"):
-            instructor = instructors_collection.find_one({"instructor_id": subj["instructor_id"]})
-
-        student_info = {
-            "student_id": student_doc.get("student_id"),
-            "first_name": student_doc.get("first_name", student_doc.get("First_Name", "")),
-            "last_name": student_doc.get("last_name", student_doc.get("Last_Name", "")),
-            "course": course,
-            "year_level": year_level,
-            "semester": semester,
-            "section": section
-        }
-
-        # Upsert class
-        class_doc = classes_collection.find_one({
-            "subject_id": subject_id,
-            "course": course,
-            "year_level": year_level,
-            "semester": semester,
-            "section": section
-        })
 
-        if class_doc:
-            classes_collection.update_one(
-                {"_id": class_doc["_id"]},
-                {"$addToSet": {"students": student_info}}
-            )
-        else:
-            classes_collection.insert_one({
-                "subject_id": subject_id,
-                "subject_code": subj["subject_code"],
-                "subject_title": subj.get("subject_title", ""),
-                "course": course,
-                "year_level": year_level,
-                "semester": semester,
-                "section": section,
-                "instructor_id": subj.get("instructor_id"),
-                "instructor_first_name": instructor.get("first_name") if instructor else None,
-                "instructor_last_name": instructor.get("last_name") if instructor else None,
-                "schedule_blocks": subj.get("schedule_blocks", []),
-                "students": [student_info],
-                "created_at": datetime.utcnow()
-            })
-
-        # Add subject code to student's profile
-        students_collection.update_one(
-            {"student_id": student_id},
-            {"$addToSet": {"Subjects": subj["subject_code"]}}
-        )
-
-        assigned_subjects.append({
-            "subject_code": subj["subject_code"],
-            "subject_title": subj.get("subject_title", ""),
-            "course": course,
-            "year_level": year_level,
-            "semester": semester,
-            "section": section,
-            "instructor_id": subj.get("instructor_id"),
-            "instructor_first_name": instructor.get("first_name") if instructor else None,
-            "instructor_last_name": instructor.get("last_name") if instructor else None,
-            "schedule_blocks": subj.get("schedule_blocks", [])
-        })
+# ✅ Poll a COR processing job
+@student_bp.route("/cor-jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def get_cor_job(job_id):
+    identity = get_jwt_identity()
+    student_id = str(identity["student_id"] if isinstance(identity, dict) else identity).strip()
 
+    job = get_job(job_id)
+    if not job or job.get("owner") != student_id:
+        return jsonify({"error": "Job not found"}), 404
 
-    return jsonify({
-        "message": "COR uploaded successfully",
-        "file": filename,
-        "parsed": {
-            "course": course,
-            "year_level": year_level,
-            "section": section,
-            "semester": semester
-        },
-        "assigned_subjects": assigned_subjects
-    }), 200
+    return jsonify(job_to_status(job)), 200
 
 
 # ✅ Serve uploaded COR file
@@ -255,6 +154,7 @@ def get_cor_file(filename):
 # ✅ Assigned Subjects by student_id
 @student_bp.route("/<student_id>/assigned-subjects", methods=["GET"])
 @jwt_required()
+@cached_response(ENROLLMENT, CLASSES)
 def get_assigned_subjects(student_id):
     try:
         # query using string-based student_id
@@ -302,6 +202,7 @@ def student_attendance_logs(student_id):
 # ✅ Weekly Schedule
 @student_bp.route("/schedule/<string:student_id>", methods=["GET"])
 @jwt_required()
+@cached_response(ENROLLMENT, CLASSES)
 def get_student_schedule(student_id):
     try:
         subjects = get_subjects_by_student(student_id) or []
@@ -345,11 +246,11 @@ def get_student_schedule(student_id):
 # ✅ Student Overview Endpoints
 @student_bp.route("/<string:student_id>/overview", methods=["GET"])
 @jwt_required()
+@cached_response(ATTENDANCE, ENROLLMENT)
 def student_overview(student_id):
     try:
         # Fetch classes enrolled
-        classes = list(classes_collection.find({"students.student_id": student_id}))
-        total_classes = len(classes)
+        total_classes = enrollments_collection.count_documents({"student_id": student_id})
 
         # Total sessions (attendance logs count)
         total_sessions = db["attendance_logs"].count_documents({"students.student_id": student_id})
@@ -392,6 +293,7 @@ def student_overview(student_id):
 # ✅ Attendance Trend (daily)
 @student_bp.route("/<string:student_id>/overview/attendance-trend", methods=["GET"])
 @jwt_required()
+@cached_response(ATTENDANCE)
 def student_attendance_trend(student_id):
     try:
         pipeline = [
@@ -413,6 +315,7 @@ def student_attendance_trend(student_id):
 # ✅ Subject Breakdown
 @student_bp.route("/<string:student_id>/overview/subjects", methods=["GET"])
 @jwt_required()
+@cached_response(ATTENDANCE)
 def student_subject_breakdown(student_id):
     try:
         pipeline = [
@@ -454,6 +357,7 @@ def student_subject_breakdown(student_id):
 # ✅ Recent Attendance Logs
 @student_bp.route("/<string:student_id>/overview/recent-logs", methods=["GET"])
 @jwt_required()
+@cached_response(ATTENDANCE)
 def student_recent_logs(student_id):
     try:
         logs = list(db["attendance_logs"].find(
@@ -476,3 +380,128 @@ def student_recent_logs(student_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+
+# ✅ Consolidated Dashboard (overview + trend + subjects + recent logs, one round trip)
+@student_bp.route("/<string:student_id>/overview/dashboard", methods=["GET"])
+@jwt_required()
+@cached_response(ATTENDANCE, ENROLLMENT)
+def student_dashboard_overview(student_id):
+    try:
+        own_entry = {"$arrayElemAt": [{"$filter": {
+            "input": "$students",
+            "as": "s",
+            "cond": {"$eq": ["$$s.student_id", student_id]}
+        }}, 0]}
+
+        def _count(status):
+            return {"$sum": {"$cond": [{"$eq": ["$student.status", status]}, 1, 0]}}
+
+        log_only = {"$match": {"_kind": {"$exists": False}}}
+
+        pipeline = [
+            {"$match": {"students.student_id": student_id}},
+            {"$project": {
+                "_id": 0,
+                "date": 1,
+                "subject_code": 1,
+                "subject_title": 1,
+                "student": own_entry
+            }},
+            {"$unionWith": {
+                "coll": "enrollments",
+                "pipeline": [
+                    {"$match": {"student_id": student_id}},
+                    {"$project": {"_id": 0, "_kind": "class"}}
+                ]
+            }},
+            {"$facet": {
+                "classes": [
+                    {"$match": {"_kind": "class"}},
+                    {"$count": "n"}
+                ],
+                "stats": [
+                    log_only,
+                    {"$group": {
+                        "_id": None,
+                        "total_records": {"$sum": 1},
+                        "present": _count("Present"),
+                        "absent": _count("Absent"),
+                        "late": _count("Late"),
+                    }}
+                ],
+                "trend": [
+                    log_only,
+                    {"$group": {
+                        "_id": "$date",
+                        "rate": {"$avg": {"$cond": [{"$eq": ["$student.status", "Present"]}, 100, 0]}}
+                    }},
+                    {"$sort": {"_id": 1}}
+                ],
+                "subjects": [
+                    log_only,
+                    {"$group": {
+                        "_id": {
+                            "subject_code": "$subject_code",
+                            "subject_title": "$subject_title"
+                        },
+                        "present": _count("Present"),
+                        "absent": _count("Absent"),
+                        "late": _count("Late"),
+                        "total": {"$sum": 1}
+                    }},
+                    {"$project": {
+                        "_id": 0,
+                        "subject_code": "$_id.subject_code",
+                        "subject_title": "$_id.subject_title",
+                        "present": 1,
+                        "absent": 1,
+                        "late": 1,
+                        "rate": {
+                            "$cond": [
+                                {"$eq": ["$total", 0]},
+                                0,
+                                {"$round": [{"$divide": ["$present", "$total"]}, 2]}
+                            ]
+                        }
+                    }}
+                ],
+                "recent": [
+                    log_only,
+                    {"$sort": {"date": -1}},
+                    {"$limit": 10},
+                    {"$project": {
+                        "date": 1,
+                        "subject_code": 1,
+                        "subject_title": 1,
+                        "status": "$student.status",
+                        "time": "$student.time"
+                    }}
+                ]
+            }}
+        ]
+        facets = next(db["attendance_logs"].aggregate(pipeline), {})
+
+        classes = facets.get("classes") or [{}]
+        stats = (facets.get("stats") or [{}])[0]
+        total_records = stats.get("total_records", 0)
+        present = stats.get("present", 0)
+        absent = stats.get("absent", 0)
+        late = stats.get("late", 0)
+
+        return etag_json_response({
+            "overview": {
+                "totalClasses": classes[0].get("n", 0),
+                "totalSessions": total_records,
+                "attendanceRate": round((present / total_records) * 100, 2) if total_records else 0,
+                "present": present,
+                "absent": absent,
+                "late": late,
+                "totalLate": late,
+            },
+            "trend": facets.get("trend", []),
+            "subjects": facets.get("subjects", []),
+            "recentLogs": facets.get("recent", []),
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
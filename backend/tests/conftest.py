@@ -0,0 +1,16 @@
+# tests/conftest.py
+"""
+Unit tests for pure logic (timetable heap, gallery deltas, template sets).
+
+    cd backend && python -m pytest -q tests
+
+Importing the models needs MONGO_URI; MongoClient connects lazily, so no server is contacted.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("MONGO_URI", "mongodb://127.0.0.1:27017/?serverSelectionTimeoutMS=1000")
@@ -0,0 +1,96 @@
+# tests/test_gallery_changes.py
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+import models.gallery_changelog_model as changelog
+from utils.gallery_shard import GalleryShard, pack_changes, unpack_changes
+
+PACK = "buffalo_l_v1"
+NOW = datetime(2025, 9, 1, 8, 0)
+
+
+def vec(*xs):
+    return [float(x) for x in xs]
+
+
+def upsert(seq, sid, key, vector, at=NOW):
+    return {"seq": seq, "op": "upsert", "student_id": sid, "template": key, "pack": PACK, "vector": vector, "at": at}
+
+
+def delete(seq, sid, key=None, at=NOW):
+    return {"seq": seq, "op": "delete", "student_id": sid, "template": key, "pack": PACK, "at": at}
+
+
+def rows(shard):
+    return sorted(zip(shard.labels.tolist(), shard.keys.tolist()))
+
+
+def apply(shard, entries, next_since):
+    shard.apply_changes(unpack_changes(pack_changes(entries, next_since, False)))
+
+
+def test_apply_changes_upserts_deletes_and_skips_seen_entries():
+    shard = GalleryShard.from_students(
+        [{"student_id": "s1", "embeddings": {"front": vec(1, 0), "left": vec(0, 1)}}], seq=2, pack=PACK
+    )
+    apply(shard, [
+        upsert(2, "s9", "front", vec(1, 1)),      # at or below the snapshot cursor: already applied
+        upsert(3, "s2", "front", vec(3, 4)),
+        delete(4, "s1", "front"),
+        upsert(5, "s1", "left", vec(0, 2)),       # replaces the existing row
+    ], next_since=5)
+
+    assert rows(shard) == [("s1", "left"), ("s2", "front")]
+    assert shard.seq == 5
+    assert np.allclose(np.linalg.norm(shard.templates, axis=1), 1.0)
+    assert shard.match(vec(3, 4), threshold=0.01)[0] == "s2"
+
+    apply(shard, [delete(6, "s1")], next_since=6)
+    assert rows(shard) == [("s2", "front")]
+
+
+@pytest.fixture
+def changes_collection(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.gallery_changes
+    monkeypatch.setattr(changelog, "gallery_changes_collection", collection)
+    return collection
+
+
+def test_cursor_stops_at_unsettled_gap_and_late_entry_is_applied(changes_collection):
+    shard = GalleryShard.from_students([{"student_id": "s1", "embeddings": {"front": vec(1, 0)}}], pack=PACK)
+    # seq 2 is allocated but not yet written; seq 3 is fresh, so the gap may still fill in
+    changes_collection.insert_many([upsert(1, "s2", "front", vec(0, 1)), upsert(3, "s3", "front", vec(1, 1))])
+
+    entries, cursor, has_more = changelog.get_gallery_changes(0, namespace=PACK, now=NOW)
+    assert [e["seq"] for e in entries] == [1]
+    assert (cursor, has_more) == (1, True)
+    shard.apply_changes(unpack_changes(pack_changes(entries, cursor, has_more)))
+    assert shard.seq == 1
+
+    changes_collection.insert_one(delete(2, "s1", "front"))
+    entries, cursor, has_more = changelog.get_gallery_changes(shard.seq, namespace=PACK, now=NOW)
+    assert [e["seq"] for e in entries] == [2, 3]
+    assert (cursor, has_more) == (3, False)
+    shard.apply_changes(unpack_changes(pack_changes(entries, cursor, has_more)))
+    assert rows(shard) == [("s2", "front"), ("s3", "front")]
+    assert shard.seq == 3
+
+
+def test_settled_gap_is_skipped(changes_collection):
+    old = NOW - timedelta(seconds=changelog.SETTLE_SECONDS + 1)
+    changes_collection.insert_many([upsert(1, "s1", "front", vec(1, 0), at=old),
+                                    upsert(3, "s3", "front", vec(0, 1), at=old)])
+
+    entries, cursor, has_more = changelog.get_gallery_changes(0, namespace=PACK, now=NOW)
+    assert [e["seq"] for e in entries] == [1, 3]
+    assert (cursor, has_more) == (3, False)
+
+
+def test_other_pack_entries_advance_the_cursor_only(changes_collection):
+    other = dict(upsert(2, "s1", "front", vec(1, 0)), pack="antelopev2_v1")
+    changes_collection.insert_many([upsert(1, "s1", "front", vec(1, 0)), other])
+
+    entries, cursor, _ = changelog.get_gallery_changes(0, namespace=PACK, now=NOW)
+    assert [e["seq"] for e in entries] == [1]
+    assert cursor == 2
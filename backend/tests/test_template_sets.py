@@ -0,0 +1,44 @@
+# tests/test_template_sets.py
+import numpy as np
+from utils.template_sets import consolidate
+
+
+def unit(angle_deg):
+    a = np.radians(angle_deg)
+    return [float(np.cos(a)), float(np.sin(a)), 0.0]
+
+
+def test_under_cap_keeps_everything_and_drops_unusable():
+    templates = {"front": unit(0), "f1": unit(10), "empty": [], "none": None, "odd": [1.0, 0.0]}
+    kept, dropped = consolidate(templates, cap=4)
+    assert kept == ["front", "f1"]
+    assert sorted(dropped) == ["empty", "none", "odd"]
+
+
+def test_over_cap_keeps_angles_and_one_medoid_per_cluster():
+    templates = {"front": unit(0), "left": unit(90)}
+    # Two tight clusters of frames away from the angle templates, plus near-duplicates of front
+    for i in range(5):
+        templates[f"a{i}"] = unit(180 + i)
+        templates[f"b{i}"] = unit(270 + i)
+        templates[f"f{i}"] = unit(1 + i * 0.1)
+
+    kept, dropped = consolidate(templates, cap=4)
+    assert len(kept) == 4
+    assert {"front", "left"} <= set(kept)
+    # The free slots settle on each cluster's medoid rather than its farthest member
+    assert {"a2", "b2"} <= set(kept)
+    assert sorted(kept + dropped) == sorted(templates)
+
+
+def test_cap_is_respected_when_protected_exceed_it():
+    templates = {key: unit(i * 30) for i, key in enumerate(("front", "left", "right", "up", "down"))}
+    kept, dropped = consolidate(templates, cap=3)
+    assert kept == ["front", "left", "right"]
+    assert dropped == ["up", "down"]
+
+
+def test_without_angles_starts_from_the_most_central_template():
+    templates = {f"t{i}": unit(i * 5) for i in range(9)}
+    kept, _ = consolidate(templates, cap=1)
+    assert kept == ["t4"]
@@ -0,0 +1,72 @@
+# tests/test_timetable.py
+from datetime import datetime, timedelta
+from utils.attendance_session import PH_TZ
+from utils.scheduler import Timetable, START, STOP
+
+MONDAY = datetime(2025, 9, 1, tzinfo=PH_TZ)   # a Monday
+
+
+def at(hhmm, days=0):
+    h, m = map(int, hhmm.split(":"))
+    return MONDAY + timedelta(days=days, hours=h, minutes=m)
+
+
+def block(start, end, days=("Mon",)):
+    return [{"days": list(days), "start": start, "end": end}]
+
+
+def test_events_pop_in_time_order_and_rearm_weekly():
+    tt = Timetable()
+    tt.set_class("a", block("09:00", "10:30"), now=at("08:00"))
+
+    assert tt.next_due() == at("09:00")
+    assert tt.pop_due(at("08:59")) == []
+    assert tt.pop_due(at("09:00")) == [(at("09:00"), START, "a")]
+    assert tt.next_due() == at("10:30")
+    assert tt.pop_due(at("10:30")) == [(at("10:30"), STOP, "a")]
+
+    # Both events re-armed for next week
+    assert len(tt) == 2
+    assert tt.next_due() == at("09:00", days=7)
+    assert [kind for _, kind, _ in tt.pop_due(at("10:30", days=7))] == [START, STOP]
+
+
+def test_catch_up_starts_a_class_loaded_mid_slot_once():
+    tt = Timetable()
+    tt.set_class("a", block("09:00", "10:30"), now=at("09:30"), catch_up=True)
+
+    assert tt.pop_due(at("09:30")) == [(at("09:30"), START, "a")]
+    # The catch-up start is not re-armed; the regular start and today's stop remain
+    assert len(tt) == 2
+    assert tt.next_due() == at("10:30")
+    assert tt.pop_due(at("09:00", days=7)) == [(at("10:30"), STOP, "a"), (at("09:00", days=7), START, "a")]
+
+
+def test_no_catch_up_outside_initial_load():
+    tt = Timetable()
+    tt.set_class("a", block("09:00", "10:30"), now=at("09:30"))
+
+    assert tt.pop_due(at("09:30")) == []
+    assert tt.next_due() == at("10:30")
+
+
+def test_back_to_back_slots_stop_before_start():
+    tt = Timetable()
+    # "b" is inserted first, so only the kind ordering can put a's stop ahead of b's start
+    tt.set_class("b", block("10:00", "11:00"), now=at("08:00"))
+    tt.set_class("a", block("09:00", "10:00"), now=at("08:00"))
+
+    tt.pop_due(at("09:00"))
+    assert tt.pop_due(at("10:00")) == [(at("10:00"), STOP, "a"), (at("10:00"), START, "b")]
+
+
+def test_edited_and_removed_classes_drop_stale_events():
+    tt = Timetable()
+    tt.set_class("a", block("09:00", "10:00"), now=at("08:00"))
+    tt.set_class("a", block("13:00", "14:00"), now=at("08:00"))
+    tt.set_class("b", block("09:00", "10:00"), now=at("08:00"))
+    tt.remove_class("b")
+
+    assert tt.pop_due(at("12:59")) == []
+    assert tt.next_due() == at("13:00")
+    assert tt.pop_due(at("13:00")) == [(at("13:00"), START, "a")]
@@ -1,10 +1,47 @@
-from .anti_spoofing import *
-from .attendance_session import *
-from .blink_detection import *
-from .face_login import *
-from .face_recognition import *
-from .face_register import *
-from .face_utils import *
-from .mini_fas_loader import *
-from .model_loader import *
-from .multi_face_attendance import *
\ No newline at end of file
+# Submodules load on first use: `from utils.response_cache import ...` imports nothing else, so
+# API workers never pull in torch / onnxruntime / insightface / mediapipe unless a model module
+# is actually used. `utils.<submodule>` resolves lazily; anything else is an AttributeError (import
+# names from their submodule), so attribute probes never load a model library.
+import importlib
+
+_SUBMODULES = (
+    # no model libraries
+    "attendance_report",
+    "attendance_session",
+    "blink_detection",
+    "cor_bulk_import",
+    "cor_processing",
+    "etag",
+    "face_login",
+    "face_register",
+    "gallery_shard",
+    "image_ingest",
+    "inference_batcher",
+    "job_worker",
+    "kiosk_auth",
+    "model_packs",
+    "model_registry",
+    "model_server",
+    "response_cache",
+    "session_context",
+    "template_sets",
+    # load model libraries
+    "anti_spoofing",
+    "face_pipeline",
+    "face_recognition",
+    "face_utils",
+    "mini_fas_loader",
+    "model_loader",
+    "multi_face_attendance",
+    "onnx_sessions",
+)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_SUBMODULES))
\ No newline at end of file
@@ -7,7 +7,7 @@ import torchvision.transforms as transforms
 from torchvision import models
 from PIL import Image
 from collections import OrderedDict
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List
 
 # =========================
 # Config (edit if needed)
@@ -145,6 +145,12 @@ def _ensure_loaded():
         )
 
 
+def get_anti_spoof_model() -> nn.Module:
+    """Shared anti-spoof model, loaded on first call (raises if the checkpoint is missing)."""
+    _ensure_loaded()
+    return _anti_spoof_model
+
+
 # =========================
 # Preprocess
 # =========================
@@ -219,6 +225,43 @@ def check_real_or_spoof(
         return False, 0.0, {"real": 0.0, "spoof": 0.0}
 
 
+def check_real_or_spoof_batch(
+    crops_bgr: List[np.ndarray],
+    threshold: float = 0.90,
+    use_heuristics: bool = True,
+) -> List[Tuple[bool, float, Dict[str, float]]]:
+    """
+    check_real_or_spoof for many crops with a single forward pass.
+    (double_check is not needed here: the model is in eval mode, so a second pass is identical.)
+    """
+    if not crops_bgr:
+        return []
+    try:
+        _ensure_loaded()
+        x = torch.cat([preprocess_img(c) for c in crops_bgr], dim=0)
+        with torch.no_grad():
+            logits = _anti_spoof_model(x)
+            if _head_type == "sigmoid":
+                probs_real = torch.sigmoid(logits).reshape(-1).cpu().numpy()
+            else:
+                probs_real = torch.softmax(logits, dim=1)[:, 1].cpu().numpy()
+    except Exception as e:
+        if PRINT_DEBUG:
+            print("❌ Error in batched anti-spoof check:", e)
+        return [(False, 0.0, {"real": 0.0, "spoof": 0.0})] * len(crops_bgr)
+
+    out = []
+    for crop, prob_real in zip(crops_bgr, probs_real.tolist()):
+        is_real = prob_real >= threshold
+        if use_heuristics and not is_real:
+            is_real = is_real and _heuristics_ok(crop, prob_real)
+        confidence = prob_real if is_real else 1.0 - prob_real
+        out.append((bool(is_real), float(confidence), {"real": prob_real, "spoof": 1.0 - prob_real}))
+    if PRINT_DEBUG:
+        print(f"🕵️ Anti-Spoof batch of {len(out)} → {sum(1 for r in out if r[0])} real")
+    return out
+
+
 # =========================
 # Heuristics
 # =========================
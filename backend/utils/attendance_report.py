@@ -0,0 +1,192 @@
+# utils/attendance_report.py
+import csv
+import io
+import re
+import numpy as np
+from bson import ObjectId
+from config.db_config import db
+from models.enrollment_model import get_class_roster
+
+classes_collection = db["classes"]
+attendance_logs_collection = db["attendance_logs"]
+
+# -----------------------------
+# Status codes (matrix cells)
+# -----------------------------
+NO_RECORD = 0
+STATUS_CODES = {"Present": 1, "Late": 2, "Absent": 3}
+STATUS_LABELS = {0: "", 1: "P", 2: "L", 3: "A"}
+N_CODES = 4
+
+
+# -----------------------------
+# Matrix builder
+# -----------------------------
+def build_attendance_matrix(class_id, start_date=None, end_date=None):
+    """
+    Build a student × date attendance matrix for a class.
+
+    Rows follow the class roster (students found only in the logs are appended),
+    columns are session dates, cells are STATUS_CODES (0 = no record).
+    Per-student counts and rates are computed from the same int8 matrix.
+    Returns None if the class does not exist.
+    """
+    cls = classes_collection.find_one(
+        {"_id": ObjectId(class_id)},
+        {"subject_code": 1, "subject_title": 1, "course": 1, "section": 1}
+    )
+    if not cls:
+        return None
+
+    students = [
+        {
+            "student_id": s.get("student_id"),
+            "first_name": s.get("first_name", ""),
+            "last_name": s.get("last_name", ""),
+        }
+        for s in get_class_roster(class_id) if s.get("student_id")
+    ]
+    row_of = {s["student_id"]: i for i, s in enumerate(students)}
+
+    query = {"class_id": str(class_id)}
+    if start_date and end_date:
+        query["date"] = {"$gte": start_date, "$lt": end_date}
+
+    docs = attendance_logs_collection.find(
+        query,
+        {"_id": 0, "date": 1, "students.student_id": 1, "students.first_name": 1,
+         "students.last_name": 1, "students.status": 1}
+    ).sort("date", 1)
+
+    dates, rows, cols, codes = [], [], [], []
+    for d in docs:
+        date_str = str(d.get("date"))
+        if not dates or dates[-1] != date_str:
+            dates.append(date_str)
+        col = len(dates) - 1
+        for s in d.get("students", []):
+            sid = s.get("student_id")
+            if not sid:
+                continue
+            row = row_of.get(sid)
+            if row is None:
+                row = row_of[sid] = len(students)
+                students.append({
+                    "student_id": sid,
+                    "first_name": s.get("first_name", ""),
+                    "last_name": s.get("last_name", ""),
+                })
+            rows.append(row)
+            cols.append(col)
+            codes.append(STATUS_CODES.get(s.get("status"), NO_RECORD))
+
+    n_students, n_dates = len(students), len(dates)
+    matrix = np.zeros((n_students, n_dates), dtype=np.int8)
+    if codes:
+        matrix[np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)] = codes
+
+    # One bincount over (row, code) pairs gives every per-student status total
+    offsets = np.arange(n_students, dtype=np.intp)[:, None] * N_CODES
+    counts = np.bincount(
+        (offsets + matrix).ravel(), minlength=n_students * N_CODES
+    ).reshape(n_students, N_CODES)
+
+    present = counts[:, STATUS_CODES["Present"]]
+    late = counts[:, STATUS_CODES["Late"]]
+    absent = counts[:, STATUS_CODES["Absent"]]
+    recorded = present + late + absent
+    rates = np.zeros(n_students, dtype=np.float64)
+    np.divide((present + late) * 100.0, recorded, out=rates, where=recorded > 0)
+
+    return {
+        "class_id": str(cls["_id"]),
+        "subject_code": cls.get("subject_code"),
+        "subject_title": cls.get("subject_title"),
+        "course": cls.get("course"),
+        "section": cls.get("section"),
+        "students": students,
+        "dates": dates,
+        "matrix": matrix,
+        "present": present,
+        "late": late,
+        "absent": absent,
+        "rates": np.round(rates, 2),
+    }
+
+
+# -----------------------------
+# Serializers
+# -----------------------------
+def _header(report):
+    return (["student_id", "last_name", "first_name"] + report["dates"]
+            + ["present", "late", "absent", "attendance_rate"])
+
+
+def _iter_rows(report):
+    labels = np.array([STATUS_LABELS[c] for c in range(N_CODES)], dtype=object)
+    for i, s in enumerate(report["students"]):
+        yield ([s["student_id"], s["last_name"], s["first_name"]]
+               + labels[report["matrix"][i]].tolist()
+               + [int(report["present"][i]), int(report["late"][i]),
+                  int(report["absent"][i]), float(report["rates"][i])])
+
+
+def matrix_to_json(report):
+    """Compact JSON form: cells stay as status codes, one list per student."""
+    return {
+        "class_id": report["class_id"],
+        "subject_code": report["subject_code"],
+        "subject_title": report["subject_title"],
+        "course": report["course"],
+        "section": report["section"],
+        "dates": report["dates"],
+        "codes": {label: code for label, code in STATUS_CODES.items()},
+        "students": [
+            {
+                **s,
+                "cells": report["matrix"][i].tolist(),
+                "present": int(report["present"][i]),
+                "late": int(report["late"][i]),
+                "absent": int(report["absent"][i]),
+                "attendance_rate": float(report["rates"][i]),
+            }
+            for i, s in enumerate(report["students"])
+        ],
+    }
+
+
+def iter_matrix_csv(report):
+    """Yield the report as CSV text one row at a time (for streamed responses)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(_header(report))
+    yield buf.getvalue()
+    for row in _iter_rows(report):
+        buf.seek(0)
+        buf.truncate(0)
+        writer.writerow(row)
+        yield buf.getvalue()
+
+
+_SHEET_TITLE_INVALID = re.compile(r"[\\/?*\[\]:]")
+
+
+def sheet_title(name):
+    """Excel sheet title: no / \\ ? * [ ] :, no leading/trailing apostrophe, at most 31 characters."""
+    title = _SHEET_TITLE_INVALID.sub("-", str(name or "")).strip("'")[:31].strip("'")
+    return title or "Attendance"
+
+
+def matrix_to_xlsx(report):
+    """Return the report as XLSX bytes (requires openpyxl)."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title(report.get("subject_code")))
+    ws.append(_header(report))
+    for row in _iter_rows(report):
+        ws.append(row)
+
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
@@ -1,12 +1,10 @@
 from datetime import datetime, timedelta, timezone
-from bson import ObjectId
-from config.db_config import db
+from bson.errors import InvalidId
 from models.attendance_model import has_logged_attendance
-
-classes_collection = db["classes"]
-
-attendance_active = False
-current_class_id = None
+from utils.session_context import get_session_context, invalidate_session_context
+from models.session_model import (
+    SessionConflict, open_session, close_session, expire_sessions, session_to_payload,
+)
 
 # PH timezone
 PH_TZ = timezone(timedelta(hours=8))
@@ -20,98 +18,46 @@ def _today_date_ph():
 
 
 def refresh_session_state_from_db():
-    """Sync local state with DB and auto-stop if end_time expired."""
-    global attendance_active, current_class_id
-    active = classes_collection.find_one({"is_attendance_active": True})
-    if active:
-        end_time = active.get("attendance_end_time")
-        if isinstance(end_time, str):
-            try:
-                end_time = datetime.fromisoformat(end_time)
-            except Exception:
-                end_time = None
-
-        now_ph = datetime.now(PH_TZ)
-
-        if end_time and now_ph >= end_time:
-            # Auto stop if time expired
-            stop_attendance_session(str(active["_id"]))
-            attendance_active = False
-            current_class_id = None
-        else:
-            attendance_active = True
-            current_class_id = str(active["_id"])
-    else:
-        attendance_active = False
-        current_class_id = None
-
-
-def start_attendance_session(class_id, instructor_id=None):
-    """Mark class as having an active attendance session with auto-stop in 30 mins."""
-    global attendance_active, current_class_id
-
-    active = classes_collection.find_one({"is_attendance_active": True})
-    if active:
-        print(f"⚠️ Attendance session already running for {active['_id']}")
-        return False
-
-    start_time = datetime.now(PH_TZ)
-    end_time = start_time + timedelta(minutes=30)  # 🔹 auto-stop after 30 mins
+    """Auto-stop every session whose end time has passed. State lives in the sessions collection."""
+    for session in expire_sessions():
+        invalidate_session_context(session["class_id"])
+        print(f"⏱️ Attendance session auto-stopped for class {session['class_id']} (room {session['room_id']})")
 
-    result = classes_collection.update_one(
-        {"_id": ObjectId(class_id)},
-        {"$set": {
-            "is_attendance_active": True,
-            "attendance_start_time": start_time.isoformat(),
-            "attendance_end_time": end_time.isoformat(),
-            "activated_by": instructor_id or "system"
-        }}
-    )
 
-    if result.modified_count == 0:
+def start_attendance_session(class_id, instructor_id=None, room_id=None):
+    """
+    Start a session for one class in one room, auto-stopping in 30 mins.
+    Sessions in other rooms are unaffected. Returns the session document, or None.
+    """
+    try:
+        session = open_session(class_id, room_id=room_id, started_by=instructor_id)
+    except (LookupError, SessionConflict) as e:
+        print(f"⚠️ {e}")
+        return None
+    except InvalidId:
         print(f"⚠️ Class {class_id} not updated (maybe wrong ObjectId?)")
-        attendance_active = False
-        current_class_id = None
-        return False
-
-    attendance_active = True
-    current_class_id = class_id
-    print(f"✅ Attendance session started for class {class_id} (auto-stop at {end_time})")
-    return True
+        return None
 
+    get_session_context(class_id, refresh=True)
+    print(f"✅ Attendance session started for class {class_id} in room {session['room_id']} "
+          f"(auto-stop at {session_to_payload(session)['ends_at']})")
+    return session
 
-def stop_attendance_session(class_id=None):
-    """Stop an active attendance session (manual or auto)."""
-    global attendance_active, current_class_id
 
-    if not attendance_active:
-        active = classes_collection.find_one({"is_attendance_active": True}, {"_id": 1})
-        if not active:
-            print("⚠️ No active session to stop")
-            return False
-        current_class_id = str(active["_id"])
-
-    if class_id and class_id != current_class_id:
-        print(f"⚠️ Tried to stop session for {class_id}, but active session is {current_class_id}")
+def stop_attendance_session(class_id=None, room_id=None):
+    """Stop the active session of one class or one room (manual or auto)."""
+    if not class_id and not room_id:
+        print("⚠️ No class or room given to stop")
         return False
 
-    now_ph = datetime.now(PH_TZ)
-
-    result = classes_collection.update_one(
-        {"_id": ObjectId(current_class_id), "is_attendance_active": True},
-        {"$set": {
-            "is_attendance_active": False,
-            "attendance_end_time": now_ph.isoformat()
-        }}
-    )
-
-    if result.modified_count == 0:
-        print(f"⚠️ Class {current_class_id} not updated on stop")
+    session = close_session(class_id=class_id, room_id=room_id)
+    if not session:
+        print(f"⚠️ No active session to stop for {class_id or 'room ' + str(room_id)}")
         return False
 
-    print(f"🛑 Attendance session stopped for class {current_class_id}")
-    attendance_active = False
-    current_class_id = None
+    invalidate_session_context(session["class_id"])
+
+    print(f"🛑 Attendance session stopped for class {session['class_id']} (room {session['room_id']})")
     return True
 
 
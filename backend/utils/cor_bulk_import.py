@@ -0,0 +1,277 @@
+# utils/cor_bulk_import.py
+"""
+Bulk COR import for a whole section: parse every PDF in a process pool, match each
+to a student, and apply all enrollments in batched writes.
+
+    python -m utils.cor_bulk_import sectionA.zip              # import
+    python -m utils.cor_bulk_import ./cors --dry-run          # parse + match only
+    python -m utils.cor_bulk_import ./cors --processes 8 --report report.json
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import zipfile
+import argparse
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from config.db_config import db
+from models.enrollment_service import enroll_blocks
+from utils.cor_processing import CORParseError, extract_cor_text, parse_cor_text
+
+students_collection = db["students"]
+subjects_collection = db["subjects"]
+
+STUDENT_ID_RE = re.compile(r"Student\s*(?:No\.?|Number|ID)\s*[:#]?\s*([A-Z0-9][A-Z0-9-]{3,})", re.IGNORECASE)
+
+# Total uncompressed bytes extracted from one archive (the endpoint accepts arbitrary zips)
+MAX_EXTRACT_BYTES = int(os.getenv("COR_IMPORT_MAX_EXTRACT_MB", "512")) * 1024 * 1024
+COPY_CHUNK = 1024 * 1024
+
+
+class ArchiveTooLarge(ValueError):
+    """The zip expands beyond MAX_EXTRACT_BYTES."""
+
+
+# Per-file statuses in the report
+ENROLLED, PARSED, UNMATCHED, NO_SUBJECTS, PARSE_ERROR = "enrolled", "parsed", "unmatched", "no_subjects", "parse_error"
+
+
+# -----------------------------
+# Input collection
+# -----------------------------
+def _archive_member_path(filename):
+    """Relative path of a zip member inside the work dir, or None for absolute / '..' / hidden paths."""
+    parts = [p for p in filename.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or filename.startswith(("/", "\\")) or ":" in parts[0]:
+        return None
+    if any(p == ".." or p.startswith(".") for p in parts):
+        return None
+    return os.path.join(*parts)
+
+
+def _extract_pdfs(archive, target):
+    """Extract the archive's PDFs under target, refusing more than MAX_EXTRACT_BYTES in total."""
+    extracted = 0
+    with zipfile.ZipFile(archive) as zf:
+        members = [m for m in zf.infolist() if not m.is_dir() and m.filename.lower().endswith(".pdf")]
+        declared = sum(m.file_size for m in members)
+        if declared > MAX_EXTRACT_BYTES:
+            raise ArchiveTooLarge(f"Archive expands to {declared} bytes (limit {MAX_EXTRACT_BYTES})")
+        for member in members:
+            # Keep folders (BSIT-1A/cor.pdf and BSIT-1B/cor.pdf are different files), but never
+            # let a crafted archive write outside the work dir
+            relpath = _archive_member_path(member.filename)
+            if relpath is None:
+                print(f"⚠️ Skipping archive member: {member.filename}")
+                continue
+            dest = os.path.join(target, relpath)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            with zf.open(member) as src, open(dest, "wb") as dst:
+                # Count real bytes too: file_size in the directory can lie
+                while chunk := src.read(COPY_CHUNK):
+                    extracted += len(chunk)
+                    if extracted > MAX_EXTRACT_BYTES:
+                        raise ArchiveTooLarge(f"Archive expands beyond {MAX_EXTRACT_BYTES} bytes")
+                    dst.write(chunk)
+
+
+def collect_cor_files(source, workdir=None):
+    """
+    Return (pdf_paths, root, cleanup_dir) for a directory or a .zip archive.
+    Zips are extracted into workdir, or into a temp dir returned as cleanup_dir for the caller to remove.
+    """
+    cleanup = None
+    if os.path.isfile(source) and zipfile.is_zipfile(source):
+        target = workdir or tempfile.mkdtemp(prefix="cor_import_")
+        cleanup = None if workdir else target
+        try:
+            _extract_pdfs(source, target)
+        except Exception:
+            if cleanup:
+                shutil.rmtree(cleanup, ignore_errors=True)
+            raise
+        source = target
+
+    if not os.path.isdir(source):
+        raise FileNotFoundError(f"Not a directory or zip archive: {source}")
+
+    paths = sorted(
+        os.path.join(root, f)
+        for root, _, files in os.walk(source)
+        for f in files if f.lower().endswith(".pdf")
+    )
+    return paths, source, cleanup
+
+
+# -----------------------------
+# Parsing (runs in worker processes)
+# -----------------------------
+def _filename_student_id(path):
+    """Fallback: COR files are saved as <student_id>_... by upload-cor."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.split("_", 1)[0].strip() or None
+
+
+def parse_cor_for_import(path):
+    result = {"file": os.path.basename(path), "path": path}
+    try:
+        text = extract_cor_text(path)
+    except CORParseError as e:
+        return {**result, "status": PARSE_ERROR, "error": str(e)}
+
+    parsed = parse_cor_text(text)
+    m = STUDENT_ID_RE.search(text)
+    result["student_id"] = m.group(1).strip() if m else _filename_student_id(path)
+    result["parsed"] = parsed
+    if not all(parsed.values()):
+        return {**result, "status": PARSE_ERROR,
+                "error": "Could not parse COR (missing course/year/section/semester)"}
+    return {**result, "status": PARSED}
+
+
+def parse_all(paths, processes=None, progress=None):
+    """
+    Parse every file across all cores; chunked so per-task IPC stays small.
+    progress(done, total) is called after each chunk (the job worker renews its lease there).
+    """
+    if not paths:
+        return []
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(paths) == 1:
+        return _collect(map(parse_cor_for_import, paths), len(paths), 1, progress)
+    chunksize = max(1, len(paths) // (processes * 4))
+    # spawn: the job worker calls this from the threaded API process (Mongo client must not be forked)
+    with ProcessPoolExecutor(max_workers=processes, mp_context=mp.get_context("spawn")) as pool:
+        return _collect(pool.map(parse_cor_for_import, paths, chunksize=chunksize), len(paths), chunksize, progress)
+
+
+def _collect(results, total, chunksize, progress):
+    out = []
+    for r in results:
+        out.append(r)
+        if progress and (len(out) % chunksize == 0 or len(out) == total):
+            progress(len(out), total)
+    return out
+
+
+# -----------------------------
+# Matching + batched enrollment
+# -----------------------------
+def _match_students(results):
+    ids = list({r["student_id"] for r in results if r["status"] == PARSED and r.get("student_id")})
+    students = {
+        s["student_id"]: s
+        for s in students_collection.find(
+            {"student_id": {"$in": ids}},
+            {"_id": 0, "student_id": 1, "first_name": 1, "last_name": 1}
+        )
+    } if ids else {}
+    for r in results:
+        if r["status"] == PARSED and r.get("student_id") not in students:
+            r["status"] = UNMATCHED
+            r["error"] = f"No student with student_id {r.get('student_id')!r}"
+    return students
+
+
+def _subjects_by_block(blocks):
+    """All subjects for every (course, year_level, semester) in one $or query."""
+    if not blocks:
+        return {}
+    out = {b: [] for b in blocks}
+    cursor = subjects_collection.find({"$or": [
+        {"course": c, "year_level": y, "semester": s} for c, y, s in blocks
+    ]})
+    for subj in cursor:
+        key = (subj.get("course"), subj.get("year_level"), subj.get("semester"))
+        if key in out:
+            out[key].append(subj)
+    return out
+
+
+def import_cor_files(paths, processes=None, dry_run=False, root=None, progress=None):
+    """
+    Parse, match and enroll. Returns {"summary": {...}, "files": [per-file results]}; files are
+    named relative to root when given. progress(done, total) is called while parsing and at the end.
+    """
+    results = parse_all(paths, processes, progress)
+    students = _match_students(results)
+    matched = [r for r in results if r["status"] == PARSED]
+
+    subjects = _subjects_by_block({
+        (r["parsed"]["course"], r["parsed"]["year_level"], r["parsed"]["semester"]) for r in matched
+    })
+
+    # One group per section; a student appearing in several files is enrolled once
+    groups = {}
+    for r in matched:
+        p = r["parsed"]
+        block_subjects = subjects.get((p["course"], p["year_level"], p["semester"]), [])
+        if not block_subjects:
+            r["status"] = NO_SUBJECTS
+            r["error"] = "No subjects offered for this course/year/semester"
+            continue
+        key = (p["course"], p["year_level"], p["section"], p["semester"])
+        g = groups.setdefault(key, {
+            "students": {}, "subjects": block_subjects,
+            "course": key[0], "year_level": key[1], "section": key[2], "semester": key[3],
+        })
+        g["students"][r["student_id"]] = students[r["student_id"]]
+        r["subjects"] = [s["subject_code"] for s in block_subjects]
+
+    if not dry_run and groups:
+        enroll_blocks([{**g, "students": list(g["students"].values())} for g in groups.values()])
+        for r in results:
+            if r["status"] == PARSED:
+                r["status"] = ENROLLED
+
+    for r in results:
+        path = r.pop("path", None)
+        if root and path:
+            r["file"] = os.path.relpath(path, root)
+    if progress:
+        progress(len(results), len(results))
+
+    summary = {"files": len(results), "sections": len(groups), "dry_run": dry_run}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    return {"summary": summary, "files": results}
+
+
+def import_cor_source(source, processes=None, dry_run=False, workdir=None, progress=None):
+    """Directory or zip in, report out; zips extracted to a temp dir are removed afterwards."""
+    paths, root, cleanup = collect_cor_files(source, workdir)
+    try:
+        return import_cor_files(paths, processes=processes, dry_run=dry_run, root=root, progress=progress)
+    finally:
+        if cleanup:
+            shutil.rmtree(cleanup, ignore_errors=True)
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import a section's COR PDFs.")
+    parser.add_argument("source", help="directory of COR PDFs or a .zip archive")
+    parser.add_argument("--processes", type=int, default=None, help="parser processes (default: all cores)")
+    parser.add_argument("--dry-run", action="store_true", help="parse and match only; write nothing")
+    parser.add_argument("--report", help="write the per-file JSON report here")
+    args = parser.parse_args(argv)
+
+    report = import_cor_source(args.source, processes=args.processes, dry_run=args.dry_run)
+    for r in report["files"]:
+        icon = "✅" if r["status"] in (ENROLLED, PARSED) else "⚠️"
+        print(f"{icon} {r['file']}: {r['status']} {r.get('student_id') or ''} {r.get('error') or ''}".rstrip())
+    print("📋", json.dumps(report["summary"]))
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["summary"].get(PARSE_ERROR, 0) + report["summary"].get(UNMATCHED, 0) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
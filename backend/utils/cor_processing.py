@@ -0,0 +1,93 @@
+# utils/cor_processing.py
+import re
+from config.db_config import db
+from models.enrollment_service import enroll_student_in_subjects
+
+students_collection = db["students"]
+subjects_collection = db["subjects"]
+
+
+class CORParseError(Exception):
+    """Raised when a COR file cannot be read or is missing course/year/section/semester."""
+
+
+class StudentNotFound(LookupError):
+    """Raised when a COR is assigned to a student_id that is not registered."""
+
+
+# -----------------------------
+# Step 1: Parse course/year/section/semester from COR (CPU-bound, runs in a worker process)
+# -----------------------------
+def parse_cor_text(text):
+    course, year_level, section, semester = None, None, None, None
+
+    # Extract Course and Year Digit
+    m = re.search(r"Course/?Yr:\s*([A-Z]+)\s*(\d)", text, re.IGNORECASE)
+    if m:
+        course = m.group(1).upper().strip()       # "BSINFOTECH"
+        year_level = f"{m.group(2)}th Year"       # "4th Year"
+
+    # Extract Section (e.g., 4C)
+    m2 = re.search(r"\b(\d[A-Z])\b", text)
+    if m2:
+        section = m2.group(1).upper()             # "4C"
+
+    # Extract Semester
+    m3 = re.search(r"(First|1st|Second|2nd)\s+Semester", text, re.IGNORECASE)
+    if m3:
+        sem_value = m3.group(1).lower()
+        if sem_value in ["first", "1st"]:
+            semester = "1st Sem"
+        elif sem_value in ["second", "2nd"]:
+            semester = "2nd Sem"
+
+    return {"course": course, "year_level": year_level, "section": section, "semester": semester}
+
+
+def extract_cor_text(path):
+    if not path.lower().endswith(".pdf"):
+        raise CORParseError("Could not parse COR (only PDF files can be parsed)")
+    try:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return "\n".join([p.extract_text() or "" for p in pdf.pages])
+    except Exception as e:
+        raise CORParseError(f"Failed to parse COR: {e}")
+
+
+def parse_cor_file(path):
+    """Extract the block from a COR PDF. Top-level so it can be pickled into a ProcessPoolExecutor."""
+    parsed = parse_cor_text(extract_cor_text(path))
+    if not all(parsed.values()):
+        raise CORParseError("Could not parse COR (missing course/year/section/semester)")
+    return parsed
+
+
+# -----------------------------
+# Step 2: Assign subjects for the parsed block
+# -----------------------------
+def assign_subjects_from_cor(student_id, parsed, progress=None):
+    """
+    Enroll the student in every subject offered to the parsed block
+    (bulk writes via the enrollment service). progress(done, total) is called once done, if given.
+    """
+    student_doc = students_collection.find_one(
+        {"student_id": student_id}, {"_id": 0, "student_id": 1, "first_name": 1, "last_name": 1}
+    )
+    if not student_doc:
+        raise StudentNotFound("Student not found")
+
+    subjects = list(subjects_collection.find({
+        "course": parsed["course"],
+        "year_level": parsed["year_level"],
+        "semester": parsed["semester"]
+    }))
+
+    assigned_subjects = enroll_student_in_subjects(
+        student_doc, subjects,
+        parsed["course"], parsed["year_level"], parsed["section"], parsed["semester"]
+    )
+
+    if progress:
+        progress(len(subjects), len(subjects))
+    return assigned_subjects
@@ -0,0 +1,14 @@
+# utils/etag.py
+from flask import jsonify, request
+
+
+def etag_json_response(payload, status=200):
+    """
+    jsonify() the payload with a strong ETag and honour If-None-Match.
+    Returns a 304 with an empty body when the client already has this payload.
+    """
+    resp = jsonify(payload)
+    resp.status_code = status
+    resp.add_etag()
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp.make_conditional(request)
@@ -0,0 +1,177 @@
+# utils/face_pipeline.py
+# Model libraries (insightface, torch via anti_spoofing, mediapipe) are imported on first use;
+# warmup() loads and exercises all of them up front (see utils/model_registry.py).
+import cv2
+import numpy as np
+from utils.model_loader import get_face_model
+from utils.model_packs import active_namespace
+
+# -----------------------------
+# Config
+# -----------------------------
+ANTI_SPOOF_THRESHOLD = 0.8
+PAD_RATIO = 0.25  # padding around bbox for anti-spoof crop
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def expand_and_clip_bbox(bbox, w, h, pad_ratio=PAD_RATIO):
+    x1, y1, x2, y2 = [int(v) for v in bbox[:4]]
+    bw, bh = (x2 - x1), (y2 - y1)
+    if bw <= 0 or bh <= 0:
+        return 0, 0, w - 1, h - 1
+    cx, cy = (x1 + x2) / 2.0, (y1 + y2) / 2.0
+    side = max(bw, bh) * (1.0 + pad_ratio)
+    nx1, ny1 = int(round(cx - side / 2)), int(round(cy - side / 2))
+    nx2, ny2 = int(round(cx + side / 2)), int(round(cy + side / 2))
+    nx1 = max(0, nx1); ny1 = max(0, ny1)
+    nx2 = min(w - 1, nx2); ny2 = min(h - 1, ny2)
+    return nx1, ny1, nx2, ny2
+
+
+# MediaPipe FaceMesh for the registration angle; created on first use (not thread-safe,
+# but every caller runs on a single dispatcher thread or model worker)
+_face_mesh = None
+
+
+def get_face_angle(landmarks, w, h):
+    """Coarse head pose from MediaPipe landmarks: front / left / right / up / down."""
+    try:
+        nose = landmarks[1]
+        left_eye = landmarks[33]
+        right_eye = landmarks[263]
+        mouth = landmarks[13]
+
+        nose_y = nose.y * h
+        eye_mid_y = ((left_eye.y + right_eye.y) / 2) * h
+        mouth_y = mouth.y * h
+
+        eye_dist = right_eye.x - left_eye.x
+        nose_pos = (nose.x - left_eye.x) / (eye_dist + 1e-6)
+        up_down_ratio = (nose_y - eye_mid_y) / (mouth_y - nose_y + 1e-6)
+
+        if nose_pos < 0.3:
+            return 'right'
+        elif nose_pos > 0.8:
+            return 'left'
+        elif up_down_ratio > 2.5:
+            return 'down'
+        elif up_down_ratio < 0.3:
+            return 'up'
+        return 'front'
+    except Exception as e:
+        print("❌ Angle detection failed:", str(e))
+        return 'front'
+
+
+def get_face_mesh():
+    global _face_mesh
+    if _face_mesh is None:
+        import mediapipe as mp
+        _face_mesh = mp.solutions.face_mesh.FaceMesh(max_num_faces=1, refine_landmarks=True)
+    return _face_mesh
+
+
+def detect_face_angle(img):
+    """{"angle": ...}, {"angle": None} when FaceMesh finds no face, or an angle_error."""
+    try:
+        results = get_face_mesh().process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        if not results.multi_face_landmarks:
+            return {"angle": None}
+        h, w = img.shape[:2]
+        return {"angle": get_face_angle(results.multi_face_landmarks[0].landmark, w, h)}
+    except Exception as e:
+        print("❌ FaceMesh error:", str(e))
+        return {"angle": None, "angle_error": "Landmark processing failed"}
+
+
+def _primary_face_index(bboxes):
+    """Highest detection score, ties broken by area (same rule as the single-image login path)."""
+    areas = np.clip(bboxes[:, 2] - bboxes[:, 0], 0, None) * np.clip(bboxes[:, 3] - bboxes[:, 1], 0, None)
+    return int(np.argmax(bboxes[:, 4] * 1e6 + areas))
+
+
+# -----------------------------
+# Batched pipeline
+# -----------------------------
+def analyze_faces(items):
+    """
+    items: [(img_bgr, options)] -> one dict per item with either "error" or
+    bbox / det_score / embedding / pack (+ is_real / anti_spoof_confidence / anti_spoof_probs).
+    options: {"anti_spoof": bool, "angle": bool}; "angle" adds the FaceMesh head pose.
+    "pack" is the model-pack namespace the embedding belongs to (see utils/model_packs.py).
+
+    Detection runs image by image (RetinaFace in buffalo_l has a fixed batch of 1);
+    anti-spoof and ArcFace each run once over every face in the batch.
+    """
+    from insightface.utils import face_align
+    from utils.anti_spoofing import check_real_or_spoof_batch
+
+    model = get_face_model()
+    if model is None:
+        return [{"error": "Face model not initialized"} for _ in items]
+    recognizer = model.models["recognition"]
+
+    results = [None] * len(items)
+    faces = []  # (item index, bbox row, kps)
+    for i, (img, _) in enumerate(items):
+        try:
+            bboxes, kpss = model.det_model.detect(img, max_num=0, metric="default")
+        except Exception as e:
+            print("❌ Face model error:", e)
+            results[i] = {"error": "Face detection failed"}
+            continue
+        if bboxes is None or len(bboxes) == 0:
+            results[i] = {"error": "No face detected"}
+            continue
+        j = _primary_face_index(bboxes)
+        if kpss is None:
+            results[i] = {"error": "No face embedding extracted"}
+            continue
+        faces.append((i, bboxes[j], kpss[j]))
+
+    # Anti-spoof: one forward pass over every crop that asked for it
+    spoof_faces = [(i, bbox) for i, bbox, _ in faces if items[i][1].get("anti_spoof")]
+    crops = []
+    for i, bbox in spoof_faces:
+        img = items[i][0]
+        H, W = img.shape[:2]
+        x1, y1, x2, y2 = expand_and_clip_bbox(bbox, W, H)
+        crops.append(img[y1:y2, x1:x2] if (y2 > y1 and x2 > x1) else img)
+    verdicts = dict(zip((i for i, _ in spoof_faces), check_real_or_spoof_batch(crops, ANTI_SPOOF_THRESHOLD)))
+
+    # ArcFace: aligned 112x112 crops, one session.run for the whole batch
+    to_embed = [(i, bbox, kps) for i, bbox, kps in faces if verdicts.get(i, (True,))[0]]
+    if to_embed:
+        aligned = [
+            face_align.norm_crop(items[i][0], landmark=kps, image_size=recognizer.input_size[0])
+            for i, _, kps in to_embed
+        ]
+        feats = recognizer.get_feat(aligned)
+    for k, (i, bbox, _) in enumerate(to_embed):
+        results[i] = {"bbox": bbox[:4].tolist(), "det_score": float(bbox[4]),
+                      "embedding": np.asarray(feats[k]).ravel(), "pack": active_namespace()}
+
+    for i, bbox, _ in faces:
+        if i in verdicts:
+            is_real, confidence, probs = verdicts[i]
+            results[i] = results[i] or {"bbox": bbox[:4].tolist(), "det_score": float(bbox[4])}
+            results[i].update({"is_real": is_real, "anti_spoof_confidence": confidence, "anti_spoof_probs": probs})
+
+    for i, (img, options) in enumerate(items):
+        if options.get("angle"):
+            results[i].update(detect_face_angle(img))
+    return results
+
+
+def analyze_face(img, anti_spoof=True, angle=False):
+    """Single image, same pipeline (no queuing)."""
+    return analyze_faces([(img, {"anti_spoof": anti_spoof, "angle": angle})])[0]
+
+
+
+def warmup():
+    """Load and exercise every pipeline model (in parallel, see utils/model_registry.py)."""
+    from utils.model_registry import face_models
+    return face_models.warmup_all()
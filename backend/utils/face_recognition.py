@@ -5,7 +5,6 @@ import numpy as np
 from datetime import datetime
 from scipy.spatial.distance import cosine
 from scipy.spatial import distance as dist
-import mediapipe as mp
 from models.face_db_model import load_registered_faces
 from models.attendance_logs_model import log_attendance
 
@@ -15,9 +14,6 @@ BLINK_RATIO = 0.75
 BLINK_COOLDOWN = 10
 MATCH_THRESHOLD = 0.4
 
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(refine_landmarks=True, max_num_faces=1)
-
 LEFT_EYE_IDX = [33, 160, 158, 133, 153, 144]
 RIGHT_EYE_IDX = [362, 385, 387, 263, 373, 380]
 
@@ -41,6 +37,9 @@ def find_matching_student(live_embedding, registered_faces, threshold=MATCH_THRE
     return best_match, best_score
 
 def handle_attendance_session(subject="Default Subject", subject_id=None, subject_start_time=None):
+    import mediapipe as mp  # only the webcam session needs it
+    face_mesh = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True, max_num_faces=1)
+
     registered_faces = load_registered_faces()
     seen_student_ids = set()
 
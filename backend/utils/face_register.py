@@ -1,113 +1,85 @@
 import cv2
-import base64
-import numpy as np
-import mediapipe as mp
 from datetime import datetime
-from models.face_db_model import save_face_data
-from utils.model_loader import get_face_model  # ✅ Use shared model instance
+from models.face_db_model import save_face_data, get_student_by_id
+from utils.model_packs import embedding_field
+from utils.image_ingest import decode_data_url
+from utils.inference_batcher import AdmissionError
 
-# --- Load shared InsightFace model (ArcFace + RetinaFace) ---
-face_model = get_face_model()
+# Angles get_face_angle() reports; a complete enrollment has one template per angle
+REGISTRATION_ANGLES = ("front", "left", "right", "up", "down")
+SHARPNESS_REF = 100.0    # Laplacian variance of a crisp face crop
+GOOD_FACE_SIZE = 112     # ArcFace input side; smaller faces get upscaled
+PROFILE_FIELDS = ("first_name", "last_name", "middle_name", "course", "section", "email", "contact_number")
 
-# --- Initialize MediaPipe FaceMesh ---
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(max_num_faces=1, refine_landmarks=True)
-
-# --- Helper: Predict Face Angle from MediaPipe landmarks ---
-def get_face_angle(landmarks, w, h):
-    try:
-        nose = landmarks[1]
-        left_eye = landmarks[33]
-        right_eye = landmarks[263]
-        mouth = landmarks[13]
-
-        nose_y = nose.y * h
-        eye_mid_y = ((left_eye.y + right_eye.y) / 2) * h
-        mouth_y = mouth.y * h
-
-        eye_dist = right_eye.x - left_eye.x
-        nose_pos = (nose.x - left_eye.x) / (eye_dist + 1e-6)
-        up_down_ratio = (nose_y - eye_mid_y) / (mouth_y - nose_y + 1e-6)
-
-        if nose_pos < 0.3:
-            return 'right'
-        elif nose_pos > 0.8:
-            return 'left'
-        elif up_down_ratio > 2.5:
-            return 'down'
-        elif up_down_ratio < 0.3:
-            return 'up'
-        return 'front'
-    except Exception as e:
-        print("❌ Angle detection failed:", str(e))
-        return 'front'
 
 # --- Main Registration Function ---
-def register_face_auto(data):
+def register_face_auto(data, analyze=None, img=None):
+    """
+    analyze(img) -> face_pipeline result with the FaceMesh angle; defaults to running the
+    pipeline inline. The API passes the model server instead (its AdmissionError propagates).
+    img: an already decoded frame (binary uploads); otherwise data["image"] is a data URL.
+    """
+    if analyze is None:
+        from utils.face_pipeline import analyze_face  # loads the models into this process
+        analyze = lambda img: analyze_face(img, anti_spoof=False, angle=True)
     try:
         student_id = data.get("student_id")
         base64_image = data.get("image")
         angle_from_frontend = data.get("angle")
 
-        if not student_id or not base64_image:
+        if not student_id or (img is None and not base64_image):
             return {"success": False, "error": "Missing student_id or image"}
 
         # Decode base64
         try:
-            img_bytes = base64.b64decode(base64_image.split(",")[1])
-            img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                img = decode_data_url(base64_image)
             if img is None:
                 return {"success": False, "error": "Image decoding failed"}
-            img = cv2.flip(img, 1)
         except Exception as e:
             print("❌ Base64 decoding error:", str(e))
             return {"success": False, "error": "Invalid image format"}
 
-        # Face landmarks (MediaPipe)
+        # Landmarks (MediaPipe) + ArcFace embedding, one pipeline pass
         try:
-            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            results = face_mesh.process(rgb)
-            if not results.multi_face_landmarks:
-                return {"success": False, "error": "No face detected"}
-            h, w = img.shape[:2]
-            landmarks = results.multi_face_landmarks[0].landmark
-            angle = angle_from_frontend or get_face_angle(landmarks, w, h)
+            analysis = analyze(img)
+        except AdmissionError:
+            raise
         except Exception as e:
-            print("❌ FaceMesh error:", str(e))
-            return {"success": False, "error": "Landmark processing failed"}
+            print("❌ Embedding extraction failed:", str(e))
+            return {"success": False, "error": "Embedding generation error"}
 
+        if analysis.get("error") == "Face model not initialized":
+            return {"success": False, "error": analysis["error"]}
+        if analysis.get("angle_error"):
+            return {"success": False, "error": analysis["angle_error"]}
+        if analysis.get("angle") is None:
+            return {"success": False, "error": "No face detected"}
+        angle = angle_from_frontend or analysis["angle"]
         print(f"🎯 Detected angle: {angle}")
 
-        # ArcFace embedding
-        if face_model is None:
-            return {"success": False, "error": "Face model not initialized"}
-        try:
-            faces = face_model.get(img)
-            if not faces or not hasattr(faces[0], "embedding"):
-                return {"success": False, "error": "No face embedding extracted"}
-            embedding = faces[0].embedding.tolist()
-        except Exception as e:
-            print("❌ Embedding extraction failed:", str(e))
-            return {"success": False, "error": "Embedding generation error"}
+        if analysis.get("embedding") is None:
+            return {"success": False, "error": "No face embedding extracted"}
+        embedding = analysis["embedding"].tolist()
+        # Stored under the namespace of the pack that produced it (the model server's)
+        field = embedding_field(analysis.get("pack"))
 
         # Save to DB
         try:
             save_face_data(
                 student_id=student_id,
                 update_fields={
-                    "First_Name": data.get("first_name", ""),
-                    "Last_Name": data.get("last_name", ""),
-                    "Middle_Name": data.get("middle_name", ""),
-                    "Course": data.get("course", ""),
-                    "Email": data.get("email", ""),
-                    "Contact_Number": data.get("contact_number", ""),
-                    "Section": "",
-                    "Subjects": [],
+                    "first_name": data.get("first_name", ""),
+                    "last_name": data.get("last_name", ""),
+                    "middle_name": data.get("middle_name", ""),
+                    "course": data.get("course", ""),
+                    "email": data.get("email", ""),
+                    "contact_number": data.get("contact_number", ""),
                     "created_at": datetime.utcnow(),
-                    f"embeddings.{angle}": embedding,
+                    f"{field}.{angle}": embedding,
                 },
             )
-            print(f"✅ Face data updated for {student_id}. Fields updated: ['embeddings.{angle}']")
+            print(f"✅ Face data updated for {student_id}. Fields updated: ['{field}.{angle}']")
         except Exception as e:
             print("❌ Database update failed:", str(e))
             return {"success": False, "error": "Database update failed"}
@@ -119,8 +91,81 @@ def register_face_auto(data):
             "angle": angle,
         }
 
+    except AdmissionError:
+        raise
     except Exception:
         import traceback
         print("❌ register_face_auto() Exception:", traceback.format_exc())
         return {"success": False, "error": "Internal server error"}
 
+
+
+# --- Batch Registration ---
+def frame_quality(img, analysis):
+    """Detector confidence x sharpness x face size, each capped at 1: higher is a better template."""
+    h, w = img.shape[:2]
+    x1, y1, x2, y2 = [int(round(v)) for v in analysis["bbox"]]
+    x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return 0.0
+    gray = cv2.cvtColor(img[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+    sharpness = min(1.0, cv2.Laplacian(gray, cv2.CV_64F).var() / SHARPNESS_REF)
+    size = min(1.0, min(x2 - x1, y2 - y1) / GOOD_FACE_SIZE)
+    return round(float(analysis.get("det_score", 0.0)) * sharpness * size, 4)
+
+
+def register_face_batch(student_id, profile, frames, analyze_many=None):
+    """
+    frames: [(img_bgr, angle or None)] of one student. Every frame goes through the pipeline in
+    one batch (analyze_many(imgs) -> results with the FaceMesh angle), the best frame per angle
+    is kept and all templates are written in a single update.
+    """
+    if analyze_many is None:
+        from utils.face_pipeline import analyze_faces  # loads the models into this process
+        analyze_many = lambda imgs: analyze_faces([(img, {"anti_spoof": False, "angle": True}) for img in imgs])
+    if not student_id or not frames:
+        return {"success": False, "error": "Missing student_id or frames"}
+
+    try:
+        analyses = analyze_many([img for img, _ in frames])
+    except AdmissionError:
+        raise
+    except Exception as e:
+        print("❌ Batch embedding extraction failed:", str(e))
+        return {"success": False, "error": "Embedding generation error"}
+
+    best, rejected = {}, []   # angle -> (quality, frame index, analysis)
+    for i, ((img, hint), analysis) in enumerate(zip(frames, analyses)):
+        error = analysis.get("error") or analysis.get("angle_error")
+        angle = hint or analysis.get("angle")
+        if not error and angle is None:
+            error = "No face detected"
+        if not error and analysis.get("embedding") is None:
+            error = "No face embedding extracted"
+        if error:
+            rejected.append({"frame": i, "error": error})
+            continue
+        quality = frame_quality(img, analysis)
+        if angle not in best or quality > best[angle][0]:
+            best[angle] = (quality, i, analysis)
+
+    if not best:
+        return {"success": False, "error": "No usable face in any frame", "rejected": rejected}
+
+    update_fields = {k: profile.get(k, "") for k in PROFILE_FIELDS}
+    for angle, (_, _, analysis) in best.items():
+        update_fields[f"{embedding_field(analysis.get('pack'))}.{angle}"] = analysis["embedding"].tolist()
+    student = get_student_by_id(student_id)
+    if not student or "created_at" not in student:
+        update_fields["created_at"] = datetime.utcnow()
+    if not save_face_data(student_id=student_id, update_fields=update_fields):
+        return {"success": False, "error": "Database update failed"}
+
+    print(f"✅ Batch registration for {student_id}: {len(frames)} frames → angles {sorted(best)}")
+    return {
+        "success": True,
+        "message": f"✅ Face registered: {len(best)} angle(s) from {len(frames)} frame(s)",
+        "angles": {angle: {"frame": i, "quality": q} for angle, (q, i, _) in best.items()},
+        "missing_angles": [a for a in REGISTRATION_ANGLES if a not in best],
+        "rejected": rejected,
+    }
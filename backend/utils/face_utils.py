@@ -5,18 +5,21 @@ from collections import defaultdict
 
 from utils.model_loader import get_face_model  # ✅ Use shared instance
 
-# ✅ Shared ArcFace + RetinaFace model
-face_model = get_face_model()
+# ✅ MediaPipe face detector (for optional fallback), created on first use
+_face_detection = None
 
-# ✅ MediaPipe face detector (for optional fallback)
-mp_face_detection = __import__('mediapipe').solutions.face_detection
-face_detection = mp_face_detection.FaceDetection(min_detection_confidence=0.7)
+def get_face_detection():
+    global _face_detection
+    if _face_detection is None:
+        mp_face_detection = __import__('mediapipe').solutions.face_detection
+        _face_detection = mp_face_detection.FaceDetection(min_detection_confidence=0.7)
+    return _face_detection
 
 # --- Crop using MediaPipe (not required if InsightFace handles it) ---
 def crop_face_from_image(image):
     """Crop face using Mediapipe Face Detection (fallback only)."""
     rgb_img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    result = face_detection.process(rgb_img)
+    result = get_face_detection().process(rgb_img)
 
     if not result.detections:
         return None
@@ -35,6 +38,7 @@ def crop_face_from_image(image):
 # --- ArcFace Embedding ---
 def get_face_embedding(image):
     """Extract embedding using InsightFace ArcFace model."""
+    face_model = get_face_model()  # ✅ Shared ArcFace + RetinaFace model
     if face_model is None:
         print("❌ Face model not loaded.")
         return None
@@ -0,0 +1,158 @@
+# utils/gallery_shard.py
+import io
+import threading
+import numpy as np
+
+# Wire format of /classes/<id>/gallery: an uncompressed .npz (no pickles) holding
+#   labels:    (N,)   student_id owning each template row
+#   keys:      (N,)   template name (angle / frame id) of each row
+#   templates: (N, D) L2-normalised float32 embeddings
+#   seq:       ()     gallery changelog cursor the snapshot is consistent with
+#   pack:      ()     model-pack namespace of the templates (see utils/model_packs.py)
+GALLERY_MIMETYPE = "application/x-gallery-npz"
+
+# /gallery/changes uses the same container:
+#   seq (M,) int64, op (M,) uint8, labels (M,), keys (M,), vectors (U, D) for the upserts in order,
+#   next_since () int64, has_more () bool
+OP_DELETE_TEMPLATE, OP_UPSERT, OP_DELETE_STUDENT = 0, 1, 2
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _npz_bytes(**arrays):
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+class GalleryShard:
+    """The templates one room needs: a normalised float32 matrix plus the student_id of each row."""
+
+    def __init__(self, labels, templates, keys=None, seq=0, pack=""):
+        labels = np.asarray(labels, dtype=str)
+        keys = np.asarray(keys if keys is not None else [""] * len(labels), dtype=str)
+        # Swapped as one tuple so a matcher never sees labels and rows from different versions
+        self._state = (labels, keys, np.asarray(templates, dtype=np.float32))
+        self.seq = int(seq)
+        self.pack = str(pack)
+        self._lock = threading.Lock()
+
+    @property
+    def labels(self):
+        return self._state[0]
+
+    @property
+    def keys(self):
+        return self._state[1]
+
+    @property
+    def templates(self):
+        return self._state[2]
+
+    @classmethod
+    def from_students(cls, students, seq=0, pack=""):
+        """Build from student documents carrying an `embeddings` {angle: vector} map (one pack's)."""
+        labels, keys, rows = [], [], []
+        for student in students:
+            sid = student.get("student_id")
+            for key, vector in (student.get("embeddings") or {}).items():
+                if sid and vector is not None and len(vector):
+                    labels.append(sid)
+                    keys.append(key)
+                    rows.append(np.asarray(vector, dtype=np.float32).ravel())
+        if not rows:
+            return cls([], np.zeros((0, 0), dtype=np.float32), seq=seq, pack=pack)
+        return cls(labels, normalize_rows(np.stack(rows)), keys, seq, pack)
+
+    def to_bytes(self):
+        labels, keys, templates = self._state
+        return _npz_bytes(labels=labels, keys=keys, templates=templates, seq=np.int64(self.seq),
+                          pack=np.asarray(self.pack))
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            keys = npz["keys"] if "keys" in npz.files else None
+            seq = int(npz["seq"]) if "seq" in npz.files else 0
+            pack = str(npz["pack"]) if "pack" in npz.files else ""
+            return cls(npz["labels"], npz["templates"], keys, seq, pack)
+
+    @property
+    def student_ids(self):
+        return set(self.labels.tolist())
+
+    def __len__(self):
+        """Number of distinct students (not templates)."""
+        return len(self.student_ids)
+
+    def match(self, embedding, threshold):
+        """Best (student_id, cosine distance) under threshold, or (None, None). One matrix-vector product."""
+        labels, _, templates = self._state
+        if embedding is None or not len(labels):
+            return None, None
+        live = np.asarray(embedding, dtype=np.float32).ravel()
+        n = np.linalg.norm(live)
+        if n == 0 or live.shape[0] != templates.shape[1]:
+            return None, None
+        distances = 1.0 - templates @ (live / n)
+        best = int(np.argmin(distances))
+        if distances[best] < threshold:
+            return str(labels[best]), float(distances[best])
+        return None, None
+
+    def apply_changes(self, changes):
+        """Apply a decoded changelog batch in seq order; entries at or below self.seq are skipped."""
+        with self._lock:
+            labels, keys, templates = self._state
+            vectors = changes["vectors"]
+            v = 0
+            for seq, op, sid, key in zip(changes["seq"], changes["op"], changes["labels"], changes["keys"]):
+                if op == OP_UPSERT:
+                    vector, v = vectors[v], v + 1
+                if seq <= self.seq:
+                    continue
+                drop = (labels == sid) if op == OP_DELETE_STUDENT else (labels == sid) & (keys == key)
+                if drop.any():
+                    labels, keys, templates = labels[~drop], keys[~drop], templates[~drop]
+                if op == OP_UPSERT:
+                    if templates.size == 0:
+                        templates = templates.reshape(0, vector.shape[0])
+                    labels = np.append(labels, sid)
+                    keys = np.append(keys, key)
+                    templates = np.vstack([templates, normalize_rows(vector[None, :])])
+            self._state = (labels, keys, templates)
+            self.seq = max(self.seq, int(changes["next_since"]))
+
+
+# -----------------------------
+# Changelog batches
+# -----------------------------
+def pack_changes(entries, next_since, has_more):
+    """Changelog entries (see models/gallery_changelog_model.py) -> bytes."""
+    ops, vectors = [], []
+    for e in entries:
+        if e["op"] == "upsert":
+            ops.append(OP_UPSERT)
+            vectors.append(np.asarray(e["vector"], dtype=np.float32))
+        else:
+            ops.append(OP_DELETE_STUDENT if e.get("template") is None else OP_DELETE_TEMPLATE)
+    dim = vectors[0].shape[0] if vectors else 0
+    return _npz_bytes(
+        seq=np.asarray([e["seq"] for e in entries], dtype=np.int64),
+        op=np.asarray(ops, dtype=np.uint8),
+        labels=np.asarray([e["student_id"] for e in entries], dtype=str),
+        keys=np.asarray([e.get("template") or "" for e in entries], dtype=str),
+        vectors=np.stack(vectors) if vectors else np.zeros((0, dim), dtype=np.float32),
+        next_since=np.int64(next_since),
+        has_more=np.bool_(has_more),
+    )
+
+
+def unpack_changes(data):
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
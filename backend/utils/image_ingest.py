@@ -0,0 +1,180 @@
+# utils/image_ingest.py
+"""
+Image ingest for the face endpoints. A frame can arrive as:
+
+    JSON        {"image": "data:image/jpeg;base64,..."}        (existing clients)
+    multipart   form field "image" (or "frames" for several) + the other fields as form fields
+    raw body    Content-Type: image/jpeg | image/png | image/webp | application/octet-stream,
+                other fields in the query string
+
+Binary bodies skip base64 entirely (about 25% fewer bytes than a data URL, no string
+handling) and are decoded straight from the request buffer. JPEGs much larger than the detector
+input are decoded with IMREAD_REDUCED_COLOR_{2,4,8}, which decodes fewer DCT coefficients
+instead of decoding at full size and resizing.
+
+Frames are mirrored (the browser sends the selfie view), as the data-URL path always did.
+"""
+import os
+import base64
+import tempfile
+import binascii
+import cv2
+import numpy as np
+
+# Smallest longer side worth keeping after a reduced decode (the detector runs at 640x640); 0 disables
+DECODE_TARGET = int(os.getenv("IMAGE_DECODE_TARGET", "640"))
+RAW_IMAGE_TYPES = ("image/jpeg", "image/jpg", "image/png", "image/webp", "application/octet-stream")
+_REDUCED = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+MAX_CLIP_READ = 600   # frames decoded from a clip before sampling
+# SOF markers that carry the frame size (not DHT C4, JPG C8, DAC CC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(buf):
+    """(width, height) from a JPEG's SOF header without decoding, or None if buf is not a JPEG."""
+    data = memoryview(buf)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:          # fill byte
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2                  # markers without a length
+            continue
+        length = (data[i + 2] << 8) | data[i + 3]
+        if marker in _SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        i += 2 + length
+    return None
+
+
+def _decode_flag(buf, target):
+    size = jpeg_size(buf) if target else None
+    if size:
+        longest = max(size)
+        for factor, flag in _REDUCED:
+            if longest // factor >= target:
+                return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_image_bytes(buf, mirror=True, target=DECODE_TARGET):
+    """Encoded image bytes -> BGR image (reduced-resolution decode for large JPEGs), or None."""
+    if not buf:
+        return None
+    try:
+        img = cv2.imdecode(np.frombuffer(buf, np.uint8), _decode_flag(buf, target))
+    except cv2.error:
+        return None
+    if img is not None and mirror:
+        img = cv2.flip(img, 1)
+    return img
+
+
+def decode_data_url(data_url, mirror=True, target=DECODE_TARGET):
+    """'data:image/...;base64,...' (or bare base64) -> BGR image, or None."""
+    if not data_url or not isinstance(data_url, str):
+        return None
+    payload = data_url.split(",", 1)[1] if "," in data_url else data_url
+    try:
+        return decode_image_bytes(base64.b64decode(payload), mirror, target)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def decode_clip(buf, max_frames, suffix=".mp4", mirror=True):
+    """Encoded video bytes -> up to max_frames evenly spaced BGR frames."""
+    if not buf or max_frames <= 0:
+        return []
+    try:
+        with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+            f.write(buf)
+            f.flush()
+            cap = cv2.VideoCapture(f.name)  # OpenCV's demuxers read files, not buffers
+            frames = []
+            while len(frames) < MAX_CLIP_READ:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                frames.append(frame)
+            cap.release()
+    except Exception as e:
+        print("❌ Clip decoding error:", e)
+        return []
+    if len(frames) > max_frames:
+        frames = [frames[int(i)] for i in np.linspace(0, len(frames) - 1, max_frames)]
+    return [cv2.flip(frame, 1) for frame in frames] if mirror else frames
+
+
+def decode_clip_data_url(data_url, max_frames, mirror=True):
+    """'data:video/...;base64,...' -> up to max_frames evenly spaced BGR frames."""
+    header, payload = data_url.split(",", 1) if "," in data_url else ("", data_url)
+    try:
+        buf = base64.b64decode(payload)
+    except (binascii.Error, ValueError):
+        return []
+    return decode_clip(buf, max_frames, ".webm" if "webm" in header else ".mp4", mirror)
+
+
+# -----------------------------
+# Flask requests
+# -----------------------------
+def is_binary_request(request):
+    return request.mimetype == "multipart/form-data" or request.mimetype in RAW_IMAGE_TYPES
+
+
+def request_fields(request):
+    """The non-image fields of a request: JSON body, multipart form, or the query string of a raw upload."""
+    if request.mimetype == "multipart/form-data":
+        return request.form.to_dict()
+    if request.mimetype in RAW_IMAGE_TYPES:
+        return request.args.to_dict()
+    return request.get_json(silent=True) or {}
+
+
+def request_images(request, field="image", mirror=True):
+    """
+    Every image in a request as [(img or None, error or None)]: multipart files under `field`,
+    the raw body, or the data URL(s) at `field` of a JSON body (a string or a list).
+    """
+    if request.mimetype == "multipart/form-data":
+        return [_decoded(decode_image_bytes(f.read(), mirror)) for f in request.files.getlist(field)]
+    if request.mimetype in RAW_IMAGE_TYPES:
+        return [_decoded(decode_image_bytes(request.get_data(cache=False), mirror))]
+    value = (request.get_json(silent=True) or {}).get(field)
+    if value is None:
+        return []
+    values = value if isinstance(value, list) else [value]
+    return [_decoded(decode_data_url(v, mirror)) if isinstance(v, str) else (None, "Invalid image format")
+            for v in values]
+
+
+def request_image(request, field="image", mirror=True):
+    """(img, None) or (None, error) for the single image of a request."""
+    images = request_images(request, field, mirror)
+    if not images:
+        return None, "Missing image"
+    return images[0]
+
+
+def request_clip(request, max_frames, field="clip", mirror=True):
+    """Frames of a clip sent as a multipart file or a JSON data URL at `field`."""
+    if request.mimetype == "multipart/form-data":
+        clip = request.files.get(field)
+        if clip is None:
+            return []
+        suffix = ".webm" if "webm" in (clip.mimetype or "") else ".mp4"
+        return decode_clip(clip.read(), max_frames, suffix, mirror)
+    value = (request.get_json(silent=True) or {}).get(field)
+    return decode_clip_data_url(value, max_frames, mirror) if isinstance(value, str) else []
+
+
+def _decoded(img):
+    return (img, None) if img is not None else (None, "Image decoding failed")
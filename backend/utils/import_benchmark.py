@@ -0,0 +1,109 @@
+# utils/import_benchmark.py
+"""
+Import-time benchmark: imports each target in a fresh interpreter and reports wall time,
+peak RSS, module count, which ML libraries came along and the slowest imports (-X importtime).
+
+    python -m utils.import_benchmark                          # API route modules
+    python -m utils.import_benchmark utils.face_pipeline --repeat 5 --top 10
+
+Exits 1 if any target imports an ML library (API workers must start without them).
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ML_MODULES = ("torch", "torchvision", "onnxruntime", "insightface", "mediapipe")
+DEFAULT_TARGETS = (
+    "routes.admin_routes",
+    "routes.student_routes",
+    "routes.instructor_routes",
+    "routes.auth_routes",
+    "routes.attendance_routes",
+    "routes.face_routes",
+)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import sys, time, json, resource, importlib
+t0 = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - t0
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "ml": sorted(m for m in %r if m in sys.modules),
+}))
+""" % (ML_MODULES,)
+
+
+def _slowest(importtime_log, top):
+    """Top-level packages by cumulative import time from -X importtime stderr."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split(":", 1)[1].split("|")
+        name = name[1:]  # one separator space; nested imports are indented further
+        if cumulative.strip().isdigit() and not name.startswith(" "):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def measure(target, repeat=3, top=5):
+    """Best-of-`repeat` cold import of one module; dict with seconds / rss_mb / modules / ml / slowest."""
+    runs, slowest = [], []
+    for i in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE, target],
+            cwd=BACKEND_DIR, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            last = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+            return {"target": target, "error": last}
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        if i == 0:
+            slowest = _slowest(proc.stderr, top)
+    best = min(runs, key=lambda r: r["seconds"])
+    return {
+        "target": target,
+        "seconds": best["seconds"],
+        "median_seconds": statistics.median(r["seconds"] for r in runs),
+        "rss_mb": best["rss_mb"],
+        "modules": best["modules"],
+        "ml": best["ml"],
+        "slowest": slowest,
+    }
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold import time / RSS / ML imports per module.")
+    parser.add_argument("targets", nargs="*", default=list(DEFAULT_TARGETS), help="modules to import")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per target (best is reported)")
+    parser.add_argument("--top", type=int, default=5, help="slowest top-level imports to list")
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'target':32} {'best s':>8} {'median s':>9} {'rss MB':>8} {'modules':>8}  ML imports")
+    for target in args.targets:
+        r = measure(target, args.repeat, args.top)
+        if "error" in r:
+            print(f"{target:32} ❌ {r['error']}")
+            failed = True
+            continue
+        ml = ", ".join(r["ml"]) or "none ✅"
+        print(f"{target:32} {r['seconds']:8.3f} {r['median_seconds']:9.3f} {r['rss_mb']:8.1f} {r['modules']:8d}  {ml}")
+        if r["slowest"]:
+            print("    slowest: " + ", ".join(f"{name} {us / 1000:.0f}ms" for us, name in r["slowest"]))
+        failed = failed or bool(r["ml"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# utils/inference_batcher.py
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class AdmissionError(Exception):
+    """Request refused before queuing; status is the HTTP code to return."""
+
+    status = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, int(round(retry_after)))
+
+
+class Overloaded(AdmissionError):
+    """Queue is full (429)."""
+    status = 429
+
+
+class Unavailable(AdmissionError):
+    """Queued work could not finish within the deadline, or the pipeline is down (503)."""
+    status = 503
+
+
+class MicroBatcher:
+    """
+    Collects concurrent submissions for up to window_ms (or until max_batch arrive) and runs
+    batch_fn(items) -> results on `concurrency` dispatcher threads (one per model worker when
+    batch_fn hands off to another process). Admission is decided at submit time from the queue
+    depth and the measured batch latency, so overload fails fast.
+    """
+
+    def __init__(self, name, batch_fn, max_batch=16, window_ms=10, max_queue=64, max_wait_ms=10000, concurrency=1):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self.max_queue = max_queue
+        self.max_wait = max_wait_ms / 1000.0
+        self.concurrency = max(1, int(concurrency))
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+        self._batch_seconds = None   # EWMA of batch_fn latency
+        self._stats = {"batches": 0, "items": 0, "rejected_429": 0, "rejected_503": 0, "errors": 0}
+
+    # -----------------------------
+    # Admission
+    # -----------------------------
+    def estimated_wait(self, depth=None):
+        """Seconds until a new submission would be answered: queued batches ahead + its own."""
+        depth = len(self._queue) if depth is None else depth
+        per_batch = self._batch_seconds or 0.0
+        return (depth // (self.max_batch * self.concurrency) + 1) * per_batch + self.window
+
+    def submit(self, item):
+        with self._cond:
+            if self._stopped:
+                self._stats["rejected_503"] += 1
+                raise Unavailable(f"{self.name} is shutting down")
+            depth = len(self._queue)
+            if depth >= self.max_queue:
+                self._stats["rejected_429"] += 1
+                raise Overloaded(f"{self.name} queue full ({depth})", retry_after=self.estimated_wait(depth))
+            wait = self.estimated_wait(depth)
+            if wait > self.max_wait:
+                self._stats["rejected_503"] += 1
+                raise Unavailable(f"{self.name} backlog too long (~{wait:.1f}s)", retry_after=wait)
+
+            future = Future()
+            self._queue.append((item, future))
+            self._ensure_thread()
+            self._cond.notify()
+            return future
+
+    # -----------------------------
+    # Dispatcher
+    # -----------------------------
+    def _ensure_thread(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.concurrency:
+            t = threading.Thread(target=self._run, daemon=True, name=f"batcher-{self.name}-{len(self._threads)}")
+            t.start()
+            self._threads.append(t)
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped and not self._queue:
+                    return None
+                # First item is in: give concurrent requests one window to join the batch
+                deadline = time.monotonic() + self.window
+                while len(self._queue) < self.max_batch and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                if batch:  # another dispatcher may have taken everything during the window
+                    return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            items = [item for item, _ in batch]
+            t0 = time.monotonic()
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                with self._cond:
+                    self._stats["errors"] += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.monotonic() - t0
+            with self._cond:
+                self._batch_seconds = elapsed if self._batch_seconds is None else 0.8 * self._batch_seconds + 0.2 * elapsed
+                self._stats["batches"] += 1
+                self._stats["items"] += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(5)
+
+    def stats(self):
+        with self._cond:
+            depth = len(self._queue)
+            s = dict(self._stats)
+        s.update({
+            "concurrency": self.concurrency,
+            "queue_depth": depth,
+            "avg_batch_size": round(s["items"] / s["batches"], 2) if s["batches"] else 0.0,
+            "batch_ms": round((self._batch_seconds or 0.0) * 1000, 1),
+            "estimated_wait_ms": round(self.estimated_wait(depth) * 1000, 1),
+        })
+        return s
@@ -0,0 +1,195 @@
+# utils/job_worker.py
+import os
+import socket
+import threading
+import shutil
+import traceback
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from models.job_model import (
+    claim_next_job, complete_job, fail_job, fail_abandoned_jobs, update_job_progress, FAILED,
+)
+from utils.cor_processing import CORParseError, StudentNotFound, parse_cor_file, assign_subjects_from_cor
+from utils.cor_bulk_import import ArchiveTooLarge, import_cor_source
+from models.face_db_model import compact_oversized_students
+from utils.attendance_session import refresh_session_state_from_db
+
+# -----------------------------
+# Config
+# -----------------------------
+WORKER_THREADS = int(os.getenv("JOB_WORKER_THREADS", "2"))           # jobs claimed concurrently
+PARSE_PROCESSES = int(os.getenv("JOB_PARSE_PROCESSES", "2"))         # CPU-bound PDF parsing
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+# Sessions past ends_at are closed here, not on every kiosk poll (reads already filter on ends_at)
+SESSION_EXPIRY_SECONDS = float(os.getenv("SESSION_EXPIRY_SECONDS", "30"))
+
+COR_UPLOAD = "cor_upload"
+COR_BULK_IMPORT = "cor_bulk_import"
+TEMPLATE_COMPACTION = "template_compaction"
+
+_pool = None
+_wakeup = threading.Event()
+_stop = threading.Event()
+_threads = []
+
+
+def _process_pool():
+    global _pool
+    if _pool is None:
+        # spawn: this runs inside the threaded API process, whose Mongo client must not be forked
+        _pool = ProcessPoolExecutor(max_workers=PARSE_PROCESSES, mp_context=mp.get_context("spawn"))
+    return _pool
+
+
+# -----------------------------
+# Handlers (job kind -> callable(job) -> result)
+# -----------------------------
+def _progress(job):
+    """progress(done, total) callback that renews this worker's lease on the job."""
+    job_id, worker_id = str(job["_id"]), job.get("worker_id")
+    return lambda done, total: update_job_progress(job_id, done, total, worker_id)
+
+
+def _run_cor_upload(job):
+    payload = job["payload"]
+    job_id = str(job["_id"])
+    progress = _progress(job)
+
+    progress(0, 0)
+    parsed = _process_pool().submit(parse_cor_file, payload["path"]).result()
+    print(f"✅ [job {job_id}] Parsed from COR: {parsed}")
+
+    assigned_subjects = assign_subjects_from_cor(payload["student_id"], parsed, progress=progress)
+    return {
+        "message": "COR uploaded successfully",
+        "file": payload.get("filename"),
+        "parsed": parsed,
+        "assigned_subjects": assigned_subjects,
+    }
+
+
+def _run_cor_bulk_import(job):
+    payload = job["payload"]
+    progress = _progress(job)
+    progress(0, 0)
+    # Uses its own pool sized to all cores; the shared parse pool stays free for single uploads.
+    # Progress after every parsed chunk keeps the lease alive on long imports.
+    return import_cor_source(
+        payload["source"],
+        processes=payload.get("processes"),
+        dry_run=payload.get("dry_run", False),
+        workdir=payload.get("workdir"),
+        progress=progress,
+    )
+
+
+def _run_template_compaction(job):
+    payload = job["payload"]
+    progress = _progress(job)
+    progress(0, 0)
+    return compact_oversized_students(
+        payload["cap"],
+        namespace=payload.get("pack"),
+        dry_run=payload.get("dry_run", False),
+        progress=progress,
+    )
+
+
+HANDLERS = {
+    COR_UPLOAD: _run_cor_upload,
+    COR_BULK_IMPORT: _run_cor_bulk_import,
+    TEMPLATE_COMPACTION: _run_template_compaction,
+}
+
+# Errors that will not go away on retry
+PERMANENT_ERRORS = (CORParseError, StudentNotFound, FileNotFoundError, ArchiveTooLarge)
+
+
+def _cleanup_job(job):
+    """Once a job is done or failed for good: remove uploaded files it no longer needs."""
+    workdir = job.get("payload", {}).get("workdir") if job.get("kind") == COR_BULK_IMPORT else None
+    if workdir:
+        # The upload batch holds student CORs (PII): never keep it past the job
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# -----------------------------
+# Worker loop
+# -----------------------------
+def run_one_job(worker_id):
+    """Claim and run a single job. Returns False when the queue is empty."""
+    for abandoned in fail_abandoned_jobs():
+        _cleanup_job(abandoned)
+    job = claim_next_job(worker_id, kinds=HANDLERS.keys())
+    if job is None:
+        return False
+
+    job_id = str(job["_id"])
+    try:
+        result = HANDLERS[job["kind"]](job)
+        if complete_job(job_id, result, worker_id):
+            _cleanup_job(job)
+        print(f"✅ [job {job_id}] {job['kind']} done")
+    except PERMANENT_ERRORS as e:
+        if fail_job(job_id, e, worker_id=worker_id) == FAILED:
+            _cleanup_job(job)
+        print(f"⚠️ [job {job_id}] {job['kind']} failed: {e}")
+    except Exception as e:
+        traceback.print_exc()
+        if fail_job(job_id, e, retry=True, worker_id=worker_id) == FAILED:
+            _cleanup_job(job)
+        print(f"⚠️ [job {job_id}] {job['kind']} error, will retry if attempts remain: {e}")
+    return True
+
+
+def _worker_loop(worker_id):
+    while not _stop.is_set():
+        try:
+            if run_one_job(worker_id):
+                continue
+        except Exception as e:
+            print(f"⚠️ Job worker {worker_id} loop error:", e)
+        _wakeup.wait(POLL_SECONDS)
+        _wakeup.clear()
+
+
+def _session_expiry_loop():
+    while not _stop.wait(SESSION_EXPIRY_SECONDS):
+        try:
+            refresh_session_state_from_db()
+        except Exception as e:
+            print("⚠️ Session expiry sweep failed:", e)
+
+
+def notify_workers():
+    """Wake idle in-process workers right after a job is enqueued."""
+    _wakeup.set()
+
+
+def start_job_workers(threads=WORKER_THREADS):
+    """Start background worker threads (idempotent). Jobs already in Mongo are picked up on start."""
+    if _threads:
+        return _threads
+    _stop.clear()
+    host = f"{socket.gethostname()}:{os.getpid()}"
+    for i in range(threads):
+        t = threading.Thread(target=_worker_loop, args=(f"{host}:{i}",), daemon=True, name=f"job-worker-{i}")
+        t.start()
+        _threads.append(t)
+    t = threading.Thread(target=_session_expiry_loop, daemon=True, name="session-expiry")
+    t.start()
+    _threads.append(t)
+    print(f"🧵 Started {threads} job worker(s), {PARSE_PROCESSES} parse process(es)")
+    return _threads
+
+
+def stop_job_workers(timeout=5):
+    global _pool
+    _stop.set()
+    _wakeup.set()
+    for t in _threads:
+        t.join(timeout)
+    _threads.clear()
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
@@ -0,0 +1,33 @@
+# utils/kiosk_auth.py
+"""
+Shared-token auth for kiosk-only endpoints (face templates never leave the API without it).
+
+    KIOSK_API_TOKEN=<long random string>    # same value on the API and on every kiosk
+
+Kiosks send it as the X-Kiosk-Token header. Without KIOSK_API_TOKEN configured the protected
+endpoints refuse every request rather than serve biometric data unauthenticated.
+"""
+import os
+import hmac
+from functools import wraps
+from flask import request, jsonify
+
+KIOSK_TOKEN = os.getenv("KIOSK_API_TOKEN", "")
+KIOSK_TOKEN_HEADER = "X-Kiosk-Token"
+
+
+def is_kiosk_request(req=None):
+    token = (req or request).headers.get(KIOSK_TOKEN_HEADER, "")
+    return bool(KIOSK_TOKEN) and hmac.compare_digest(token.encode(), KIOSK_TOKEN.encode())
+
+
+def kiosk_required(view):
+    """Reject the request unless it carries the kiosk token."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not KIOSK_TOKEN:
+            return jsonify({"error": "Kiosk access is not configured on this server"}), 503
+        if not is_kiosk_request():
+            return jsonify({"error": "Kiosk token required"}), 401
+        return view(*args, **kwargs)
+    return wrapper
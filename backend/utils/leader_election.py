@@ -0,0 +1,166 @@
+# utils/leader_election.py
+import os
+import time
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config.db_config import db
+
+locks_collection = db["locks"]
+
+LEASE_TTL = int(os.getenv("LEADER_LEASE_TTL", "30"))                # seconds a lease survives without heartbeat
+HEARTBEAT_SECONDS = int(os.getenv("LEADER_HEARTBEAT_SECONDS", "10"))
+
+
+class LeaderLease:
+    """
+    Mongo-backed leader lease: one lock document per name, owned by whoever last renewed it
+    before expires_at. A follower takes over once the holder stops heartbeating for LEASE_TTL.
+    on_elected / on_demoted run in the heartbeat thread when leadership changes.
+
+    The holder steps down on its own clock once ttl - heartbeat has passed since its last
+    successful renewal, and every renewal is bounded by renew_timeout, so an unreachable
+    Mongo never keeps it leading past the lease a follower may already be taking.
+    """
+
+    def __init__(self, name, on_elected=None, on_demoted=None, ttl=LEASE_TTL, heartbeat=HEARTBEAT_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.renew_timeout = max(1.0, heartbeat / 2)
+        self.is_leader = False
+        self._last_renewal = None     # time.monotonic() when the last successful renewal was sent
+        self._stop = threading.Event()
+        self._thread = None
+
+    def try_acquire(self):
+        """Take or renew the lease. Returns True while this process holds it."""
+        now = datetime.utcnow()
+        try:
+            doc = locks_collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder_id}, {"expires_at": {"$lt": now}}]},
+                {
+                    "$set": {
+                        "holder": self.holder_id,
+                        "host": socket.gethostname(),
+                        "pid": os.getpid(),
+                        "heartbeat_at": now,
+                        "expires_at": now + timedelta(seconds=self.ttl),
+                    },
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Someone else holds a live lease (the filter missed, the upsert hit their _id)
+            return False
+        if doc and doc.get("holder") == self.holder_id:
+            if not self.is_leader:
+                locks_collection.update_one(
+                    {"_id": self.name, "holder": self.holder_id}, {"$set": {"acquired_at": now}}
+                )
+            return True
+        return False
+
+    def release(self):
+        locks_collection.delete_one({"_id": self.name, "holder": self.holder_id})
+
+    def _set_leader(self, leader):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        callback = self.on_elected if leader else self.on_demoted
+        print(f"👑 {self.name}: {'elected' if leader else 'demoted'} ({self.holder_id})")
+        if callback:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ {self.name} leadership callback failed:", e)
+                if leader:
+                    # Holding the lease without doing the work would block every other host:
+                    # give it up; the next heartbeat (here or elsewhere) retries the election
+                    self._demote_after_failed_election()
+
+    def _demote_after_failed_election(self):
+        self.is_leader = False
+        self._last_renewal = None
+        try:
+            self.release()
+        except Exception as e:
+            print(f"⚠️ {self.name} lease release failed:", e)
+        if self.on_demoted:
+            try:
+                self.on_demoted()
+            except Exception as e:
+                print(f"⚠️ {self.name} leadership callback failed:", e)
+
+    def _leadership_deadline(self):
+        """Monotonic time after which this holder must not act as leader without a renewal."""
+        return self._last_renewal + self.ttl - self.heartbeat
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                with pymongo.timeout(self.renew_timeout):
+                    leader = self.try_acquire()
+                if leader:
+                    self._last_renewal = started
+            except Exception as e:
+                # Cannot reach Mongo: keep leading only while the lease we last wrote is safely live
+                print(f"⚠️ {self.name} lease heartbeat failed:", e)
+                leader = self.is_leader and time.monotonic() < self._leadership_deadline()
+            self._set_leader(leader)
+
+            wait = self.heartbeat
+            if self.is_leader:
+                # Retry (and step down if it fails) before the lease can lapse
+                wait = min(wait, max(0.0, self._leadership_deadline() - time.monotonic()))
+            self._stop.wait(wait)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"lease-{self.name}")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(self.heartbeat + 1)
+        self._set_leader(False)
+        try:
+            self.release()
+        except Exception:
+            pass
+
+    def status(self):
+        return {"name": self.name, "holder_id": self.holder_id, "is_leader": self.is_leader}
+
+
+def get_lease_status(name):
+    """Current lease document for name (holder, host, pid, heartbeat/expiry), as JSON-friendly dict."""
+    doc = locks_collection.find_one({"_id": name})
+    if not doc:
+        return None
+    now = datetime.utcnow()
+    return {
+        "name": doc["_id"],
+        "holder": doc.get("holder"),
+        "host": doc.get("host"),
+        "pid": doc.get("pid"),
+        "acquired_at": doc["acquired_at"].isoformat() if doc.get("acquired_at") else None,
+        "heartbeat_at": doc["heartbeat_at"].isoformat() if doc.get("heartbeat_at") else None,
+        "expires_at": doc["expires_at"].isoformat() if doc.get("expires_at") else None,
+        "live": bool(doc.get("expires_at") and doc["expires_at"] > now),
+    }
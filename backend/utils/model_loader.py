@@ -1,29 +1,35 @@
-from insightface.app import FaceAnalysis
-import onnxruntime as ort
+import threading
 
-print("🔄 Initializing InsightFace model...")
+# onnxruntime / InsightFace are imported on first use, not when utils is imported
+_face_model = None
+_loaded = False
+_lock = threading.Lock()
 
-# Get available ONNX providers
-available_providers = ort.get_available_providers()
-print("Available providers:", available_providers)
 
-# Prefer GPU if CUDA is available, fallback to CPU
-if "CUDAExecutionProvider" in available_providers:
-    providers = ["CUDAExecutionProvider", "CPUExecutionProvider"]
-    ctx_id = 0   # GPU
-else:
-    providers = ["CPUExecutionProvider"]
-    ctx_id = -1  # CPU
+def load_face_model():
+    """Prepare the active model pack (FACE_MODEL_PACK) on the shared ONNX sessions. Runs once per process."""
+    global _face_model, _loaded
+    with _lock:
+        if _loaded:
+            return _face_model
 
-try:
-    _face_model = FaceAnalysis(name="buffalo_l", providers=providers)
-    _face_model.prepare(ctx_id=ctx_id, det_size=(640, 640))
-    print(f"✅ InsightFace model loaded using providers: {providers}")
-except Exception as e:
-    print("❌ Failed to load InsightFace model:", e)
-    _face_model = None
+        print("🔄 Initializing InsightFace model...")
+        try:
+            from utils.onnx_sessions import get_face_analysis, settings
+            from utils.model_packs import get_pack
+
+            print("ONNX Runtime settings:", settings())
+            # Shared tuned sessions (utils/onnx_sessions.py): detector + recognizer only
+            pack = get_pack()
+            _face_model = get_face_analysis(pack["name"], det_size=(640, 640))
+            print(f"✅ InsightFace {pack['namespace']} loaded using providers: {_face_model.det_model.session.get_providers()}")
+        except Exception as e:
+            print("❌ Failed to load InsightFace model:", e)
+            _face_model = None
+        _loaded = True
+        return _face_model
 
 
 def get_face_model():
-    """Return the shared InsightFace model instance."""
-    return _face_model
+    """Return the shared InsightFace model instance (loaded on first call)."""
+    return _face_model if _loaded else load_face_model()
@@ -0,0 +1,61 @@
+# utils/model_packs.py
+"""
+Face model packs. Embeddings from different recognizers live in different spaces, so every
+template is stored under its pack's namespace ("<pack>_v<version>") and a live embedding is
+only ever matched against templates of the pack that produced it.
+
+    FACE_MODEL_PACK=buffalo_s python app.py     # API / model server
+    FACE_MODEL_PACK=antelopev2 python attendance_app.py
+
+Students registered under one pack must re-register (or be enrolled under both) before a
+kiosk or API on another pack recognizes them. buffalo_l v1 keeps the original `embeddings`
+field so existing galleries stay valid.
+"""
+import os
+
+# name -> pack description; bump "version" when a pack's weights change (old templates go stale)
+MODEL_PACKS = {
+    "buffalo_l": {"version": 1, "dim": 512, "detector": "SCRFD-10GF", "recognizer": "ResNet50 (WebFace600K)"},
+    "buffalo_s": {"version": 1, "dim": 512, "detector": "SCRFD-500MF", "recognizer": "MobileFaceNet (WebFace600K)"},
+    "antelopev2": {"version": 1, "dim": 512, "detector": "SCRFD-10GF", "recognizer": "ResNet100 (Glint360K)"},
+}
+DEFAULT_PACK = "buffalo_l"
+LEGACY_NAMESPACE = "buffalo_l_v1"   # stored in the plain `embeddings` field
+LEGACY_FIELD = "embeddings"
+
+ACTIVE_PACK = os.getenv("FACE_MODEL_PACK", DEFAULT_PACK)
+
+
+def get_pack(name=None):
+    """Pack dict (with "name" and "namespace") for name, or the active pack. ValueError if unknown."""
+    name = name or ACTIVE_PACK
+    if name not in MODEL_PACKS:
+        raise ValueError(f"Unknown face model pack '{name}' (known: {', '.join(MODEL_PACKS)})")
+    pack = dict(MODEL_PACKS[name], name=name)
+    pack["namespace"] = f"{name}_v{pack['version']}"
+    return pack
+
+
+def active_namespace():
+    return get_pack()["namespace"]
+
+
+def resolve_namespace(value=None):
+    """Pack name or namespace (e.g. "buffalo_s" / "buffalo_s_v1") -> namespace; None = active pack."""
+    if value in namespaces():
+        return value
+    return get_pack(value)["namespace"]
+
+
+def namespaces():
+    return [get_pack(name)["namespace"] for name in MODEL_PACKS]
+
+
+def embedding_field(namespace=None):
+    """Student document field holding one namespace's {template_key: vector} map."""
+    namespace = namespace or active_namespace()
+    return LEGACY_FIELD if namespace == LEGACY_NAMESPACE else f"{LEGACY_FIELD}_{namespace}"
+
+
+def embedding_fields():
+    return [embedding_field(ns) for ns in namespaces()]
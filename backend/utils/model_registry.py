@@ -0,0 +1,127 @@
+# utils/model_registry.py
+"""
+Model registry: every model the face pipeline needs, loaded and warmed concurrently.
+
+Each entry has a load step (import the library, build the model) and a warm step (one dummy
+inference, so lazy kernels / allocations happen now and not on the first login). Timings and
+failures are kept per model; ready() is True only once every model has warmed.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+PENDING, LOADING, WARMING, READY, FAILED = "pending", "loading", "warming", "ready", "failed"
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}   # name -> (load_fn, warm_fn)
+        self._status = {}   # name -> {"state", "load_ms", "warm_ms", "error"}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.warmup_ms = None
+
+    def register(self, name, load_fn, warm_fn=None):
+        """load_fn() -> model (None counts as a failed load); warm_fn(model) runs a dummy inference."""
+        self._models[name] = (load_fn, warm_fn)
+        self._status[name] = {"state": PENDING, "load_ms": None, "warm_ms": None, "error": None}
+
+    def _set(self, name, **fields):
+        with self._lock:
+            self._status[name].update(fields)
+
+    def _load_and_warm(self, name):
+        load_fn, warm_fn = self._models[name]
+        try:
+            self._set(name, state=LOADING, error=None)
+            t0 = time.perf_counter()
+            model = load_fn()
+            self._set(name, load_ms=round((time.perf_counter() - t0) * 1000, 1))
+            if model is None:
+                raise RuntimeError("model did not load")
+
+            self._set(name, state=WARMING)
+            t0 = time.perf_counter()
+            if warm_fn:
+                warm_fn(model)
+            self._set(name, state=READY, warm_ms=round((time.perf_counter() - t0) * 1000, 1))
+        except Exception as e:
+            print(f"❌ Model '{name}' failed to warm:", e)
+            self._set(name, state=FAILED, error=str(e))
+
+    def warmup_all(self):
+        """Load + warm every registered model in parallel; blocks until all finish. Returns ready()."""
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, len(self._models)), thread_name_prefix="warmup") as pool:
+            list(pool.map(self._load_and_warm, list(self._models)))
+        self.warmup_ms = round((time.perf_counter() - t0) * 1000, 1)
+        summary = ", ".join(f"{name} {s['state']}" for name, s in self.status()["models"].items())
+        print(f"🔥 Models warmed in {self.warmup_ms:.0f}ms ({summary})")
+        return self.ready()
+
+    def start_warmup(self):
+        """warmup_all() on a background thread (once)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.warmup_all, daemon=True, name="model-warmup")
+            self._thread.start()
+        return self._thread
+
+    def ready(self):
+        with self._lock:
+            return bool(self._status) and all(s["state"] == READY for s in self._status.values())
+
+    def status(self):
+        with self._lock:
+            models = {name: dict(s) for name, s in self._status.items()}
+        return {"ready": all(s["state"] == READY for s in models.values()) and bool(models),
+                "warmup_ms": self.warmup_ms, "models": models}
+
+
+# -----------------------------
+# Face pipeline models
+# -----------------------------
+_BLANK = np.zeros((640, 640, 3), dtype=np.uint8)
+
+
+def _load_insightface():
+    from utils.model_loader import load_face_model
+    return load_face_model()
+
+
+def _warm_insightface(model):
+    model.det_model.detect(_BLANK, max_num=0, metric="default")
+    recognizer = model.models["recognition"]
+    size = recognizer.input_size[0]
+    recognizer.get_feat([_BLANK[:size, :size]])
+
+
+def _load_anti_spoof():
+    from utils.anti_spoofing import get_anti_spoof_model
+    return get_anti_spoof_model()
+
+
+def _warm_anti_spoof(_):
+    from utils.anti_spoofing import check_real_or_spoof_batch
+    check_real_or_spoof_batch([_BLANK[:224, :224]])
+
+
+def _load_face_mesh():
+    from utils.face_pipeline import get_face_mesh
+    return get_face_mesh()
+
+
+def _load_face_detection():
+    from utils.face_utils import get_face_detection
+    return get_face_detection()
+
+
+def _warm_mediapipe(model):
+    model.process(_BLANK[:, :, ::-1].copy())
+
+
+face_models = ModelRegistry()
+face_models.register("insightface", _load_insightface, _warm_insightface)
+face_models.register("anti_spoof", _load_anti_spoof, _warm_anti_spoof)
+face_models.register("face_mesh", _load_face_mesh, _warm_mediapipe)
+face_models.register("face_detection", _load_face_detection, _warm_mediapipe)
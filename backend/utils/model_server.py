@@ -0,0 +1,547 @@
+# utils/model_server.py
+"""
+Face inference server. Detection, anti-spoof, embedding (and the registration FaceMesh angle)
+run in a pool of model worker processes behind a local Unix socket, so API processes never
+import InsightFace / MediaPipe / torch and inference scales across cores without the GIL.
+
+    python -m utils.model_server                          # MODEL_WORKERS workers on MODEL_SERVER_SOCKET
+    python -m utils.model_server --workers 4 --socket /run/face_model_server.sock
+    python -m utils.model_server --stats                  # queue / batch / worker stats of a running server
+
+Pixels never go through the socket: the API process copies the decoded image into POSIX shared
+memory and sends its name, shape and options; the worker maps the same pages. Only results
+(bbox, scores, 512-d embedding) come back. Matching stays in the API process, which already
+caches the gallery per students version.
+
+FACE_INFERENCE_MODE=inline runs the pipeline inside the API process instead (single-process dev).
+"""
+import os
+import sys
+import time
+import queue
+import fcntl
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import TimeoutError
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from utils.inference_batcher import MicroBatcher, AdmissionError, Overloaded, Unavailable
+from utils.model_packs import active_namespace
+
+# -----------------------------
+# Config
+# -----------------------------
+INFERENCE_MODE = os.getenv("FACE_INFERENCE_MODE", "server")   # "server" | "inline"
+SOCKET_PATH = os.getenv("MODEL_SERVER_SOCKET", os.path.join(tempfile.gettempdir(), "face_model_server.sock"))
+AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", os.getenv("SECRET_KEY", "fallback-secret")).encode()
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+AUTOSTART = os.getenv("MODEL_SERVER_AUTOSTART", "1") != "0"   # API process launches the server if none answers
+
+BATCH_WINDOW_MS = float(os.getenv("FACE_BATCH_WINDOW_MS", "10"))    # how long the first request waits for company
+BATCH_MAX = int(os.getenv("FACE_BATCH_MAX", "16"))
+QUEUE_MAX = int(os.getenv("FACE_QUEUE_MAX", "64"))                  # beyond this → 429
+QUEUE_MAX_WAIT_MS = int(os.getenv("FACE_QUEUE_MAX_WAIT_MS", "8000"))  # estimated wait beyond this → 503
+
+WORKER_START_TIMEOUT = 300    # seconds for a worker to import and load its models
+UNAVAILABLE_RETRY_AFTER = 5
+AUTOSTART_INTERVAL = 30       # don't relaunch more often than this
+
+
+# -----------------------------
+# Shared-memory image buffers
+# -----------------------------
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    # Python < 3.13 registers attached segments with the resource tracker, which would unlink
+    # them when this process exits; the API process that created the segment owns it
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def _close(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # a view is still alive; the mapping goes away with it
+
+
+def _gather(futures, timeout=None):
+    """Results of futures submitted together, under one overall deadline."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    return [f.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic())) for f in futures]
+
+
+# -----------------------------
+# Worker process
+# -----------------------------
+def _worker_main(conn, index):
+    """Loads the models once, then answers [(shm_name, shape, dtype, options)] batches over conn."""
+    import warnings
+    warnings.filterwarnings("ignore", message="`rcond` parameter will change", category=FutureWarning)
+    from utils.face_pipeline import analyze_faces
+    from utils.model_registry import face_models
+
+    face_models.warmup_all()  # every model loaded and exercised before this worker takes work
+    conn.send(("ready", os.getpid(), face_models.status()))
+    print(f"🧠 Model worker {index} ready (pid {os.getpid()})")
+    while True:
+        try:
+            specs = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if specs is None:
+            return
+
+        results = [None] * len(specs)
+        handles, items = [], []
+        for k, (name, shape, dtype, options) in enumerate(specs):
+            try:
+                shm = _attach(name)
+            except FileNotFoundError:
+                results[k] = {"error": "Image buffer expired"}  # the caller already gave up
+                continue
+            handles.append(shm)
+            items.append((k, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf), options))
+        try:
+            analyzed = analyze_faces([(img, options) for _, img, options in items])
+            for (k, _, _), result in zip(items, analyzed):
+                results[k] = result
+        except Exception as e:
+            print(f"❌ Model worker {index} error:", e)
+            for k, _, _ in items:
+                results[k] = {"error": "Face pipeline error"}
+        finally:
+            del items  # drop the views before unmapping
+            for shm in handles:
+                _close(shm)
+        conn.send(results)
+
+
+class _ModelWorker:
+    """One worker process and the pipe to it; restarted on the next batch if it dies."""
+
+    def __init__(self, index, ctx):
+        self.index = index
+        self.ctx = ctx
+        self.process = None
+        self.conn = None
+        self.pid = None
+        self.models = None   # the worker's model registry status at startup
+        self.restarts = -1
+        self.batches = 0
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        parent, child = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=_worker_main, args=(child, self.index), daemon=True, name=f"model-worker-{self.index}"
+        )
+        self.process.start()
+        child.close()
+        self.conn = parent
+        self.restarts += 1
+        if not parent.poll(WORKER_START_TIMEOUT):
+            self.stop()
+            raise RuntimeError(f"model worker {self.index} did not become ready")
+        _, self.pid, self.models = parent.recv()
+
+    def stop(self):
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except Exception:
+                pass
+            self.conn.close()
+        if self.process is not None:
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.process, self.conn = None, None
+
+    def run(self, specs):
+        if not self.alive():
+            try:
+                self.start()
+            except Exception as e:
+                print(f"❌ Model worker {self.index} failed to start:", e)
+                raise Unavailable(f"model worker {self.index} unavailable", retry_after=UNAVAILABLE_RETRY_AFTER) from e
+        self.conn.send(specs)
+        while not self.conn.poll(1.0):
+            if not self.process.is_alive():
+                self.stop()
+                raise Unavailable(f"model worker {self.index} exited", retry_after=UNAVAILABLE_RETRY_AFTER)
+        self.batches += 1
+        return self.conn.recv()
+
+
+class ModelWorkerPool:
+    """N worker processes; each batch goes to whichever worker is idle."""
+
+    def __init__(self, size=MODEL_WORKERS):
+        # spawn: workers must not inherit the server's sockets, threads or Mongo client
+        ctx = mp.get_context("spawn")
+        self.workers = [_ModelWorker(i, ctx) for i in range(max(1, size))]
+        self._idle = queue.Queue()
+        for w in self.workers:
+            self._idle.put(w)
+
+    def start(self):
+        """Load every worker's models in parallel; returns when all are ready."""
+        threads = [threading.Thread(target=self._start_one, args=(w,), daemon=True) for w in self.workers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(1 for w in self.workers if w.alive())
+
+    @staticmethod
+    def _start_one(worker):
+        try:
+            worker.start()
+        except Exception as e:
+            print(f"❌ Model worker {worker.index} failed to start:", e)  # retried on its first batch
+
+    def analyze(self, specs):
+        worker = self._idle.get()
+        try:
+            return worker.run(specs)
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        for w in self.workers:
+            w.stop()
+
+    def stats(self):
+        return [
+            {"index": w.index, "pid": w.pid, "alive": w.alive(), "batches": w.batches,
+             "restarts": max(0, w.restarts), "models": w.models}
+            for w in self.workers
+        ]
+
+
+# -----------------------------
+# Server
+# -----------------------------
+class ModelServer:
+    """Unix-socket front end: one thread per API connection, one shared batcher over the pool."""
+
+    def __init__(self, socket_path=SOCKET_PATH, workers=MODEL_WORKERS):
+        self.socket_path = socket_path
+        # Workers size their ONNX Runtime thread pools to their share of the CPU quota
+        os.environ["MODEL_WORKERS"] = str(max(1, workers))
+        self.pool = ModelWorkerPool(workers)
+        self.batcher = MicroBatcher(
+            "face", self.pool.analyze,
+            max_batch=BATCH_MAX, window_ms=BATCH_WINDOW_MS, max_queue=QUEUE_MAX, max_wait_ms=QUEUE_MAX_WAIT_MS,
+            concurrency=len(self.pool.workers),
+        )
+        self._lock_file = None
+
+    def _acquire_lock(self):
+        """One server per socket path; a second launch (another API worker's autostart) just exits."""
+        self._lock_file = open(self.socket_path + ".lock", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            return False
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # stale socket from a crashed server
+        return True
+
+    def serve_forever(self):
+        if not self._acquire_lock():
+            print(f"ℹ️ Model server already running on {self.socket_path}")
+            return False
+        print(f"🔄 Starting {len(self.pool.workers)} model workers...")
+        ready = self.pool.start()
+        listener = Listener(self.socket_path, family="AF_UNIX", authkey=AUTHKEY)
+        print(f"✅ Model server listening on {self.socket_path} ({ready} workers ready)")
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:  # failed handshake (wrong authkey, client vanished)
+                    print("⚠️ Model server rejected a connection:", e)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            self.batcher.shutdown()
+            self.pool.shutdown()
+        return True
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if op == "analyze":
+                    spec, timeout = payload
+                    try:
+                        conn.send(("ok", self.batcher.submit(spec).result(timeout=timeout)))
+                    except AdmissionError as e:
+                        conn.send(("rejected", (e.status, str(e), e.retry_after)))
+                    except TimeoutError:
+                        conn.send(("timeout", None))
+                    except Exception as e:
+                        conn.send(("error", str(e)))
+                elif op == "analyze_many":
+                    # Submitted back to back so they land in the same batch(es)
+                    specs, timeout = payload
+                    try:
+                        conn.send(("ok", _gather([self.batcher.submit(spec) for spec in specs], timeout)))
+                    except AdmissionError as e:
+                        conn.send(("rejected", (e.status, str(e), e.retry_after)))
+                    except TimeoutError:
+                        conn.send(("timeout", None))
+                    except Exception as e:
+                        conn.send(("error", str(e)))
+                elif op == "stats":
+                    conn.send(("ok", self.stats()))
+                else:
+                    conn.send(("error", f"unknown op {op!r}"))
+
+    def stats(self):
+        return {**self.batcher.stats(), "mode": "server", "pack": active_namespace(), "workers": self.pool.stats()}
+
+
+# -----------------------------
+# Client (API processes)
+# -----------------------------
+class ModelClient:
+    """One persistent connection per API thread; requests on a connection are sequential."""
+
+    def __init__(self, socket_path=SOCKET_PATH, autostart=AUTOSTART):
+        self.socket_path = socket_path
+        self.autostart = autostart
+        self._local = threading.local()
+        self._last_autostart = 0.0
+        self._server_proc = None            # Popen of the server we launched, polled so it is reaped
+        self._autostart_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = Client(self.socket_path, family="AF_UNIX", authkey=AUTHKEY)
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                self._maybe_autostart()
+                raise Unavailable("Face inference server unavailable", retry_after=UNAVAILABLE_RETRY_AFTER) from e
+            self._local.conn = conn
+            self._reap()
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def _reap(self):
+        """poll() the launched server: collects its exit status; True while it is still running."""
+        with self._autostart_lock:
+            if self._server_proc is not None and self._server_proc.poll() is not None:
+                self._server_proc = None
+            return self._server_proc is not None
+
+    def _maybe_autostart(self):
+        if not self.autostart or self._reap():
+            return   # the one we launched is still starting up
+        with self._autostart_lock:
+            if time.monotonic() - self._last_autostart > AUTOSTART_INTERVAL:
+                self._last_autostart = time.monotonic()
+                self._server_proc = start_model_server(self.socket_path)
+
+    def call(self, op, payload=None, timeout=None):
+        conn = self._connection()
+        try:
+            conn.send((op, payload))
+            # A late reply would desynchronise the connection, so a timeout drops it
+            if not conn.poll(timeout):
+                self._drop()
+                raise TimeoutError()
+            status, value = conn.recv()
+        except (EOFError, OSError) as e:
+            self._drop()
+            raise Unavailable("Face inference server connection lost", retry_after=UNAVAILABLE_RETRY_AFTER) from e
+        if status == "ok":
+            return value
+        if status == "rejected":
+            code, message, retry_after = value
+            raise (Overloaded if code == 429 else Unavailable)(message, retry_after=retry_after)
+        if status == "timeout":
+            raise TimeoutError()
+        raise RuntimeError(value)
+
+    def analyze(self, img, options, timeout=None):
+        img = np.ascontiguousarray(img)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, img.nbytes))
+        try:
+            view = np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)
+            view[...] = img
+            del view
+            return self.call("analyze", ((shm.name, img.shape, img.dtype.str, options), timeout), timeout=timeout)
+        finally:
+            _close(shm)
+            shm.unlink()
+
+    def analyze_many(self, imgs, options, timeout=None):
+        """Several images in one round trip (one shared-memory segment each)."""
+        segments, specs = [], []
+        try:
+            for img in imgs:
+                img = np.ascontiguousarray(img)
+                shm = shared_memory.SharedMemory(create=True, size=max(1, img.nbytes))
+                segments.append(shm)
+                view = np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)
+                view[...] = img
+                del view
+                specs.append((shm.name, img.shape, img.dtype.str, options))
+            return self.call("analyze_many", (specs, timeout), timeout=timeout)
+        finally:
+            for shm in segments:
+                _close(shm)
+                shm.unlink()
+
+    def ping(self, timeout=2):
+        try:
+            self.call("stats", timeout=timeout)
+            return True
+        except Exception:
+            self._drop()
+            return False
+
+
+def start_model_server(socket_path=SOCKET_PATH):
+    """Launch `python -m utils.model_server` detached (exits at once if one already holds the socket).
+    Returns the Popen handle: poll() it so the child is reaped when it exits."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"🚀 Launching model server on {socket_path}")
+    return subprocess.Popen(
+        [sys.executable, "-m", "utils.model_server", "--socket", socket_path],
+        cwd=backend_dir, start_new_session=True,
+    )
+
+
+# -----------------------------
+# API-side entry points
+# -----------------------------
+_client = ModelClient()
+_inline_batcher = None
+_inline_lock = threading.Lock()
+
+
+def _inline():
+    """FACE_INFERENCE_MODE=inline: the old in-process batcher (loads the models here)."""
+    global _inline_batcher
+    with _inline_lock:
+        if _inline_batcher is None:
+            from utils.face_pipeline import analyze_faces
+            _inline_batcher = MicroBatcher(
+                "face", analyze_faces,
+                max_batch=BATCH_MAX, window_ms=BATCH_WINDOW_MS, max_queue=QUEUE_MAX, max_wait_ms=QUEUE_MAX_WAIT_MS,
+            )
+        return _inline_batcher
+
+
+def analyze_face_batched(img, anti_spoof=True, angle=False, timeout=None):
+    """
+    One image through the shared batcher (model server, or in-process when inline).
+    Raises AdmissionError subclasses when overloaded or unavailable, TimeoutError past timeout.
+    """
+    options = {"anti_spoof": anti_spoof, "angle": angle}
+    if INFERENCE_MODE == "inline":
+        return _inline().submit((img, options)).result(timeout=timeout)
+    return _client.analyze(img, options, timeout=timeout)
+
+
+def analyze_faces_batched(imgs, anti_spoof=True, angle=False, timeout=None):
+    """
+    Several images of one request (e.g. a registration burst), submitted together so they share
+    a batch instead of queuing one by one. Same errors as analyze_face_batched().
+    """
+    options = {"anti_spoof": anti_spoof, "angle": angle}
+    if not imgs:
+        return []
+    if INFERENCE_MODE == "inline":
+        return _gather([_inline().submit((img, options)) for img in imgs], timeout)
+    return _client.analyze_many(imgs, options, timeout=timeout)
+
+
+def inference_stats():
+    if INFERENCE_MODE == "inline":
+        return {**_inline().stats(), "mode": "inline", "pack": active_namespace()}
+    try:
+        return _client.call("stats", timeout=5)
+    except (AdmissionError, TimeoutError) as e:
+        return {"mode": "server", "available": False, "error": str(e) or "timeout"}
+
+
+def ensure_model_server():
+    """
+    Called at API startup. Inline: warm the in-process models in the background.
+    Server: True if a server answers (otherwise one is launched when AUTOSTART).
+    """
+    if INFERENCE_MODE == "inline":
+        from utils.model_registry import face_models
+        face_models.start_warmup()
+        return False
+    return _client.ping()
+
+
+def readiness():
+    """(ready, detail) for /readyz: models warm in this process (inline) or in a live server worker."""
+    if INFERENCE_MODE == "inline":
+        from utils.model_registry import face_models
+        status = face_models.status()
+        return status["ready"], {"mode": "inline", **status}
+    try:
+        stats = _client.call("stats", timeout=2)
+    except (AdmissionError, TimeoutError) as e:
+        return False, {"mode": "server", "error": str(e) or "timeout"}
+    warm = [w for w in stats["workers"] if w["alive"] and (w["models"] or {}).get("ready")]
+    return bool(warm), {"mode": "server", "warm_workers": len(warm), "workers": stats["workers"]}
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Face inference server (model worker pool).")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path")
+    parser.add_argument("--workers", type=int, default=MODEL_WORKERS, help="model worker processes")
+    parser.add_argument("--stats", action="store_true", help="print a running server's stats and exit")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        client = ModelClient(args.socket, autostart=False)
+        try:
+            stats = client.call("stats", timeout=5)
+        except (AdmissionError, TimeoutError):
+            print(f"❌ No model server on {args.socket}")
+            return 1
+        for key, value in stats.items():
+            print(f"  {key}: {value}")
+        return 0
+
+    ModelServer(args.socket, args.workers).serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,16 +11,13 @@ from scipy.spatial.distance import cosine
 MATCH_THRESHOLD = 0.40
 ATTENDANCE_DELAY = 5  # seconds before same face can be logged again
 
-# Load InsightFace model
-face_model = get_face_model()
-
 # Load all registered face embeddings
 def load_embeddings():
     print("\U0001F4C2 Loading registered face embeddings...")
     all_faces = load_registered_faces()
     embeddings = []
     for face in all_faces:
-        student_id = face.get("student_id") or face.get("Student_ID")
+        student_id = face.get("student_id")
         full_name = f"{face.get('first_name', '')} {face.get('last_name', '')}".strip()
         for angle, vector in face.get("embeddings", {}).items():
             embeddings.append({
@@ -47,6 +44,7 @@ def match_face(live_embedding, registered_embeddings, threshold=MATCH_THRESHOLD)
 # Main attendance loop
 def start_attendance_session(subject="Default Subject", subject_id=None, subject_start_time=None):
     embeddings = load_embeddings()
+    face_model = get_face_model()  # loads InsightFace on first use
     seen = {}  # student_id: timestamp
 
     cap = cv2.VideoCapture(0)
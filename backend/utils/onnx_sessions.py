@@ -0,0 +1,353 @@
+# utils/onnx_sessions.py
+"""
+Shared ONNX Runtime sessions: each model file is built once per process with tuned
+SessionOptions, and InsightFace packs are assembled from those sessions. (FaceAnalysis gives
+no access to SessionOptions and builds fresh sessions every time it is constructed.)
+
+    python -m utils.onnx_sessions                  # show settings, build buffalo_l (fills the graph cache)
+    python -m utils.onnx_sessions --pack antelopev2
+    python -m utils.onnx_sessions --precision int8
+
+Settings (env):
+    ORT_INTRA_OP_THREADS   threads inside one op; default = container CPU quota // MODEL_WORKERS
+    ORT_INTER_OP_THREADS   threads across independent ops (parallel mode only); default 1
+    ORT_EXECUTION_MODE     sequential | parallel
+    ORT_GRAPH_OPT          disable | basic | extended | all
+    ORT_CPU_MEM_ARENA      1 | 0
+    ORT_USE_CUDA           1 | 0 (CUDA is used when onnxruntime-gpu sees a device)
+    ORT_CACHE_DIR          optimized graphs, keyed by model + ORT version + settings; empty disables
+    FACE_MODEL_PRECISION   fp32 | int8 (int8 packs are built by utils/quantize_models.py; fp32 if absent)
+"""
+import os
+import sys
+import json
+import math
+import time
+import glob
+import hashlib
+import argparse
+import platform
+import threading
+
+INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))     # 0 = derive from the CPU quota
+INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+EXECUTION_MODE = os.getenv("ORT_EXECUTION_MODE", "sequential")
+GRAPH_OPT = os.getenv("ORT_GRAPH_OPT", "all")
+CPU_MEM_ARENA = os.getenv("ORT_CPU_MEM_ARENA", "1") != "0"
+USE_CUDA = os.getenv("ORT_USE_CUDA", "1") != "0"
+CACHE_DIR = os.path.expanduser(os.getenv("ORT_CACHE_DIR", "~/.cache/face_ort"))
+INSIGHTFACE_ROOT = os.getenv("INSIGHTFACE_ROOT", "~/.insightface")
+PRECISION = os.getenv("FACE_MODEL_PRECISION", "fp32")
+QUANTIZED_SUFFIX = "_int8"
+QUANTIZATION_MANIFEST = "quantization.json"
+
+_sessions = {}        # (model path, providers) -> InferenceSession
+_face_analyses = {}   # (pack, det_size, allowed_modules) -> prepared FaceAnalysis
+_lock = threading.RLock()
+
+
+# -----------------------------
+# Settings
+# -----------------------------
+def cpu_quota():
+    """CPUs this process may use: the cgroup (v2 or v1) quota, capped by the affinity mask."""
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    return max(1, min(available, math.ceil(quota))) if quota else available
+
+
+def intra_op_threads():
+    """Explicit setting, else this process's share of the quota (the model server runs MODEL_WORKERS of us)."""
+    if INTRA_OP_THREADS > 0:
+        return INTRA_OP_THREADS
+    return max(1, cpu_quota() // max(1, int(os.getenv("MODEL_WORKERS", "1"))))
+
+
+def default_providers():
+    """(providers, ctx_id): CUDA first when onnxruntime-gpu has a device, else CPU."""
+    import onnxruntime as ort
+    if USE_CUDA and "CUDAExecutionProvider" in ort.get_available_providers():
+        return ("CUDAExecutionProvider", "CPUExecutionProvider"), 0
+    return ("CPUExecutionProvider",), -1
+
+
+def session_options(optimize=True):
+    import onnxruntime as ort
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    so = ort.SessionOptions()
+    so.intra_op_num_threads = intra_op_threads()
+    so.inter_op_num_threads = INTER_OP_THREADS
+    so.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL if EXECUTION_MODE == "parallel" else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    so.graph_optimization_level = levels.get(GRAPH_OPT, levels["all"]) if optimize else levels["disable"]
+    so.enable_cpu_mem_arena = CPU_MEM_ARENA
+    # Several model workers share the quota: idle threads must sleep, not spin
+    if int(os.getenv("MODEL_WORKERS", "1")) > 1:
+        so.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    so.log_severity_level = 3
+    return so
+
+
+def settings():
+    import onnxruntime as ort
+    providers, _ = default_providers()
+    return {
+        "onnxruntime": ort.__version__,
+        "providers": list(providers),
+        "cpu_quota": cpu_quota(),
+        "intra_op_threads": intra_op_threads(),
+        "inter_op_threads": INTER_OP_THREADS,
+        "execution_mode": EXECUTION_MODE,
+        "graph_optimization": GRAPH_OPT,
+        "cpu_mem_arena": CPU_MEM_ARENA,
+        "cache_dir": CACHE_DIR or None,
+        "cpu_signature": cpu_signature(),
+        "precision": PRECISION,
+    }
+
+
+# -----------------------------
+# Sessions
+# -----------------------------
+_cpu_signature = None
+
+
+def cpu_signature():
+    """
+    Instruction-set fingerprint of this CPU. ORT_ENABLE_ALL bakes ISA-specific layouts into the
+    saved graph, and platform.processor() is empty on most Linux hosts, so key on the CPU flags.
+    """
+    global _cpu_signature
+    if _cpu_signature is None:
+        flags = ""
+        try:
+            with open("/proc/cpuinfo") as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    if name.strip() in ("flags", "Features"):   # x86 / ARM
+                        flags = " ".join(sorted(value.split()))
+                        break
+        except OSError:
+            pass
+        raw = "|".join([platform.machine(), platform.processor(), flags])
+        _cpu_signature = hashlib.sha1(raw.encode()).hexdigest()[:12]
+    return _cpu_signature
+
+
+def _cache_path(model_path, providers):
+    """Optimized graphs depend on the model bytes, ORT build, providers, level and CPU instruction set."""
+    if not CACHE_DIR or GRAPH_OPT == "disable":
+        return None
+    import onnxruntime as ort
+    st = os.stat(model_path)
+    key = "|".join([
+        os.path.abspath(model_path), str(st.st_size), str(int(st.st_mtime)),
+        ort.__version__, ",".join(providers), GRAPH_OPT, cpu_signature(),
+    ])
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(CACHE_DIR, f"{name}.{digest}.onnx")
+
+
+def _build_session(model_path, providers):
+    import onnxruntime as ort
+    t0 = time.perf_counter()
+    cached = _cache_path(model_path, providers)
+    if cached and os.path.exists(cached):
+        try:
+            # Already optimized at the configured level; don't redo it
+            session = ort.InferenceSession(cached, sess_options=session_options(optimize=False), providers=list(providers))
+            print(f"⚙️ ONNX {os.path.basename(model_path)}: cached graph in {(time.perf_counter() - t0) * 1000:.0f}ms")
+            return session
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable graph cache {cached}:", e)
+
+    so = session_options()
+    tmp = None
+    if cached:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{cached}.{os.getpid()}.tmp"
+        so.optimized_model_filepath = tmp
+    session = ort.InferenceSession(model_path, sess_options=so, providers=list(providers))
+    if tmp and os.path.exists(tmp):
+        os.replace(tmp, cached)  # atomic: concurrent workers never read a half-written graph
+    print(f"⚙️ ONNX {os.path.basename(model_path)}: built in {(time.perf_counter() - t0) * 1000:.0f}ms "
+          f"(intra={so.intra_op_num_threads}, providers={session.get_providers()})")
+    return session
+
+
+def get_session(model_path, providers=None):
+    """The process-wide session for one .onnx file (built on first use)."""
+    providers = tuple(providers or default_providers()[0])
+    key = (os.path.abspath(model_path), providers)
+    with _lock:
+        if key not in _sessions:
+            _sessions[key] = _build_session(model_path, providers)
+        return _sessions[key]
+
+
+def session_count():
+    return len(_sessions)
+
+
+# -----------------------------
+# InsightFace packs
+# -----------------------------
+# The pipeline only reads bboxes, keypoints and embeddings; landmark / genderage heads are skipped
+FACE_MODULES = ("detection", "recognition")
+
+
+def _model_kind(onnx_file):
+    """Which insightface class a file needs (same rules as model_zoo.ModelRouter), read from the
+    graph so models that are not wanted never get a session."""
+    import onnx
+    graph = onnx.load(onnx_file).graph
+    weights = {init.name for init in graph.initializer}
+    inputs = [i for i in graph.input if i.name not in weights]
+    shape = [d.dim_value or None for d in inputs[0].type.tensor_type.shape.dim]
+    if len(graph.output) >= 5:
+        return "detection"
+    if shape[2:] == [192, 192]:
+        return "landmark"
+    if shape[2:] == [96, 96]:
+        return "genderage"
+    if len(inputs) == 2:
+        return None  # face swapper; not used here
+    if shape[2] and shape[2] == shape[3] and shape[2] >= 112 and shape[2] % 16 == 0:
+        return "recognition"
+    return None
+
+
+def quantized_pack_dir(name):
+    return os.path.join(os.path.expanduser(INSIGHTFACE_ROOT), "models", name + QUANTIZED_SUFFIX)
+
+
+def pack_dir(name, precision=None):
+    """Directory holding a pack's .onnx files; int8 falls back to fp32 if the pack was never quantized."""
+    from insightface.utils import ensure_available
+    if (precision or PRECISION) == "int8":
+        path = quantized_pack_dir(name)
+        if glob.glob(os.path.join(path, "*.onnx")):
+            return path
+        print(f"⚠️ No int8 build of {name} in {path} (python -m utils.quantize_models --pack {name}); using fp32")
+    return ensure_available("models", name, root=INSIGHTFACE_ROOT)
+
+
+def read_quantization_manifest(model_dir):
+    try:
+        with open(os.path.join(model_dir, QUANTIZATION_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _wanted(kind, allowed_modules):
+    if allowed_modules is None:
+        return True
+    if kind == "landmark":
+        return any(m.startswith("landmark") for m in allowed_modules)
+    return kind in allowed_modules
+
+
+def _insightface_model(onnx_file, session, kind):
+    from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+    from insightface.model_zoo.retinaface import RetinaFace
+    from insightface.model_zoo.landmark import Landmark
+    from insightface.model_zoo.attribute import Attribute
+
+    cls = {"detection": RetinaFace, "landmark": Landmark, "genderage": Attribute, "recognition": ArcFaceONNX}[kind]
+    return cls(model_file=onnx_file, session=session)
+
+
+def _shared_face_analysis_class():
+    from insightface.app import FaceAnalysis
+
+    class SharedFaceAnalysis(FaceAnalysis):
+        """FaceAnalysis whose models run on get_session() sessions instead of private ones."""
+
+        def __init__(self, name="buffalo_l", allowed_modules=FACE_MODULES, providers=None, precision=None):
+            self.models = {}
+            self.model_dir = pack_dir(name, precision)
+            for onnx_file in sorted(glob.glob(os.path.join(self.model_dir, "*.onnx"))):
+                kind = _model_kind(onnx_file)
+                if kind is None or not _wanted(kind, allowed_modules):
+                    continue
+                model = _insightface_model(onnx_file, get_session(onnx_file, providers), kind)
+                if model.taskname not in self.models:
+                    self.models[model.taskname] = model
+            assert "detection" in self.models, f"no detector in pack {name}"
+            self.det_model = self.models["detection"]
+            # ArcFaceONNX guesses its input normalisation from the first graph nodes, which
+            # quantization rewrites; quantized packs record the fp32 values instead
+            manifest = read_quantization_manifest(self.model_dir)
+            if manifest and "recognition" in self.models:
+                self.models["recognition"].input_mean = manifest["recognizer"]["input_mean"]
+                self.models["recognition"].input_std = manifest["recognizer"]["input_std"]
+
+        def prepare(self, ctx_id, det_thresh=0.5, det_size=(640, 640)):
+            # Providers were fixed when the sessions were built; a negative ctx_id would make every
+            # model call session.set_providers(), which rebuilds the session from scratch
+            super().prepare(max(ctx_id, 0), det_thresh=det_thresh, det_size=det_size)
+
+    return SharedFaceAnalysis
+
+
+def get_face_analysis(name="buffalo_l", det_size=(640, 640), allowed_modules=FACE_MODULES, precision=None):
+    """Prepared FaceAnalysis for a model pack (fp32 or int8, default FACE_MODEL_PRECISION), built once
+    per process from shared sessions."""
+    precision = precision or PRECISION
+    key = (name, precision, tuple(det_size), tuple(allowed_modules) if allowed_modules else None)
+    with _lock:
+        if key not in _face_analyses:
+            providers, ctx_id = default_providers()
+            app = _shared_face_analysis_class()(
+                name=name, allowed_modules=allowed_modules, providers=providers, precision=precision
+            )
+            app.prepare(ctx_id=ctx_id, det_size=tuple(det_size))
+            _face_analyses[key] = app
+        return _face_analyses[key]
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build (and cache) ONNX sessions for a face model pack.")
+    parser.add_argument("--pack", default="buffalo_l", help="InsightFace model pack")
+    parser.add_argument("--precision", choices=("fp32", "int8"), default=PRECISION, help="model precision")
+    args = parser.parse_args(argv)
+
+    for key, value in settings().items():
+        print(f"  {key}: {value}")
+    t0 = time.perf_counter()
+    app = get_face_analysis(args.pack, precision=args.precision)
+    print(f"✅ {args.pack}: {', '.join(app.models)} ready in {time.perf_counter() - t0:.2f}s ({session_count()} sessions)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
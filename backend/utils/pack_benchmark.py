@@ -0,0 +1,144 @@
+# utils/pack_benchmark.py
+"""
+Model-pack benchmark on CPU: load time, detection / embedding latency and throughput of each
+face model pack (utils/model_packs.py) on the shared tuned ONNX sessions.
+
+    python -m utils.pack_benchmark                                # every pack, InsightFace sample image
+    python -m utils.pack_benchmark buffalo_l buffalo_s --image face.jpg --iterations 50 --batch 16
+    python -m utils.pack_benchmark --json > packs.json
+    python -m utils.pack_benchmark buffalo_l --precision int8     # after utils.quantize_models
+
+Latencies are per call (p50 / p95); throughput is sequential images/s for detect + align +
+embed of the primary face, and faces/s for one batched ArcFace call of --batch crops.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+# CPU numbers only: must be set before utils.onnx_sessions is imported
+os.environ["ORT_USE_CUDA"] = "0"
+
+from utils.model_packs import MODEL_PACKS, get_pack
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _timed(fn, iterations):
+    """Seconds per call over `iterations` calls (after one untimed call)."""
+    fn()
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def _load_image(path):
+    import cv2
+    if path:
+        img = cv2.imread(path)
+        if img is None:
+            raise SystemExit(f"❌ Cannot read image {path}")
+        return img
+    from insightface.data import get_image
+    return get_image("t1")
+
+
+def bench_pack(name, img, iterations=30, batch=8, precision=None):
+    """Dict of timings for one pack (fp32 / int8, default FACE_MODEL_PRECISION) on one BGR image."""
+    import cv2
+    from insightface.utils import face_align
+    from utils.onnx_sessions import get_face_analysis, PRECISION
+    from utils.face_pipeline import _primary_face_index
+
+    pack = get_pack(name)
+    t0 = time.perf_counter()
+    app = get_face_analysis(name, det_size=(640, 640), precision=precision)
+    load_s = time.perf_counter() - t0
+    detector, recognizer = app.det_model, app.models["recognition"]
+    size = recognizer.input_size[0]
+
+    bboxes, kpss = detector.detect(img, max_num=0, metric="default")
+    if bboxes is not None and len(bboxes) and kpss is not None:
+        crop = face_align.norm_crop(img, landmark=kpss[_primary_face_index(bboxes)], image_size=size)
+    else:
+        crop = cv2.resize(img, (size, size))  # no face: still times the recognizer on a crop
+
+    def end_to_end():
+        b, k = detector.detect(img, max_num=0, metric="default")
+        if b is not None and len(b) and k is not None:
+            aligned = face_align.norm_crop(img, landmark=k[_primary_face_index(b)], image_size=size)
+            recognizer.get_feat([aligned])
+
+    detect = _timed(lambda: detector.detect(img, max_num=0, metric="default"), iterations)
+    embed = _timed(lambda: recognizer.get_feat([crop]), iterations)
+    batched = _timed(lambda: recognizer.get_feat([crop] * batch), max(1, iterations // 4))
+    total = _timed(end_to_end, iterations)
+    return {
+        "pack": pack["namespace"],
+        "precision": precision or PRECISION,
+        "detector": pack["detector"],
+        "recognizer": pack["recognizer"],
+        "dim": int(recognizer.get_feat([crop]).shape[-1]),
+        "faces_detected": 0 if bboxes is None else int(len(bboxes)),
+        "load_s": round(load_s, 3),
+        "detect_ms_p50": round(_percentile(detect, 0.5) * 1000, 2),
+        "detect_ms_p95": round(_percentile(detect, 0.95) * 1000, 2),
+        "embed_ms_p50": round(_percentile(embed, 0.5) * 1000, 2),
+        "embed_ms_p95": round(_percentile(embed, 0.95) * 1000, 2),
+        "e2e_ms_p50": round(_percentile(total, 0.5) * 1000, 2),
+        "images_per_s": round(1.0 / statistics.mean(total), 1),
+        "batch": batch,
+        "batch_faces_per_s": round(batch / statistics.mean(batched), 1),
+    }
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CPU latency / throughput per face model pack.")
+    parser.add_argument("packs", nargs="*", default=list(MODEL_PACKS), help="packs to compare")
+    parser.add_argument("--image", help="BGR test image (default: InsightFace sample 't1')")
+    parser.add_argument("--iterations", type=int, default=30, help="timed calls per measurement")
+    parser.add_argument("--batch", type=int, default=8, help="crops per batched embedding call")
+    parser.add_argument("--precision", choices=("fp32", "int8"), help="model precision (default FACE_MODEL_PRECISION)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    from utils.onnx_sessions import settings
+    img = _load_image(args.image)
+    results = []
+    for name in args.packs:
+        try:
+            results.append(bench_pack(name, img, args.iterations, args.batch, args.precision))
+        except Exception as e:
+            print(f"❌ {name}: {e}", file=sys.stderr)
+            results.append({"pack": name, "error": str(e)})
+
+    if args.json:
+        print(json.dumps({"settings": settings(), "results": results}, indent=2))
+        return 0 if all("error" not in r for r in results) else 1
+
+    s = settings()
+    print(f"CPU: {s['cpu_quota']} cores, intra_op_threads={s['intra_op_threads']}, onnxruntime {s['onnxruntime']}")
+    print(f"{'pack':16} {'load s':>7} {'det p50':>8} {'det p95':>8} {'emb p50':>8} {'e2e p50':>8} "
+          f"{'img/s':>7} {'faces/s@' + str(args.batch):>11}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['pack']:16} ❌ {r['error']}")
+            continue
+        print(f"{r['pack']:16} {r['load_s']:7.2f} {r['detect_ms_p50']:8.1f} {r['detect_ms_p95']:8.1f} "
+              f"{r['embed_ms_p50']:8.1f} {r['e2e_ms_p50']:8.1f} {r['images_per_s']:7.1f} {r['batch_faces_per_s']:11.1f}")
+    return 0 if all("error" not in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
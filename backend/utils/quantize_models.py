@@ -0,0 +1,378 @@
+# utils/quantize_models.py
+"""
+Int8 builds of a model pack's detector and ArcFace recognizer for CPU kiosks / API servers,
+with an accuracy-parity report against fp32 and a latency comparison.
+
+    python -m utils.quantize_models --pack buffalo_l                               # dynamic int8
+    python -m utils.quantize_models --pack buffalo_l --mode static --calibration faces/
+    python -m utils.quantize_models --pack buffalo_l --report-only --holdout holdout/ --report parity.json
+
+Quantized packs are written to <INSIGHTFACE_ROOT>/models/<pack>_int8 and used when
+FACE_MODEL_PRECISION=int8 (see utils/onnx_sessions.py). Templates stay in the pack's
+namespace: int8 embeddings are compared against the fp32 gallery, which is exactly what the
+parity report measures.
+
+Image folders: --calibration is any folder of face photos (searched recursively; only the
+embeddings of registered students are stored, so crops come from photos, not the gallery);
+--holdout is <student_id>/<image> so genuine and impostor pairs are known.
+"""
+import os
+import sys
+import json
+import glob
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+import numpy as np
+from utils.pack_benchmark import bench_pack, _load_image   # forces CPU before utils.onnx_sessions loads
+from utils.onnx_sessions import (
+    FACE_MODULES, QUANTIZATION_MANIFEST, pack_dir, quantized_pack_dir, read_quantization_manifest,
+    get_face_analysis, _model_kind,
+)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+# Cosine-distance thresholds in use: API login (utils/face_login.py) and kiosk (attendance_app.py)
+THRESHOLDS = {"login": 0.45, "kiosk": 0.55}
+DET_SIZE = (640, 640)
+
+
+def _images(folder, limit=None):
+    paths = sorted(
+        p for p in glob.glob(os.path.join(folder, "**", "*"), recursive=True)
+        if p.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return paths[:limit] if limit else paths
+
+
+def _read(path):
+    import cv2
+    return cv2.imread(path)
+
+
+# -----------------------------
+# Preprocessing (same as insightface's RetinaFace.detect / ArcFaceONNX.get_feat)
+# -----------------------------
+def _detector_blob(img, detector, size=DET_SIZE):
+    import cv2
+    ratio = img.shape[0] / img.shape[1]
+    new_h, new_w = (size[1], int(size[1] / ratio)) if ratio > size[1] / size[0] else (int(size[0] * ratio), size[0])
+    canvas = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    canvas[:new_h, :new_w] = cv2.resize(img, (new_w, new_h))
+    return cv2.dnn.blobFromImage(
+        canvas, 1.0 / detector.input_std, size, (detector.input_mean,) * 3, swapRB=True
+    )
+
+
+def _recognizer_blob(crop, recognizer):
+    import cv2
+    size = tuple(recognizer.input_size)
+    return cv2.dnn.blobFromImages(
+        [crop], 1.0 / recognizer.input_std, size, (recognizer.input_mean,) * 3, swapRB=True
+    )
+
+
+def _primary_face(app, img):
+    """(bbox, aligned crop) of the primary face, or (None, None)."""
+    from insightface.utils import face_align
+    from utils.face_pipeline import _primary_face_index
+    bboxes, kpss = app.det_model.detect(img, max_num=0, metric="default")
+    if bboxes is None or not len(bboxes) or kpss is None:
+        return None, None
+    j = _primary_face_index(bboxes)
+    size = app.models["recognition"].input_size[0]
+    return bboxes[j][:4], face_align.norm_crop(img, landmark=kpss[j], image_size=size)
+
+
+def _calibration_reader(input_name, blobs):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class BlobReader(CalibrationDataReader):
+        def __init__(self):
+            self._blobs = iter(blobs)
+
+        def get_next(self):
+            blob = next(self._blobs, None)
+            return None if blob is None else {input_name: blob}
+
+    return BlobReader()
+
+
+# -----------------------------
+# Quantization
+# -----------------------------
+def source_models(pack):
+    """{"detection": path, "recognition": path}: the fp32 files SharedFaceAnalysis would load."""
+    found = {}
+    for onnx_file in sorted(glob.glob(os.path.join(pack_dir(pack, "fp32"), "*.onnx"))):
+        kind = _model_kind(onnx_file)
+        if kind in FACE_MODULES and kind not in found:
+            found[kind] = onnx_file
+    missing = set(FACE_MODULES) - set(found)
+    if missing:
+        raise RuntimeError(f"pack {pack} has no {', '.join(sorted(missing))} model")
+    return found
+
+
+def _calibration_blobs(pack, folder, limit):
+    """Detector and recognizer input blobs from the photos in `folder` (faces found by fp32)."""
+    app = get_face_analysis(pack, det_size=DET_SIZE, precision="fp32")
+    detector, recognizer = app.det_model, app.models["recognition"]
+    det_blobs, rec_blobs = [], []
+    for path in _images(folder, limit):
+        img = _read(path)
+        if img is None:
+            continue
+        det_blobs.append(_detector_blob(img, detector))
+        _, crop = _primary_face(app, img)
+        if crop is not None:
+            rec_blobs.append(_recognizer_blob(crop, recognizer))
+    if not det_blobs or not rec_blobs:
+        raise RuntimeError(f"no usable calibration faces in {folder}")
+    print(f"📐 Calibration: {len(det_blobs)} images, {len(rec_blobs)} faces")
+    return {"detection": det_blobs, "recognition": rec_blobs}, app
+
+
+def quantize_pack(pack, mode="dynamic", calibration=None, limit=200, per_channel=True):
+    """Write <pack>_int8 (detector + recognizer + manifest). Returns the output directory."""
+    import onnxruntime as ort
+    from onnxruntime.quantization import (
+        quantize_dynamic, quantize_static, quant_pre_process, QuantType, QuantFormat, CalibrationMethod,
+    )
+
+    sources = source_models(pack)
+    fp32 = get_face_analysis(pack, det_size=DET_SIZE, precision="fp32")
+    blobs = None
+    if mode == "static":
+        if not calibration:
+            raise ValueError("static quantization needs --calibration")
+        blobs, _ = _calibration_blobs(pack, calibration, limit)
+
+    out_dir = quantized_pack_dir(pack)
+    os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f"{pack}_int8.", dir=os.path.dirname(out_dir))
+    try:
+        files = {}
+        for kind, src in sources.items():
+            name = os.path.basename(src)
+            dst = os.path.join(tmp_dir, name)
+            prepared = os.path.join(tmp_dir, f"prep.{name}")
+            try:
+                # Shape inference + fp32 graph optimisations first, as ORT recommends for int8
+                quant_pre_process(src, prepared, skip_symbolic_shape=True)
+            except Exception as e:
+                print(f"⚠️ Pre-processing {name} failed ({e}); quantizing the original graph")
+                prepared = src
+
+            print(f"🔧 Quantizing {kind} {name} ({mode})...")
+            if mode == "dynamic":
+                quantize_dynamic(prepared, dst, weight_type=QuantType.QInt8, per_channel=per_channel)
+            else:
+                input_name = ort.InferenceSession(prepared, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+                quantize_static(
+                    prepared, dst, _calibration_reader(input_name, blobs[kind]),
+                    quant_format=QuantFormat.QDQ, per_channel=per_channel,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    calibrate_method=CalibrationMethod.MinMax,
+                )
+            if prepared != src:
+                os.remove(prepared)
+            files[kind] = {"file": name, "fp32_mb": round(os.path.getsize(src) / 2**20, 1),
+                           "int8_mb": round(os.path.getsize(dst) / 2**20, 1)}
+
+        recognizer = fp32.models["recognition"]
+        manifest = {
+            "pack": pack,
+            "mode": mode,
+            "per_channel": per_channel,
+            "onnxruntime": ort.__version__,
+            "calibration_images": len(blobs["detection"]) if blobs else 0,
+            "created_at": datetime.utcnow().isoformat(),
+            "models": files,
+            "recognizer": {"input_mean": float(recognizer.input_mean), "input_std": float(recognizer.input_std)},
+        }
+        with open(os.path.join(tmp_dir, QUANTIZATION_MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Swap the whole directory so a loader never sees a half-written pack
+        if os.path.isdir(out_dir):
+            shutil.rmtree(out_dir)
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    for kind, info in files.items():
+        print(f"✅ {kind}: {info['file']} {info['fp32_mb']}MB → {info['int8_mb']}MB")
+    return out_dir
+
+
+# -----------------------------
+# Parity report
+# -----------------------------
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _embed_all(app, images):
+    """[(bbox, unit embedding)] per image; (None, None) where no face was found."""
+    recognizer = app.models["recognition"]
+    out = []
+    for img in images:
+        bbox, crop = _primary_face(app, img)
+        if crop is None:
+            out.append((None, None))
+            continue
+        feat = np.asarray(recognizer.get_feat([crop]), dtype=np.float32).ravel()
+        out.append((bbox, feat / (np.linalg.norm(feat) or 1.0)))
+    return out
+
+
+def _distances(embeddings, labels):
+    """(genuine, impostor) cosine distances over every pair of embedded images."""
+    matrix = np.stack(embeddings)
+    dist = 1.0 - matrix @ matrix.T
+    labels = np.asarray(labels)
+    upper = np.triu(np.ones(dist.shape, dtype=bool), k=1)
+    same = labels[:, None] == labels[None, :]
+    return dist[upper & same], dist[upper & ~same]
+
+
+def _summary(values):
+    if not len(values):
+        return None
+    return {"mean": round(float(np.mean(values)), 4), "std": round(float(np.std(values)), 4),
+            "p5": round(float(np.percentile(values, 5)), 4), "p95": round(float(np.percentile(values, 95)), 4)}
+
+
+def parity_report(pack, holdout, limit=None):
+    """fp32 vs int8 on a held-out <student_id>/<image> folder."""
+    paths = _images(holdout, limit)
+    images, labels = [], []
+    for path in paths:
+        img = _read(path)
+        if img is not None:
+            images.append(img)
+            labels.append(os.path.basename(os.path.dirname(path)))
+    if len(set(labels)) < 2:
+        raise RuntimeError(f"{holdout} needs images of at least two students (<student_id>/<image>)")
+
+    fp32 = _embed_all(get_face_analysis(pack, det_size=DET_SIZE, precision="fp32"), images)
+    int8 = _embed_all(get_face_analysis(pack, det_size=DET_SIZE, precision="int8"), images)
+
+    # Pairs only over images both precisions embedded, so the distributions are comparable
+    both = [i for i in range(len(images)) if fp32[i][1] is not None and int8[i][1] is not None]
+    ious = [_iou(fp32[i][0], int8[i][0]) for i in both]
+    agreement = [float(fp32[i][1] @ int8[i][1]) for i in both]
+    report = {
+        "pack": pack,
+        "images": len(images),
+        "students": len(set(labels)),
+        "detection": {
+            "fp32_found": sum(e is not None for _, e in fp32),
+            "int8_found": sum(e is not None for _, e in int8),
+            "bbox_iou": _summary(ious),
+        },
+        "fp32_vs_int8_cosine": _summary(agreement),
+        "thresholds": {},
+    }
+    if len(both) < 2:
+        return report
+
+    kept = [labels[i] for i in both]
+    genuine32, impostor32 = _distances([fp32[i][1] for i in both], kept)
+    genuine8, impostor8 = _distances([int8[i][1] for i in both], kept)
+    report["genuine"] = {"fp32": _summary(genuine32), "int8": _summary(genuine8),
+                         "shift": round(float(np.mean(genuine8) - np.mean(genuine32)), 4) if len(genuine32) else None}
+    report["impostor"] = {"fp32": _summary(impostor32), "int8": _summary(impostor8),
+                          "shift": round(float(np.mean(impostor8) - np.mean(impostor32)), 4)}
+    for name, threshold in THRESHOLDS.items():
+        report["thresholds"][name] = {
+            "threshold": threshold,
+            # FRR: genuine pairs at/over the threshold; FAR: impostor pairs under it
+            "frr_fp32": round(float(np.mean(genuine32 >= threshold)), 4) if len(genuine32) else None,
+            "frr_int8": round(float(np.mean(genuine8 >= threshold)), 4) if len(genuine8) else None,
+            "far_fp32": round(float(np.mean(impostor32 < threshold)), 4),
+            "far_int8": round(float(np.mean(impostor8 < threshold)), 4),
+        }
+    return report
+
+
+def latency_report(pack, img, iterations=30, batch=8):
+    """bench_pack() for fp32 and int8 plus the int8 speedups."""
+    fp32 = bench_pack(pack, img, iterations, batch, precision="fp32")
+    int8 = bench_pack(pack, img, iterations, batch, precision="int8")
+    return {
+        "fp32": fp32,
+        "int8": int8,
+        "detect_speedup": round(fp32["detect_ms_p50"] / int8["detect_ms_p50"], 2),
+        "embed_speedup": round(fp32["embed_ms_p50"] / int8["embed_ms_p50"], 2),
+        "e2e_speedup": round(fp32["e2e_ms_p50"] / int8["e2e_ms_p50"], 2),
+    }
+
+
+def _print_report(parity, latency):
+    if parity:
+        d = parity["detection"]
+        print(f"\n📊 Parity on {parity['images']} held-out images ({parity['students']} students)")
+        print(f"  faces found: fp32 {d['fp32_found']}, int8 {d['int8_found']}; "
+              f"bbox IoU mean {d['bbox_iou']['mean'] if d['bbox_iou'] else '-'}")
+        if parity["fp32_vs_int8_cosine"]:
+            c = parity["fp32_vs_int8_cosine"]
+            print(f"  fp32 vs int8 embedding cosine: mean {c['mean']}, p5 {c['p5']}")
+        for side in ("genuine", "impostor"):
+            if side in parity and parity[side]["fp32"]:
+                s = parity[side]
+                print(f"  {side:8} distance: fp32 {s['fp32']['mean']} → int8 {s['int8']['mean']} (shift {s['shift']:+})")
+        for name, t in parity["thresholds"].items():
+            print(f"  @{name} {t['threshold']}: FRR {t['frr_fp32']} → {t['frr_int8']}, FAR {t['far_fp32']} → {t['far_int8']}")
+    if latency:
+        print("\n⏱️ CPU latency p50 (ms)    fp32     int8  speedup")
+        for label, key, speedup in (("detect", "detect_ms_p50", "detect_speedup"),
+                                    ("embed", "embed_ms_p50", "embed_speedup"),
+                                    ("end-to-end", "e2e_ms_p50", "e2e_speedup")):
+            print(f"  {label:22} {latency['fp32'][key]:8.1f} {latency['int8'][key]:8.1f}  x{latency[speedup]}")
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build int8 face models and compare them with fp32.")
+    parser.add_argument("--pack", default="buffalo_l", help="InsightFace model pack")
+    parser.add_argument("--mode", choices=("dynamic", "static"), default="dynamic", help="int8 quantization mode")
+    parser.add_argument("--calibration", help="folder of face photos (static mode)")
+    parser.add_argument("--calibration-size", type=int, default=200, help="max calibration images")
+    parser.add_argument("--per-tensor", action="store_true", help="per-tensor instead of per-channel weights")
+    parser.add_argument("--holdout", help="<student_id>/<image> folder for the parity report")
+    parser.add_argument("--image", help="latency benchmark image (default: first held-out image)")
+    parser.add_argument("--iterations", type=int, default=30, help="timed calls per latency measurement")
+    parser.add_argument("--report-only", action="store_true", help="skip quantization, compare the existing int8 pack")
+    parser.add_argument("--report", help="write the parity + latency report as JSON")
+    args = parser.parse_args(argv)
+
+    if not args.report_only:
+        quantize_pack(args.pack, args.mode, args.calibration, args.calibration_size, not args.per_tensor)
+    elif read_quantization_manifest(quantized_pack_dir(args.pack)) is None:
+        print(f"❌ No int8 build of {args.pack}; run without --report-only first")
+        return 1
+
+    parity = parity_report(args.pack, args.holdout) if args.holdout else None
+    image = args.image or (_images(args.holdout, 1)[0] if args.holdout and _images(args.holdout, 1) else None)
+    latency = latency_report(args.pack, _load_image(image), args.iterations)
+    _print_report(parity, latency)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"manifest": read_quantization_manifest(quantized_pack_dir(args.pack)),
+                       "parity": parity, "latency": latency}, f, indent=2)
+        print(f"📝 Report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
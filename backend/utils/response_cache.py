@@ -0,0 +1,306 @@
+# utils/response_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response
+from pymongo import ReturnDocument
+
+# -----------------------------
+# Config
+# -----------------------------
+DEFAULT_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "60"))               # seconds
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))      # in-process LRU size
+SHARED_PATH = os.getenv("RESPONSE_CACHE_SHARED", "")                    # e.g. /tmp/response_cache.sqlite3
+ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") != "0"
+# Where version counters live without a shared backend: "mongo" (every process and host) or "local"
+VERSION_STORE = os.getenv("RESPONSE_CACHE_VERSIONS", "mongo")
+VERSION_REFRESH = float(os.getenv("RESPONSE_CACHE_VERSION_REFRESH", "1.0"))   # seconds a Mongo read is reused
+
+# Invalidation scopes bumped by write paths
+ATTENDANCE = "attendance"
+ENROLLMENT = "enrollment"
+CLASSES = "classes"
+SUBJECTS = "subjects"
+INSTRUCTORS = "instructors"
+STUDENTS = "students"
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class MemoryBackend:
+    """In-process LRU with per-entry TTL. Also holds version counters when no shared backend is set."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, scopes):
+        with self._lock:
+            return tuple(self._versions.get(s, 0) for s in scopes)
+
+    def bump(self, scopes):
+        with self._lock:
+            for s in scopes:
+                self._versions[s] = self._versions.get(s, 0) + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Shared store for several worker processes on one host (stand-in for Redis/memcached)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, expires REAL, status INTEGER, mimetype TEXT, etag TEXT, body BLOB)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS versions (scope TEXT PRIMARY KEY, version INTEGER)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT expires, status, mimetype, etag, body FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return {"status": row[1], "mimetype": row[2], "etag": row[3], "body": bytes(row[4])}
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, expires, status, mimetype, etag, body) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, now + ttl, value["status"], value["mimetype"], value["etag"], value["body"])
+        )
+        conn.execute("DELETE FROM entries WHERE expires < ?", (now,))
+
+    def get_versions(self, scopes):
+        if not scopes:
+            return ()
+        rows = dict(self._conn().execute(
+            f"SELECT scope, version FROM versions WHERE scope IN ({','.join('?' * len(scopes))})",
+            tuple(scopes)
+        ).fetchall())
+        return tuple(rows.get(s, 0) for s in scopes)
+
+    def bump(self, scopes):
+        conn = self._conn()
+        for s in scopes:
+            conn.execute(
+                "INSERT INTO versions (scope, version) VALUES (?, 1) "
+                "ON CONFLICT(scope) DO UPDATE SET version = version + 1",
+                (s,)
+            )
+
+
+class MongoVersionStore:
+    """
+    Version counters in the cache_versions collection, so a write in any process invalidates
+    every process's cache. Reads are reused for VERSION_REFRESH seconds; bumps apply locally at once.
+    """
+
+    def __init__(self, refresh=VERSION_REFRESH):
+        from config.db_config import db
+        self.collection = db["cache_versions"]
+        self.refresh = refresh
+        self._versions = {}
+        self._read_at = None
+        self._lock = threading.Lock()
+
+    def get_versions(self, scopes):
+        now = time.monotonic()
+        with self._lock:
+            if self._read_at is not None and now - self._read_at < self.refresh:
+                return tuple(self._versions.get(s, 0) for s in scopes)
+        try:
+            versions = {d["_id"]: d.get("version", 0) for d in self.collection.find({}, {"version": 1})}
+        except Exception as e:
+            print("⚠️ Response cache version read failed:", e)
+            versions = None
+        with self._lock:
+            if versions is not None:
+                self._versions, self._read_at = versions, now
+            return tuple(self._versions.get(s, 0) for s in scopes)
+
+    def bump(self, scopes):
+        for s in scopes:
+            doc = self.collection.find_one_and_update(
+                {"_id": s}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+            with self._lock:
+                self._versions[s] = doc["version"]
+
+
+# -----------------------------
+# Cache facade
+# -----------------------------
+class ResponseCache:
+    def __init__(self, shared_path=SHARED_PATH, max_entries=MAX_ENTRIES):
+        self.local = MemoryBackend(max_entries)
+        self.shared = None
+        if shared_path:
+            try:
+                self.shared = SQLiteBackend(shared_path)
+            except Exception as e:
+                print("⚠️ Shared response cache unavailable, using in-process only:", e)
+        # Per-process counters would let other workers serve stale responses until their TTL
+        self.version_store = self.shared or (MongoVersionStore() if VERSION_STORE == "mongo" else self.local)
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "not_modified": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def versions(self, scopes):
+        return self.version_store.get_versions(scopes)
+
+    def bump(self, *scopes):
+        try:
+            self.version_store.bump(scopes)
+        except Exception as e:
+            print("⚠️ Response cache bump failed:", e)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception:
+                value = None
+            if value is not None:
+                self.local.set(key, value, DEFAULT_TTL)
+                self._count("shared_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value, ttl):
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, ttl)
+            except Exception as e:
+                print("⚠️ Shared response cache write failed:", e)
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        hits = s["local_hits"] + s["shared_hits"]
+        lookups = hits + s["misses"]
+        s["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+        s["local_entries"] = len(self.local)
+        s["shared_backend"] = "sqlite" if self.shared is not None else None
+        s["version_store"] = type(self.version_store).__name__
+        return s
+
+
+response_cache = ResponseCache()
+
+
+def bump_versions(*scopes):
+    """Invalidate every cached response that depends on any of the given scopes."""
+    response_cache.bump(*scopes)
+
+
+def cache_stats():
+    return response_cache.stats()
+
+
+# -----------------------------
+# Route decorator
+# -----------------------------
+def _identity():
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        identity = get_jwt_identity()
+    except Exception:
+        return ""
+    return str(identity) if identity is not None else ""
+
+
+def cached_response(*scopes, ttl=DEFAULT_TTL):
+    """
+    Cache a GET view's 200 response, keyed by route + query string + JWT identity
+    + the current version of every scope it depends on. Place below @jwt_required().
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not ENABLED or request.method != "GET":
+                return view(*args, **kwargs)
+
+            versions = response_cache.versions(scopes)
+            raw_key = "|".join([
+                request.endpoint or request.path,
+                request.full_path,
+                _identity(),
+                ",".join(f"{s}:{v}" for s, v in zip(scopes, versions)),
+            ])
+            key = hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+            entry = response_cache.get(key)
+            if entry is None:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200 or resp.direct_passthrough:
+                    return resp
+                body = resp.get_data()
+                entry = {
+                    "status": resp.status_code,
+                    "mimetype": resp.mimetype,
+                    "etag": hashlib.sha1(body).hexdigest(),
+                    "body": body,
+                }
+                response_cache.set(key, entry, ttl)
+
+            resp = make_response(entry["body"], entry["status"])
+            resp.mimetype = entry["mimetype"]
+            resp.set_etag(entry["etag"])
+            resp.headers["Cache-Control"] = "private, no-cache"
+            resp = resp.make_conditional(request)
+            if resp.status_code == 304:
+                response_cache._count("not_modified")
+            return resp
+        return wrapper
+    return decorator
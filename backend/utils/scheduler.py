@@ -1,75 +1,299 @@
 # utils/scheduler.py
-from apscheduler.schedulers.background import BackgroundScheduler
+import os
+import heapq
+import itertools
+import threading
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
 from config.db_config import db
-from utils.face_recognition import handle_attendance_session
+from utils.attendance_session import PH_TZ, start_attendance_session, stop_attendance_session
+from utils.leader_election import LeaderLease, get_lease_status
 
-subjects_collection = db["subjects"]
-seen_subjects = set()  # prevent re-triggering
+classes_collection = db["classes"]
 
-def auto_activate_attendance():
-    now = datetime.now()
-    day_code = now.strftime("%a")[0].upper()
-    current_time = now.strftime("%H:%M")
+DAY_INDEX = {"Mon": 0, "Tue": 1, "Wed": 2, "Thu": 3, "Fri": 4, "Sat": 5, "Sun": 6}
+START, STOP = "start", "stop"
+# Back-to-back slots in one room: the 10:00 stop must land before the 10:00 start
+KIND_ORDER = {STOP: 0, START: 1}
 
-    subjects = subjects_collection.find({"is_attendance_active": False})
-    for subj in subjects:
-        if day_code in subj.get("schedule", ""):
-            try:
-                start_str, end_str = subj["schedule_time"].split("-")
+# Edits made in other processes/hosts are picked up via classes.schedule_updated_at every CHANGE_POLL_SECONDS;
+# a full reload every RESYNC_MINUTES is the safety net (e.g. for deleted classes)
+CHANGE_POLL_SECONDS = int(os.getenv("SCHEDULER_CHANGE_POLL_SECONDS", "60"))
+RESYNC_MINUTES = int(os.getenv("SCHEDULER_RESYNC_MINUTES", "30"))
+LEASE_NAME = "timetable-scheduler"
 
-                if start_str <= current_time <= end_str:
-                    if subj["_id"] in seen_subjects:
-                        continue
 
-                    subjects_collection.update_one(
-                        {"_id": subj["_id"]},
-                        {"$set": {
-                            "is_attendance_active": True,
-                            "attendance_start_time": now
-                        }}
-                    )
+# -----------------------------
+# Helpers
+# -----------------------------
+def _minutes(hhmm):
+    try:
+        h, m = str(hhmm).split(":")[:2]
+        return int(h) * 60 + int(m)
+    except (ValueError, AttributeError):
+        return None
 
-                    print(f"[AUTO] ✅ Activated: {subj['subject_code']}")
 
-                    handle_attendance_session(
-                        subject=subj.get("subject_name", "Unknown"),
-                        subject_id=subj.get("subject_code"),
-                        subject_start_time=now
-                    )
+def parse_schedule_blocks(blocks):
+    """schedule_blocks -> [(weekday, start_minute, end_minute)], skipping incomplete blocks."""
+    slots = []
+    for block in blocks or []:
+        start, end = _minutes(block.get("start")), _minutes(block.get("end"))
+        if start is None or end is None:
+            continue
+        for day in block.get("days", []):
+            day = str(day).strip()[:3].title()
+            if day in DAY_INDEX:
+                slots.append((DAY_INDEX[day], start, end))
+    return slots
 
-                    seen_subjects.add(subj["_id"])
 
-            except Exception as e:
-                print(f"⛔ Error in {subj.get('subject_code')}: {e}")
+def next_occurrence(weekday, minute, now):
+    """Next datetime (PH time, >= now) falling on weekday at minute-of-day."""
+    base = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    days_ahead = (weekday - now.weekday()) % 7
+    when = base + timedelta(days=days_ahead, minutes=minute)
+    if when < now:
+        when += timedelta(days=7)
+    return when
 
-def auto_stop_attendance():
-    now = datetime.now()
 
-    active_subjects = subjects_collection.find({"is_attendance_active": True})
-    for subj in active_subjects:
-        try:
-            start_str, end_str = subj["schedule_time"].split("-")
-            end_dt = datetime.strptime(end_str, "%H:%M").time()
-
-            # Combine today's date with end time
-            end_time_with_grace = datetime.combine(now.date(), end_dt) + timedelta(minutes=30)
-
-            if now > end_time_with_grace:
-                subjects_collection.update_one(
-                    {"_id": subj["_id"]},
-                    {"$set": {
-                        "is_attendance_active": False,
-                        "attendance_start_time": None
-                    }}
-                )
-                print(f"[AUTO] ⛔ Deactivated: {subj['subject_code']} (grace period over)")
+# -----------------------------
+# Timetable index
+# -----------------------------
+class Timetable:
+    """
+    Min-heap of upcoming start/stop events across all classes.
+    Each (class, slot, kind) has exactly one pending event; when it fires, next week's is pushed.
+    Editing a class bumps its version, so stale heap entries are skipped lazily on pop.
+    Events pop in time order, stops before starts at the same instant.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._versions = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _push(self, when, kind, class_id, slot, version):
+        heapq.heappush(self._heap, (when, KIND_ORDER[kind], next(self._seq), kind, class_id, slot, version))
+
+    def set_class(self, class_id, schedule_blocks, now=None, catch_up=False):
+        """
+        Insert or replace one class's events. O(slots · log n); other classes are untouched.
+        catch_up=True also starts classes that are already mid-slot (used on the initial load only).
+        """
+        now = now or datetime.now(PH_TZ)
+        class_id = str(class_id)
+        with self._lock:
+            version = self._versions.get(class_id, 0) + 1
+            self._versions[class_id] = version
+            for slot in parse_schedule_blocks(schedule_blocks):
+                weekday, start, end = slot
+                next_start, next_stop = next_occurrence(weekday, start, now), next_occurrence(weekday, end, now)
+                if catch_up and next_stop < next_start:
+                    # Loaded mid-class: start now, then re-arm on the regular weekly start time
+                    self._push(now, START, class_id, (weekday, start, end, "catch-up"), version)
+                self._push(next_start, START, class_id, slot, version)
+                self._push(next_stop, STOP, class_id, slot, version)
+
+    def remove_class(self, class_id):
+        with self._lock:
+            self._versions[str(class_id)] = self._versions.get(str(class_id), 0) + 1
+
+    def rebuild(self, classes, now=None, catch_up=False):
+        """Full rebuild from [(class_id, schedule_blocks)]."""
+        with self._lock:
+            self._heap.clear()
+            self._versions.clear()
+        for class_id, blocks in classes:
+            self.set_class(class_id, blocks, now, catch_up)
+
+    def next_due(self):
+        """Datetime of the earliest live event, or None."""
+        with self._lock:
+            while self._heap:
+                when, _, _, _, class_id, _, version = self._heap[0]
+                if self._versions.get(class_id) == version:
+                    return when
+                heapq.heappop(self._heap)
+            return None
+
+    def pop_due(self, now):
+        """Pop every live event due at or before now, re-arming each for next week."""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, _, _, kind, class_id, slot, version = heapq.heappop(self._heap)
+                if self._versions.get(class_id) != version:
+                    continue
+                due.append((when, kind, class_id))
+                if len(slot) == 3:
+                    self._push(when + timedelta(days=7), kind, class_id, slot, version)
+        return due
+
+
+# -----------------------------
+# Scheduler thread
+# -----------------------------
+class TimetableScheduler:
+    """Sleeps until the next timetable event, then starts/stops sessions on one worker thread, in event order."""
+
+    def __init__(self, start_fn=None, stop_fn=None):
+        self.timetable = Timetable()
+        self._start_fn = start_fn or (lambda cid: start_attendance_session(cid, "scheduler"))
+        self._stop_fn = stop_fn or stop_attendance_session
+        self._wake = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._executor = None
+        self._last_sync = None
+        self._last_poll = None
+        self._changes_since = None
+        self._processed_until = None  # wake time whose due events were last dispatched
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _rearm_time(self):
+        """
+        Re-index from just after the last dispatched wake: events due since then are still
+        pending and must fire, not be pushed to next week by next_occurrence.
+        """
+        return self._processed_until + timedelta(microseconds=1) if self._processed_until else None
+
+    def load(self, catch_up=False):
+        self._changes_since = datetime.utcnow()
+        cursor = classes_collection.find(
+            {"schedule_blocks.0": {"$exists": True}}, {"_id": 1, "schedule_blocks": 1}
+        )
+        self.timetable.rebuild(((str(c["_id"]), c.get("schedule_blocks", [])) for c in cursor),
+                               now=self._rearm_time(), catch_up=catch_up)
+        self._last_sync = self._last_poll = datetime.now(PH_TZ)
+        print(f"🗓️ Timetable loaded: {len(self.timetable)} pending events")
+
+    def poll_changes(self):
+        """Re-index classes whose schedule changed since the last poll (indexed on schedule_updated_at)."""
+        since, self._changes_since = self._changes_since, datetime.utcnow()
+        cursor = classes_collection.find(
+            {"schedule_updated_at": {"$gte": since}}, {"_id": 1, "schedule_blocks": 1}
+        )
+        for c in cursor:
+            self.timetable.set_class(str(c["_id"]), c.get("schedule_blocks", []), self._rearm_time())
+        self._last_poll = datetime.now(PH_TZ)
 
+    def class_changed(self, class_id, schedule_blocks=None, deleted=False):
+        """Apply one class's schedule edit and wake the loop (the next event may have moved earlier)."""
+        if deleted:
+            self.timetable.remove_class(class_id)
+        else:
+            if schedule_blocks is None:
+                doc = classes_collection.find_one({"_id": ObjectId(class_id)}, {"schedule_blocks": 1})
+                schedule_blocks = (doc or {}).get("schedule_blocks", [])
+            self.timetable.set_class(class_id, schedule_blocks, self._rearm_time())
+        with self._wake:
+            self._wake.notify()
+
+    def _dispatch(self, kind, class_id):
+        try:
+            ok = self._start_fn(class_id) if kind == START else self._stop_fn(class_id)
+            print(f"[TIMETABLE] {'✅' if ok else '⚠️'} {kind} {class_id}")
         except Exception as e:
-            print(f"⛔ Error auto-stopping {subj.get('subject_code')}: {e}")
+            print(f"[TIMETABLE] ⛔ {kind} {class_id} failed: {e}")
+
+    def _loop(self):
+        while True:
+            now = datetime.now(PH_TZ)
+            # Dispatch before re-indexing: a resync or poll re-arms anything earlier than its "now"
+            for _, kind, class_id in self.timetable.pop_due(now):
+                self._executor.submit(self._dispatch, kind, class_id)
+            self._processed_until = now
+
+            if self._last_sync and now - self._last_sync >= timedelta(minutes=RESYNC_MINUTES):
+                try:
+                    self.load()
+                except Exception as e:
+                    print("⚠️ Timetable resync failed:", e)
+                    self._last_sync = now
+            elif self._last_poll and now - self._last_poll >= timedelta(seconds=CHANGE_POLL_SECONDS):
+                try:
+                    self.poll_changes()
+                except Exception as e:
+                    print("⚠️ Timetable change poll failed:", e)
+                    self._last_poll = now
+
+            next_due = self.timetable.next_due()
+            poll_at = (self._last_poll or now) + timedelta(seconds=CHANGE_POLL_SECONDS)
+            wake_at = min(next_due, poll_at) if next_due else poll_at
+            timeout = max(0.0, (wake_at - datetime.now(PH_TZ)).total_seconds())
+            with self._wake:
+                if self._stopped:
+                    return
+                self._wake.wait(timeout)
+                if self._stopped:
+                    return
+
+    def start(self):
+        if self.running:
+            return self
+        self._stopped = False
+        self._processed_until = None
+        # One thread: events run in pop order, so a stop finishes before the next start in the room
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="timetable")
+        try:
+            self.load(catch_up=True)
+        except Exception:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            raise
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="timetable-scheduler")
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        with self._wake:
+            self._stopped = True
+            self._wake.notify()
+        if self._thread:
+            self._thread.join(5)
+        self._thread = None
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+timetable_scheduler = TimetableScheduler()
+
+# Only the lease holder runs the timetable; every other worker/host stays a follower
+scheduler_lease = LeaderLease(
+    LEASE_NAME,
+    on_elected=timetable_scheduler.start,
+    on_demoted=timetable_scheduler.shutdown,
+)
+
+
+def notify_schedule_changed(class_id, schedule_blocks=None, deleted=False):
+    """
+    Call after a class's schedule_blocks change. Applied immediately when this process is the
+    leader; other processes rely on the leader polling classes.schedule_updated_at.
+    """
+    if timetable_scheduler.running:
+        timetable_scheduler.class_changed(class_id, schedule_blocks, deleted)
+
 
 def start_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(auto_activate_attendance, 'interval', minutes=1)
-    scheduler.add_job(auto_stop_attendance, 'interval', minutes=1)
-    scheduler.start()
+    """Join the leader election; the timetable runs only while this process holds the lease."""
+    return scheduler_lease.start()
+
+
+def scheduler_status():
+    return {
+        "this_process": {**scheduler_lease.status(), "timetable_running": timetable_scheduler.running,
+                         "pending_events": len(timetable_scheduler.timetable)},
+        "leader": get_lease_status(LEASE_NAME),
+    }
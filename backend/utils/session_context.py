@@ -0,0 +1,90 @@
+# utils/session_context.py
+import os
+import time
+import threading
+from bson import ObjectId
+from config.db_config import db
+from models.enrollment_model import get_class_roster
+from utils.response_cache import response_cache, CLASSES, ENROLLMENT
+
+classes_collection = db["classes"]
+
+# Safety net for edits that bypass bump_versions (other processes are covered by the shared version store)
+CONTEXT_TTL = int(os.getenv("SESSION_CONTEXT_TTL", "300"))
+
+# Only what the ingest path needs; never the legacy embedded roster
+CLASS_META_PROJECTION = {
+    "subject_code": 1, "subject_title": 1, "instructor_id": 1,
+    "instructor_first_name": 1, "instructor_last_name": 1,
+    "course": 1, "section": 1, "attendance_start_time": 1, "attendance_end_time": 1,
+}
+
+_contexts = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _class_data(cls):
+    return {
+        "class_id": str(cls["_id"]),
+        "subject_code": cls.get("subject_code"),
+        "subject_title": cls.get("subject_title"),
+        "instructor_id": cls.get("instructor_id"),
+        "instructor_first_name": cls.get("instructor_first_name"),
+        "instructor_last_name": cls.get("instructor_last_name"),
+        "course": cls.get("course"),
+        "section": cls.get("section"),
+    }
+
+
+def _load(class_id):
+    cls = classes_collection.find_one({"_id": ObjectId(class_id)}, CLASS_META_PROJECTION)
+    if not cls:
+        return None
+    roster = get_class_roster(class_id)
+    return {
+        "class_data": _class_data(cls),
+        "attendance_start_time": cls.get("attendance_start_time"),
+        "attendance_end_time": cls.get("attendance_end_time"),
+        "roster": roster,
+        "roster_ids": {s.get("student_id") for s in roster},
+    }
+
+
+def get_session_context(class_id, refresh=False):
+    """
+    Cached {"class_data", "attendance_start_time", "attendance_end_time", "roster", "roster_ids"}
+    for one class, or None.
+    Entries are dropped on session start/stop, class edits, enrollment/class version bumps and after CONTEXT_TTL.
+    """
+    class_id = str(class_id)
+    versions = response_cache.versions((CLASSES, ENROLLMENT))
+    if not refresh:
+        with _lock:
+            entry = _contexts.get(class_id)
+            if entry and entry[0] == versions and entry[1] > time.time():
+                _stats["hits"] += 1
+                return entry[2]
+            _stats["misses"] += 1
+
+    context = _load(class_id)
+    with _lock:
+        if context is None:
+            _contexts.pop(class_id, None)
+        else:
+            _contexts[class_id] = (versions, time.time() + CONTEXT_TTL, context)
+    return context
+
+
+def invalidate_session_context(class_id=None):
+    """Drop one class's context, or all of them."""
+    with _lock:
+        if class_id is None:
+            _contexts.clear()
+        else:
+            _contexts.pop(str(class_id), None)
+
+
+def session_context_stats():
+    with _lock:
+        return {**_stats, "entries": len(_contexts)}
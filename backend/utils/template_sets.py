@@ -0,0 +1,92 @@
+# utils/template_sets.py
+"""
+Bounded per-student template sets. Every match scans all of a student's templates, and
+/register-frame adds a new one per call, so each student (per model-pack namespace) is kept to
+at most FACE_TEMPLATE_CAP templates chosen by k-medoids under cosine distance:
+
+  * enrollment angles (front / left / right / up / down) are fixed medoids;
+  * the remaining slots start farthest-first (diversity) and then move to the medoid of their
+    cluster, so one stray frame does not hold a slot just for being far from everything.
+
+Medoids are real templates, so survivors keep their keys and the gallery changelog only needs
+deletes for the rest.
+
+    python -m utils.template_sets --compact --dry-run    # count oversized students / templates
+    python -m utils.template_sets --compact --cap 6      # consolidate them now (also a job kind)
+"""
+import os
+import sys
+import argparse
+from collections import Counter
+import numpy as np
+from utils.gallery_shard import normalize_rows
+
+TEMPLATE_CAP = int(os.getenv("FACE_TEMPLATE_CAP", "8"))
+ANGLE_TEMPLATES = ("front", "left", "right", "up", "down", "center")
+REFINE_ITERATIONS = 10
+
+
+def consolidate(templates, cap=TEMPLATE_CAP, protected=ANGLE_TEMPLATES):
+    """{key: vector} -> (kept keys, dropped keys) with len(kept) <= cap."""
+    usable = {k: np.asarray(v, dtype=np.float32).ravel() for k, v in templates.items() if v is not None and len(v)}
+    # Vectors of another dimension (a stray write from a different model) can't be compared: drop them
+    dim = Counter(v.shape[0] for v in usable.values()).most_common(1)[0][0] if usable else 0
+    keys = [k for k, v in usable.items() if v.shape[0] == dim]
+    invalid = [k for k in templates if k not in keys]
+    if len(keys) <= cap:
+        return keys, invalid
+
+    matrix = normalize_rows(np.stack([usable[k] for k in keys]))
+    dist = 1.0 - matrix @ matrix.T
+
+    fixed = [i for i, k in enumerate(keys) if k in protected][:cap]
+    medoids = list(fixed) or [int(np.argmin(dist.sum(axis=1)))]   # start from the most central template
+    while len(medoids) < cap:
+        nearest = dist[:, medoids].min(axis=1)
+        nearest[medoids] = -1.0
+        medoids.append(int(np.argmax(nearest)))
+
+    # Voronoi refinement: each free medoid moves to the member minimising in-cluster distance
+    fixed = set(fixed)
+    for _ in range(REFINE_ITERATIONS):
+        assignment = np.argmin(dist[:, medoids], axis=1)
+        changed = False
+        for c, medoid in enumerate(medoids):
+            if medoid in fixed:
+                continue
+            members = np.flatnonzero(assignment == c)
+            if not len(members):
+                continue
+            best = int(members[np.argmin(dist[np.ix_(members, members)].sum(axis=1))])
+            if best != medoid:
+                medoids[c], changed = best, True
+        if not changed:
+            break
+
+    kept = set(medoids)
+    return [keys[i] for i in sorted(kept)], [keys[i] for i in range(len(keys)) if i not in kept] + invalid
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-student template set maintenance.")
+    parser.add_argument("--compact", action="store_true", help="consolidate students over the cap")
+    parser.add_argument("--cap", type=int, default=TEMPLATE_CAP, help="templates kept per student and pack")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    args = parser.parse_args(argv)
+    if not args.compact:
+        parser.print_help()
+        return 0
+
+    from models.face_db_model import compact_oversized_students
+    result = compact_oversized_students(args.cap, dry_run=args.dry_run)
+    for namespace, stats in result["namespaces"].items():
+        print(f"  {namespace}: {stats['students']} student(s), {stats['templates_removed']} template(s) "
+              f"{'to remove' if args.dry_run else 'removed'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
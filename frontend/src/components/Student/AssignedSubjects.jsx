@@ -1,6 +1,6 @@
 import { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
-import { getSubjectsByStudent } from "../../services/api";
+import { getSubjectsByStudent, waitForCorJob } from "../../services/api";
 import { toast } from "react-toastify";
 import axios from "axios";
 import {
@@ -104,7 +104,12 @@ const AssignedSubjects = () => {
         }
       );
 
-      const { assigned_subjects = [], section } = res.data;
+      // Upload returns 202 + job_id; subjects are assigned in the background
+      const result = res.data.job_id
+        ? await waitForCorJob(res.data.job_id)
+        : res.data;
+      const { assigned_subjects = [], parsed = {} } = result;
+      const section = result.section || parsed.section;
       toast.success("✅ COR uploaded successfully");
 
       if (assigned_subjects.length > 0) {
@@ -148,7 +153,7 @@ const AssignedSubjects = () => {
       setFile(null);
     } catch (err) {
       console.error(err);
-      toast.error(err.response?.data?.error || "❌ Failed to upload COR");
+      toast.error(err.response?.data?.error || err.message || "❌ Failed to upload COR");
     } finally {
       setUploading(false);
     }
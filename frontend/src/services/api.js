@@ -26,11 +26,11 @@ export const detectBlink = (payload) =>
 // ==============================
 // 🔹 Attendance Control
 // ==============================
-export const activateAttendance = async (classId) => {
+export const activateAttendance = async (classId, roomId) => {
   const token = localStorage.getItem("token");
   const res = await API.post(
     "/attendance/start-session",
-    { class_id: classId },
+    { class_id: classId, room_id: roomId },
     { headers: { Authorization: `Bearer ${token}` } }
   );
   return res.data;
@@ -46,9 +46,10 @@ export const stopAttendance = async (classId) => {
   return res.data;
 };
 
-export const getActiveAttendanceSession = async () => {
+export const getActiveAttendanceSession = async (roomId) => {
   const token = localStorage.getItem("token");
   const res = await API.get("/attendance/active-session", {
+    params: roomId ? { room_id: roomId } : undefined,
     headers: { Authorization: `Bearer ${token}` },
   });
   return res.data;
@@ -134,6 +135,24 @@ export const getAttendanceReportAll = async (from, to) => {
   return res.data || [];
 };
 
+export const getAttendanceMatrix = async (id, from, to, format = "json") => {
+  const token = localStorage.getItem("token");
+  const params = new URLSearchParams();
+  if (from) params.append("from", from);
+  if (to) params.append("to", to);
+  params.append("format", format);
+
+  const res = await API.get(
+    `/instructor/class/${id}/attendance-matrix?${params}`,
+    {
+      headers: { Authorization: `Bearer ${token}` },
+      responseType: format === "json" ? "json" : "blob",
+    }
+  );
+
+  return res.data;
+};
+
 // ==============================
 // 🔹 Student Dashboard
 // ==============================
@@ -145,6 +164,26 @@ export const getSubjectsByStudent = async (id) => {
   return res.data;
 };
 
+export const getCorJob = async (jobId) => {
+  const token = localStorage.getItem("token");
+  const res = await API.get(`/student/cor-jobs/${jobId}`, {
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  return res.data;
+};
+
+// Poll a COR job until it finishes; resolves with the job's result
+export const waitForCorJob = async (jobId, intervalMs = 1000, timeoutMs = 120000) => {
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    const job = await getCorJob(jobId);
+    if (job.status === "done") return job.result;
+    if (job.status === "failed") throw new Error(job.error || "COR processing failed");
+    await new Promise((r) => setTimeout(r, intervalMs));
+  }
+  throw new Error("COR processing timed out");
+};
+
 export const getAttendanceLogsByStudent = async (id) => {
   const token = localStorage.getItem("token");
   const res = await API.get(`/student/${id}/attendance-logs`, {